@@ -3,12 +3,13 @@ from flask import Flask, request, session
 from community_edition.routers.authentication import authentication
 from community_edition.routers.configurate import configurate
 from community_edition.services.authentication import redirect_to_login
-from community_edition.services.env import load_env
+from community_edition.services.env import get_config
+from community_edition.services.setup import is_setup_active
 
 
 def create_app() -> Flask:
     app = Flask(__name__)
-    env = load_env()
+    env = get_config()
     app.secret_key = env.get("FLASK_SECRET_KEY") or "finmars-secret-key"
     app.register_blueprint(configurate)
     app.register_blueprint(authentication)
@@ -19,8 +20,11 @@ def create_app() -> Flask:
 
         if request.endpoint in allowlisted_endpoints or request.endpoint is None:
             return
+        # The setup page shows the progress of the steps to whoever is installing.
+        if request.endpoint in ("configurate.setup_state", "configurate.setup_events") and is_setup_active():
+            return
 
-        env = load_env()
+        env = get_config()
         auth_login = env.get("ADMIN_USERNAME")
         auth_password = env.get("ADMIN_PASSWORD")
         if not auth_login or not auth_password:
@@ -2,7 +2,12 @@ import logging
 import os
 
 from community_edition.app import create_app
-from community_edition.services.setup import LOG_FILE
+from community_edition.services.health import start_status_poller
+from community_edition.services.logbuffer import start_log_collector
+from community_edition.services.logfiles import APP_LOG_FILE
+from community_edition.services.setup import LOG_FILE, resume_setup
+from community_edition.services.verify import start_verify_sweep
+from community_edition.services.versions import start_version_refresh
 
 if __name__ == "__main__":
     if os.path.exists(LOG_FILE):
@@ -13,9 +18,15 @@ if __name__ == "__main__":
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
         handlers=[
             logging.StreamHandler(),
-            logging.FileHandler("app.log"),
+            logging.FileHandler(APP_LOG_FILE),
         ],
     )
 
+    start_verify_sweep()
+    start_log_collector()
+    start_version_refresh()
+    start_status_poller()
+    resume_setup()
+
     app = create_app()
     app.run(host="0.0.0.0", port=8888)
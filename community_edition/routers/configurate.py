@@ -1,24 +1,85 @@
-import io
-import os
+import json
+import sqlite3
 import subprocess
-
-from flask import Blueprint, flash, jsonify, redirect, render_template, request, send_file, url_for
+from datetime import UTC, datetime
+
+from flask import (
+    Blueprint,
+    Response,
+    flash,
+    jsonify,
+    redirect,
+    render_template,
+    request,
+    send_file,
+    stream_with_context,
+    url_for,
+)
+from werkzeug.http import parse_content_range_header
 
 from community_edition.services.backup import (
-    BACKUP_DIR,
-    PROJECT_DIR,
     create_backup,
     delete_backup,
-    get_backup_list,
+    get_backup_path,
+    preflight_backup,
+    preflight_uploaded_backup,
     restore_backup,
     restore_backup_from_uploaded_file,
 )
+from community_edition.services.catalog import DEFAULT_PER_PAGE, get_backup_entry, list_backups
+from community_edition.services.chunkstore import is_chunked_backup, stream_backup_zip
 from community_edition.services.container import down_containers, up_containers
-from community_edition.services.env import load_env
+from community_edition.services.dockerapi import get_docker_client
+from community_edition.services.env import get_config, load_env
+from community_edition.services.health import get_status_snapshot
+from community_edition.services.jobs import follow_job, get_job, is_job_active, list_jobs, step, submit_job
 from community_edition.services.keycloak import add_keycloak_user, list_keycloak_users
-from community_edition.services.logs import get_docker_compose_logs
-from community_edition.services.setup import append_log, get_setup_steps, load_state, save_state
-from community_edition.services.versions import get_current_versions, get_latest_versions, set_versions_in_env
+from community_edition.services.logbuffer import follow_lines, get_collector_status, is_collector_running
+from community_edition.services.logfiles import (
+    DEFAULT_WINDOW_LINES,
+    LOG_FILES,
+    get_log_file,
+    read_since,
+    read_tail,
+)
+from community_edition.services.logs import (
+    DEFAULT_TAIL,
+    build_logs_command,
+    gzip_stream,
+    stream_container_logs,
+    stream_logs,
+)
+from community_edition.services.logstore import DEFAULT_SEARCH_LIMIT, LOG_LEVELS, is_store_running, search_logs
+from community_edition.services.retention import apply_retention, preview_retention
+from community_edition.services.setup import (
+    STATE_WAIT_TIMEOUT,
+    TIMINGS_KEY,
+    append_log,
+    follow_setup,
+    get_setup_steps,
+    load_state,
+    locked_state,
+    start_setup,
+    wait_for_state_change,
+)
+from community_edition.services.upgrade import get_upgrade_images, plan_upgrade, pull_images, run_upgrade
+from community_edition.services.upload import (
+    discard_upload,
+    get_completed_upload,
+    get_upload_status,
+    save_uploaded_file,
+    write_upload_chunk,
+)
+from community_edition.services.verify import VERIFY_CONFLICT_KEY, verify_backup
+from community_edition.services.versions import (
+    REFRESH_WAIT,
+    get_current_versions,
+    get_latest_versions,
+    get_latest_versions_status,
+    refresh_in_background,
+    restore_env_backup,
+    set_versions_in_env,
+)
 
 setup_steps = get_setup_steps()
 
@@ -32,12 +93,17 @@ def setup():
     if request.method == "POST":
         step = request.form.get("step")
         if step == "generate_env" and state.get(step) == "pending":
-            if "backup_file" in request.files and (backup_file := request.files["backup_file"]).filename != "":
-                os.makedirs(os.path.join(os.getcwd(), "tmp"), exist_ok=True)
-                backup_path = os.path.join(os.getcwd(), "tmp", "backup.zip")
-                backup_file.save(backup_path)
-            else:
-                state["restore_backup"] = "skip"
+            skip_restore = False
+            try:
+                if request.form.get("uploaded_backup"):
+                    get_completed_upload()
+                elif "backup_file" in request.files and (backup_file := request.files["backup_file"]).filename != "":
+                    save_uploaded_file(backup_file)
+                else:
+                    skip_restore = True
+            except ValueError as e:
+                flash(f"Backup file rejected: {e}", "error")
+                return redirect(url_for("configurate.setup"))
 
             inp = (
                 "P\n"
@@ -48,59 +114,367 @@ def setup():
             )
             proc = subprocess.run(setup_steps[0][1], check=False, input=inp, text=True, capture_output=True)
             append_log(setup_steps[0][2], proc.stdout, proc.stderr)
-            state["generate_env"] = "done" if proc.returncode == 0 else "failed"
-            save_state(state)
 
             step_names = [name for name, _, _ in setup_steps]
-
             current_index = step_names.index(step)
-
-            if current_index + 1 < len(step_names):
-                next_step = step_names[current_index + 1]
-                if state.get(next_step) == "pending":
+            with locked_state() as state:
+                if skip_restore:
+                    state["restore_backup"] = "skip"
+                state["generate_env"] = "done" if proc.returncode == 0 else "failed"
+                next_step = step_names[current_index + 1] if current_index + 1 < len(step_names) else None
+                requested = next_step is not None and state.get(next_step) == "pending"
+                if requested:
                     state[next_step] = "requested"
-                    save_state(state)
+            if requested:
+                start_setup()
 
             return redirect(url_for("configurate.setup"))
 
-        if step in state and state[step] == "pending":
-            state[step] = "requested"
-            save_state(state)
+        with locked_state() as state:
+            requested = state.get(step) == "pending"
+            if requested:
+                state[step] = "requested"
+        if requested:
+            start_setup()
         return redirect(url_for("configurate.setup"))
 
-    logs = get_docker_compose_logs()
+    timings = state.get(TIMINGS_KEY, {})
+    steps = [
+        {
+            "step": step,
+            "title": title,
+            "status": state.get(step),
+            "started_at": None,
+            "duration": None,
+            **timings.get(step, {}),
+        }
+        for step, _, title in setup_steps
+    ]
     for step, _, title in setup_steps:
         status = state.get(step)
         if step == "generate_env" and status == "pending":
             return render_template("form.html")
         if status in ("requested", "in_progress", "pending"):
-            return render_template("status.html", title=title, logs=logs, status=status)
+            return render_template("status.html", title=title, status=status, steps=steps)
 
-    env = load_env()
-    domain_name = env.get("DOMAIN_NAME")
+    domain_name = get_config().get("DOMAIN_NAME")
     return render_template("success.html", domain=domain_name)
 
 
+@configurate.route("/setup/state", methods=["GET"])
+def setup_state():
+    """The setup state and its version; with ?version=N, waits until the state moves past version N"""
+    version = request.args.get("version", type=int)
+    timeout = STATE_WAIT_TIMEOUT if "version" in request.args else 0
+    version, state = wait_for_state_change(version, timeout)
+    return jsonify({"success": True, "version": version, "state": state}), 200
+
+
+@configurate.route("/setup/events", methods=["GET"])
+def setup_events():
+    """
+    Server-sent events with the setup state on every change and the output of
+    the running steps line by line; reconnects resume after Last-Event-ID.
+    """
+    after = request.headers.get("Last-Event-ID", type=int)
+
+    def generate():
+        for event in follow_setup(after):
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"id: {event['seq']}\ndata: {json.dumps(event)}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _log_filters(default_tail: str = str(DEFAULT_TAIL)) -> dict:
+    services = [name for value in request.args.getlist("service") for name in value.replace(",", " ").split()]
+    return {
+        "service": services,
+        "tail": request.args.get("tail") or default_tail,
+        "since": request.args.get("since") or None,
+        "until": request.args.get("until") or None,
+    }
+
+
+def _log_search_filters() -> dict:
+    levels = [level.upper() for level in request.args.getlist("level") if level]
+    return {**_log_filters(), "q": request.args.get("q") or "", "level": levels}
+
+
+def _search_logs(filters: dict) -> dict:
+    return search_logs(
+        filters["service"],
+        filters["level"],
+        filters["since"],
+        filters["until"],
+        filters["q"],
+        before=request.args.get("before", type=int),
+        limit=request.args.get("limit", DEFAULT_SEARCH_LIMIT, type=int),
+    )
+
+
 @configurate.route("/logs", methods=["GET"])
 def logs():
-    logs_text = get_docker_compose_logs()
-    return render_template("logs.html", logs=logs_text)
+    """Live logs, or a page of stored lines when searching by text or level (?q=&level=)"""
+    filters = _log_search_filters()
+    searching = bool(filters["q"] or filters["level"] or "before" in request.args)
+    results = None
+    try:
+        if searching and is_store_running():
+            results = _search_logs(filters)
+        else:
+            build_logs_command(filters["service"], filters["tail"], filters["since"], filters["until"])
+    except (ValueError, sqlite3.Error) as e:
+        flash(str(e), "error")
+        filters = {"service": [], "tail": str(DEFAULT_TAIL), "since": None, "until": None, "q": "", "level": []}
+    if searching and not is_store_running():
+        flash("Searching needs the log store, which is not running", "warning")
+    return render_template(
+        "logs.html",
+        filters=filters,
+        results=results,
+        levels=LOG_LEVELS,
+        collector=get_collector_status(),
+    )
+
+
+@configurate.route("/logs/search", methods=["GET"])
+def logs_search():
+    """Stored log lines, newest first: ?service=&level=&since=&until=&q=&before=&limit="""
+    if not is_store_running():
+        return jsonify({"success": False, "message": "The log store is not running"}), 409
+    filters = _log_search_filters()
+    try:
+        return jsonify({"success": True, **_search_logs(filters)}), 200
+    except (ValueError, sqlite3.Error) as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+
+@configurate.route("/services", methods=["GET"])
+def services():
+    """Dashboard of the compose services' state and health"""
+    return render_template("services.html")
+
+
+@configurate.route("/services/status", methods=["GET"])
+def services_status():
+    """State and health of every compose service, from the status poller's snapshot"""
+    return jsonify({"success": True, **get_status_snapshot()}), 200
+
+
+@configurate.route("/logs/collector", methods=["GET"])
+def logs_collector():
+    """Log collector state with buffered and dropped line counts per service"""
+    return jsonify({"success": True, **get_collector_status()}), 200
+
+
+def _log_lines(filters: dict, follow: bool = False, after: int | None = None):
+    """Log lines for the filters, from the collector's buffers when they can serve them, else from docker"""
+    command = build_logs_command(filters["service"], filters["tail"], filters["since"], filters["until"], follow)
+    if is_collector_running() and not filters["since"] and not filters["until"]:
+        tail = None if filters["tail"] == "all" else int(filters["tail"])
+        return follow_lines(filters["service"], tail, after=after, follow=follow)
+    client = get_docker_client()
+    if client is not None:
+        return stream_container_logs(
+            client, filters["service"], filters["tail"], filters["since"], filters["until"], follow
+        )
+    return stream_logs(command)
+
+
+@configurate.route("/logs/stream", methods=["GET"])
+def logs_stream():
+    """
+    Server-sent events with one log line each: ?service=&tail=&since=&until=&follow=1.
+    Served from the log collector's buffers when it runs, except for time filters,
+    which may reach back further than the buffers; ?after=<seq> resumes a stream.
+    """
+    follow = request.args.get("follow") == "1"
+    try:
+        lines = _log_lines(_log_filters(), follow, after=request.args.get("after", type=int))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    def generate():
+        try:
+            for entry in lines:
+                yield ": keepalive\n\n" if entry is None else f"data: {json.dumps(entry)}\n\n"
+        except OSError as e:
+            line = f"Failed to fetch docker compose logs: {e}"
+            yield f"data: {json.dumps({'service': None, 'time': None, 'message': line, 'line': line})}\n\n"
+        yield "event: end\ndata: {}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@configurate.route("/logfiles", methods=["GET"])
+def logfiles():
+    """Viewer for the setup and application log files"""
+    name = request.args.get("name", "setup")
+    if name not in LOG_FILES:
+        name = "setup"
+    return render_template("logfiles.html", names=list(LOG_FILES), name=name, lines=DEFAULT_WINDOW_LINES)
+
+
+@configurate.route("/logfiles/<name>", methods=["GET"])
+def logfile_window(name):
+    """
+    A window of complete lines from a log file: the last ?lines=N, the N before
+    ?before=<offset>, or what was appended ?since=<offset>. The window's start
+    and end offsets are what to page back from and poll since next.
+    """
+    try:
+        path = get_log_file(name)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 404
+    try:
+        if "since" in request.args:
+            window = read_since(path, request.args.get("since", type=int) or 0)
+        else:
+            window = read_tail(
+                path,
+                request.args.get("lines", DEFAULT_WINDOW_LINES, type=int),
+                request.args.get("before", type=int),
+            )
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    return jsonify({"success": True, "name": name, **window}), 200
 
 
 @configurate.route("/logs/download", methods=["GET"])
 def download_logs():
-    logs_text = get_docker_compose_logs()
-    return send_file(
-        io.BytesIO(logs_text.encode("utf-8", errors="replace")),
-        as_attachment=True,
-        download_name="finmars-logs.txt",
-        mimetype="text/plain",
+    """Logs as a gzip file, compressed while they are read: ?service=&since=&until=&tail= (all lines by default)"""
+    try:
+        lines = _log_lines(_log_filters(default_tail="all"))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    def text():
+        try:
+            for entry in lines:
+                if entry is not None:
+                    yield f"{entry['line']}\n".encode("utf-8", errors="replace")
+        except OSError as e:
+            yield f"Failed to fetch docker compose logs: {e}\n".encode()
+
+    name = f"finmars-logs-{datetime.now(UTC).strftime('%Y%m%d%H%M%S')}.txt.gz"
+    return Response(
+        stream_with_context(gzip_stream(text())),
+        mimetype="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{name}"', "X-Accel-Buffering": "no"},
     )
 
 
+_UPLOAD_IN_USE = "A restore from the uploaded backup file is already queued or running"
+
+
+def _job_started(job: dict, message: str):
+    return jsonify({"success": True, "message": message, "job_id": job["id"], "job": job}), 202
+
+
+def _with_containers_stopped(action_name: str, action) -> None:
+    """Run action with the stack stopped, and bring the stack back up even if it fails."""
+    try:
+        step("Stopping containers")
+        down_containers()
+        action()
+    except Exception as e:
+        step("Restarting containers", previous_status="failed")
+        try:
+            up_containers()
+        except Exception as up_error:
+            raise RuntimeError(
+                f"{action_name} failed: {str(e)}. Additionally, failed to restart containers: {str(up_error)}"
+            ) from e
+        raise
+
+    step("Starting containers")
+    up_containers()
+
+
+def _create_backup() -> str:
+    step("Creating backup")
+    create_backup()
+    return "Backup created successfully"
+
+
+def _apply_retention() -> str:
+    step("Pruning backups")
+    deleted = apply_retention()
+    return f"Pruned {len(deleted)} backup(s)" + (f": {', '.join(deleted)}" if deleted else "")
+
+
+def _verify_backup(timestamp: str) -> str:
+    step("Verifying backup")
+    result = verify_backup(timestamp)
+    if not result["ok"]:
+        raise RuntimeError(f"Backup {timestamp} failed verification: {'; '.join(result['errors'])}")
+    return f"Backup {timestamp} verified: {len(result['members'])} member(s) intact"
+
+
+def _safety_backup_then(restore, protect: tuple[str, ...] = ()) -> None:
+    step("Creating safety backup")
+    # Retention must not prune the backup that is about to be restored.
+    create_backup(protect=protect)
+    step("Restoring backup")
+    restore()
+
+
+def _restore_uploaded_backup() -> str:
+    step("Preflight checks")
+    preflight_uploaded_backup()
+    _with_containers_stopped("Restore", lambda: _safety_backup_then(restore_backup_from_uploaded_file))
+    return (
+        "Backup from uploaded file restored successfully. "
+        "Containers stopped, backup restored, and containers restarted."
+    )
+
+
+def _restore_backup(timestamp: str) -> str:
+    step("Preflight checks")
+    preflight_backup(timestamp)
+    _with_containers_stopped(
+        "Restore", lambda: _safety_backup_then(lambda: restore_backup(timestamp), protect=(timestamp,))
+    )
+    return f"Backup {timestamp} restored successfully. Containers stopped, backup restored, and containers restarted."
+
+
+def _update_versions() -> str:
+    step("Updating versions in .env")
+    old_env = load_env()
+    set_versions_in_env()
+    step("Planning upgrade")
+    stages = plan_upgrade(old_env, load_env())
+    if not stages:
+        return "Versions are already up to date. No containers were restarted."
+    step("Pulling images")
+    try:
+        pull_images(get_upgrade_images(stages))
+    except Exception:
+        # Nothing was switched over yet; keep .env in line with what runs.
+        restore_env_backup()
+        raise
+    run_upgrade(stages)
+    services = sorted({name for stage in stages for name in stage["services"]})
+    return f"Versions updated successfully. Upgraded services: {', '.join(services)}."
+
+
 @configurate.route("/versions", methods=["GET", "PUT"])
 def versions():
     if request.method == "GET":
+        # ?refresh=1 revalidates the latest versions, waiting briefly for the answer.
+        if request.args.get("refresh") == "1":
+            refresh_in_background().join(REFRESH_WAIT)
         current_versions = get_current_versions()
         latest_versions = get_latest_versions()
 
@@ -116,83 +490,58 @@ def versions():
                 and latest_versions.get(app_name, "") != "",
             }
 
-        return render_template("versions.html", versions=version_data)
+        return render_template("versions.html", versions=version_data, latest=get_latest_versions_status())
 
     elif request.method == "PUT":
-        try:
-            set_versions_in_env()
+        job = submit_job("upgrade", "Update versions", _update_versions)
+        return _job_started(job, "Version update started")
 
-            down_containers()
-            up_containers()
 
-            return jsonify(
-                {
-                    "success": True,
-                    "message": "Versions updated successfully. Containers restarted with new versions.",
-                }
-            )
-        except Exception as e:
-            return jsonify({"success": False, "message": str(e)}), 500
+def _get_backup_page() -> dict:
+    return list_backups(
+        page=request.args.get("page", 1, type=int),
+        per_page=request.args.get("per_page", DEFAULT_PER_PAGE, type=int),
+        sort=request.args.get("sort", "created"),
+        order=request.args.get("order", "desc"),
+    )
 
 
 @configurate.route("/backup", methods=["GET", "POST", "PUT", "DELETE"])
 def backup():  # noqa: PLR0911
     if request.method == "GET":
-        backups = get_backup_list()
-        return render_template("backup.html", backups=backups)
+        try:
+            catalog = _get_backup_page()
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+        try:
+            retention = preview_retention()
+        except ValueError as e:
+            retention = {"enabled": True, "error": str(e), "delete": []}
+        return render_template("backup.html", backups=catalog["backups"], catalog=catalog, retention=retention)
 
     elif request.method == "POST":
-        if "backup_file" in request.files and (backup_file := request.files["backup_file"]).filename != "":
-            tmp_dir = os.path.join(PROJECT_DIR, "tmp")
-            os.makedirs(tmp_dir, exist_ok=True)
-            tmp_backup_path = os.path.join(tmp_dir, "backup.zip")
-
-            backup_file.save(tmp_backup_path)
-
+        data = request.get_json(silent=True) or {}
+        has_backup_file = "backup_file" in request.files and request.files["backup_file"].filename != ""
+        if has_backup_file or data.get("uploaded"):
+            if is_job_active("restore_upload"):
+                return jsonify({"success": False, "message": _UPLOAD_IN_USE}), 409
+            try:
+                if has_backup_file:
+                    save_uploaded_file(request.files["backup_file"])
+                else:
+                    get_completed_upload()
+            except ValueError as e:
+                return jsonify({"success": False, "message": f"Backup file rejected: {e}"}), 400
             try:
-                down_containers()
-
-                create_backup()
-                restore_backup_from_uploaded_file()
-
-                up_containers()
-
-                return (
-                    jsonify(
-                        {
-                            "success": True,
-                            "message": (
-                                "Backup from uploaded file restored successfully. "
-                                "Containers stopped, backup restored, and containers restarted."
-                            ),
-                        }
-                    ),
-                    200,
-                )
-            except Exception as e:
-                try:
-                    up_containers()
-                except Exception as up_error:
-                    return (
-                        jsonify(
-                            {
-                                "success": False,
-                                "message": (
-                                    f"Restore failed: {str(e)}. "
-                                    f"Additionally, failed to restart containers: {str(up_error)}"
-                                ),
-                            }
-                        ),
-                        500,
-                    )
-
-                return jsonify({"success": False, "message": str(e)}), 500
+                preflight_uploaded_backup()
+            except (ValueError, OSError) as e:
+                return jsonify({"success": False, "message": str(e)}), 400
 
-        try:
-            create_backup()
-            return jsonify({"success": True, "message": "Backup created successfully"}), 200
-        except Exception as e:
-            return jsonify({"success": False, "message": str(e)}), 500
+            job = submit_job("restore_upload", "Restore uploaded backup", _restore_uploaded_backup)
+            return _job_started(job, "Restore from uploaded file started")
+
+        job = submit_job("backup", "Create backup", _create_backup)
+        return _job_started(job, "Backup started")
 
     elif request.method == "DELETE":
         data = request.get_json()
@@ -207,17 +556,82 @@ def backup():  # noqa: PLR0911
             return jsonify({"success": False, "message": str(e)}), 500
 
 
+@configurate.route("/backup/catalog", methods=["GET"])
+def backup_catalog():
+    """Paginated backup catalog as JSON: ?page=&per_page=&sort=created|size|physical_size|timestamp&order=asc|desc"""
+    try:
+        return jsonify({"success": True, **_get_backup_page()}), 200
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+
+@configurate.route("/backup/retention", methods=["GET", "POST"])
+def backup_retention():
+    """GET previews what the retention policy would prune, POST prunes in a background job"""
+    if request.method == "GET":
+        try:
+            return jsonify({"success": True, **preview_retention()}), 200
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+
+    job = submit_job("retention", "Apply backup retention", _apply_retention)
+    return _job_started(job, "Backup retention started")
+
+
+@configurate.route("/backup/upload", methods=["GET", "PUT", "DELETE"])
+def backup_upload():  # noqa: PLR0911
+    """Chunked, resumable upload of a backup archive straight into tmp/backup.zip"""
+    if request.method == "GET":
+        return jsonify({"success": True, **get_upload_status()}), 200
+
+    if is_job_active("restore_upload"):
+        return jsonify({"success": False, "message": _UPLOAD_IN_USE, **get_upload_status()}), 409
+
+    if request.method == "DELETE":
+        discard_upload()
+        return jsonify({"success": True, "message": "Upload discarded"}), 200
+
+    content_range = parse_content_range_header(request.headers.get("Content-Range"))
+    if content_range is None or content_range.units != "bytes" or content_range.length is None:
+        return jsonify({"success": False, "message": "Content-Range header 'bytes start-end/total' required"}), 400
+
+    status = get_upload_status()
+    if content_range.start not in (0, status["offset"]):
+        return jsonify({"success": False, "message": "Chunk does not continue the stored upload", **status}), 409
+
+    try:
+        status = write_upload_chunk(
+            request.stream,
+            offset=content_range.start,
+            end=content_range.stop,
+            total=content_range.length,
+            name=request.headers.get("X-Upload-Name", ""),
+            expected_sha256=request.headers.get("X-Upload-SHA256"),
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e), **get_upload_status()}), 400
+
+    return jsonify({"success": True, **status}), 200
+
+
 @configurate.route("/backup/<timestamp>/download")
 def download_backup(timestamp):
-    """Download a backup dump.zip file"""
+    """Download a backup dump.zip file, rebuilt on the fly for backups in the chunk store"""
     try:
-        dump_file_path = os.path.join(BACKUP_DIR, timestamp, "dump.zip")
+        backup_path = get_backup_path(timestamp)
 
-        if not os.path.exists(dump_file_path):
+        if backup_path is None:
             return jsonify({"success": False, "message": "Backup file not found"}), 404
 
+        if is_chunked_backup(backup_path):
+            return Response(
+                stream_backup_zip(backup_path),
+                mimetype="application/zip",
+                headers={"Content-Disposition": f'attachment; filename="backup_{timestamp}.zip"'},
+            )
+
         return send_file(
-            dump_file_path,
+            backup_path,
             as_attachment=True,
             download_name=f"backup_{timestamp}.zip",
             mimetype="application/zip",
@@ -226,41 +640,72 @@ def download_backup(timestamp):
         return jsonify({"success": False, "message": str(e)}), 500
 
 
+@configurate.route("/backup/<timestamp>/verify", methods=["GET", "POST"])
+def verify_backup_route(timestamp):
+    """GET returns the last verification result, POST re-hashes the backup in a background job"""
+    entry = get_backup_entry(timestamp)
+    if entry is None:
+        return jsonify({"success": False, "message": "Backup not found"}), 404
+
+    if request.method == "GET":
+        return jsonify({"success": True, "sha256": entry["sha256"], "verification": entry["verification"]}), 200
+
+    job = submit_job(
+        "verify", f"Verify backup {timestamp}", lambda: _verify_backup(timestamp), conflict_key=VERIFY_CONFLICT_KEY
+    )
+    return _job_started(job, f"Verification of backup {timestamp} started")
+
+
+@configurate.route("/backup/<timestamp>/preflight", methods=["GET"])
+def preflight_backup_route(timestamp):
+    """Whether a backup can be restored here, checked without stopping anything"""
+    try:
+        return jsonify({"success": True, **preflight_backup(timestamp)}), 200
+    except (ValueError, OSError) as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+
 @configurate.route("/backup/<timestamp>/restore", methods=["POST"])
 def restore_backup_route(timestamp):
     """Restore a backup by stopping containers, running restore, and starting containers"""
     try:
-        down_containers()
+        preflight_backup(timestamp)
+    except (ValueError, OSError) as e:
+        return jsonify({"success": False, "message": str(e)}), 400
 
-        create_backup()
-        restore_backup(timestamp)
+    job = submit_job("restore", f"Restore backup {timestamp}", lambda: _restore_backup(timestamp))
+    return _job_started(job, f"Restore of backup {timestamp} started")
 
-        up_containers()
 
-        return jsonify(
-            {
-                "success": True,
-                "message": (
-                    f"Backup {timestamp} restored successfully. "
-                    "Containers stopped, backup restored, and containers restarted.",
-                ),
-            }
-        ), 200
+@configurate.route("/jobs", methods=["GET"])
+def jobs_list():
+    return jsonify({"success": True, "jobs": list_jobs()}), 200
 
-    except Exception as e:
-        try:
-            up_containers()
-        except Exception as up_error:
-            return jsonify(
-                {
-                    "success": False,
-                    "message": (
-                        f"Restore failed: {str(e)}. Additionally, failed to restart containers: {str(up_error)}"
-                    ),
-                }
-            ), 500
 
-        return jsonify({"success": False, "message": str(e)}), 500
+@configurate.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """Job snapshot; ?since=N only returns output lines from line N on"""
+    job = get_job(job_id, since=request.args.get("since", 0, type=int))
+    if job is None:
+        return jsonify({"success": False, "message": "Job not found"}), 404
+    return jsonify({"success": True, "job": job}), 200
+
+
+@configurate.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """Server-sent events with a job snapshot (new output only) on every change, until it finishes"""
+    if get_job(job_id) is None:
+        return jsonify({"success": False, "message": "Job not found"}), 404
+
+    def generate():
+        for job in follow_job(job_id):
+            yield ": keepalive\n\n" if job is None else f"data: {json.dumps(job)}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @configurate.route("/keycloak/add-user", methods=["GET", "POST"])
@@ -2,43 +2,56 @@ import logging
 import os
 import shutil
 import subprocess
-from datetime import datetime
+from collections.abc import Iterable
 
-PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
-BACKUP_DIR = os.path.join(PROJECT_DIR, "dumps")
+from . import upload
+from .catalog import record_backup, refresh_catalog
+from .chunkstore import INDEX_NAME, collect_garbage, create_chunked_backup, get_backup_store
+from .dump import create_dump_archive
+from .env import load_env
+from .paths import BACKUP_DIR
+from .restore import preflight_restore, restore_archive
+from .retention import apply_retention
 
 logger = logging.getLogger(__name__)
 
 
 def get_backup_list() -> list[dict]:
-    """Get list of available backups"""
-    backups = []
-
-    if not os.path.exists(BACKUP_DIR):
-        logger.error(f"Backup directory not found: {BACKUP_DIR}")
-        return []
-
-    for folder in os.listdir(BACKUP_DIR):
-        dump_zip_filepath = os.path.join(BACKUP_DIR, folder, "dump.zip")
-        if not os.path.exists(dump_zip_filepath):
-            continue
-
-        folder_datetime = datetime.strptime(folder, "%Y%m%d%H%M%S")
-
-        backups.append(
-            {
-                "date": folder_datetime.strftime("%Y-%m-%d"),
-                "size": os.path.getsize(dump_zip_filepath),
-                "created": folder_datetime.strftime("%Y-%m-%d %H:%M:%S"),
-                "path": dump_zip_filepath,
-                "timestamp": folder,
-            }
-        )
-    return sorted(backups, key=lambda x: x["created"], reverse=True)
-
-
-def create_backup() -> None:
-    """Create a backup by calling the create-dumps.sh script"""
+    """Get list of available backups, newest first"""
+    return sorted(refresh_catalog().values(), key=lambda x: (x["created"], x["timestamp"]), reverse=True)
+
+
+def get_backup_path(timestamp: str) -> str | None:
+    """Path of a backup's dump.zip, or of its chunks.json if it lives in the chunk store."""
+    if timestamp.startswith(".") or os.path.basename(timestamp) != timestamp:
+        return None
+    for name in ("dump.zip", INDEX_NAME):
+        path = os.path.join(BACKUP_DIR, timestamp, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def create_backup(protect: Iterable[str] = ()) -> None:
+    """
+    Create a backup with the in-process dump engine, or by calling the
+    create-dumps.sh script when BACKUP_ENGINE=script is set in .env.
+    The retention policy prunes old backups first, making room for the new one;
+    the `protect`ed backups, such as one about to be restored, are left alone.
+    With BACKUP_STORE=chunks the native engine writes into the deduplicating chunk store.
+    """
+    apply_retention(for_new_backup=True, protect=protect)
+
+    env = load_env()
+    if env.get("BACKUP_ENGINE", "native") != "script":
+        if get_backup_store(env) == "chunks":
+            backup_path = create_chunked_backup()
+        else:
+            backup_path = create_dump_archive()
+        record_backup(os.path.basename(os.path.dirname(backup_path)))
+        logger.info(f"Backup created successfully: {backup_path}")
+        return
+
     result = subprocess.run(["make", "create-dumps"], check=False, capture_output=True, text=True)
 
     if result.returncode != 0:
@@ -51,50 +64,56 @@ def delete_backup(backup_filename) -> None:
     """Delete a backup directory"""
     backup_path = os.path.join(BACKUP_DIR, backup_filename)
 
-    if not os.path.exists(backup_path):
+    if backup_filename.startswith(".") or os.path.basename(backup_filename) != backup_filename:
+        raise ValueError("Backup not found")
+    if not os.path.isdir(backup_path):
         raise ValueError("Backup not found")
 
     shutil.rmtree(backup_path)
 
+    try:
+        collect_garbage()
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not collect unreferenced backup chunks: {e}")
+
 
 def _run_restore_with_tmp_backup(tmp_backup_path: str) -> None:
-    """Run restore-backup script using the backup file located at tmp_backup_path."""
+    """Restore the backup file located at tmp_backup_path and delete it afterwards."""
     if not os.path.exists(tmp_backup_path):
         raise ValueError(f"Backup file not found for restore: {tmp_backup_path}")
 
-    result = subprocess.run(
-        ["make", "restore-backup"],
-        check=False,
-        capture_output=True,
-        text=True,
-        cwd=PROJECT_DIR,
-    )
-
-    if result.returncode != 0:
+    try:
+        restore_archive(tmp_backup_path)
+    finally:
         if os.path.exists(tmp_backup_path):
             os.remove(tmp_backup_path)
-        raise RuntimeError(f"Restore script failed: {result.stderr}")
-
-    logger.info(f"Backup restored successfully: {result.stdout}")
 
 
 def restore_backup(timestamp: str) -> None:
-    """Restore a backup by copying it to tmp/backup.zip and running restore script"""
-    backup_path = os.path.join(BACKUP_DIR, timestamp)
-    dump_zip_path = os.path.join(backup_path, "dump.zip")
-    tmp_backup_path = os.path.join(PROJECT_DIR, "tmp", "backup.zip")
+    """Restore a backup straight from its dump.zip or chunks, without copying or extracting it."""
+    backup_path = get_backup_path(timestamp)
 
-    if not os.path.exists(dump_zip_path):
+    if backup_path is None:
         raise ValueError(f"Backup dump.zip not found for timestamp: {timestamp}")
 
-    tmp_dir = os.path.join(PROJECT_DIR, "tmp")
-    os.makedirs(tmp_dir, exist_ok=True)
-    shutil.copy2(dump_zip_path, tmp_backup_path)
-
-    _run_restore_with_tmp_backup(tmp_backup_path)
+    restore_archive(backup_path)
 
 
 def restore_backup_from_uploaded_file() -> None:
     """Restore a backup from an uploaded file saved as tmp/backup.zip."""
-    tmp_backup_path = os.path.join(PROJECT_DIR, "tmp", "backup.zip")
-    _run_restore_with_tmp_backup(tmp_backup_path)
+    _run_restore_with_tmp_backup(upload.UPLOAD_PATH)
+
+
+def preflight_backup(timestamp: str) -> dict:
+    """Run the restore preflight checks against a backup from dumps/."""
+    backup_path = get_backup_path(timestamp)
+
+    if backup_path is None:
+        raise ValueError(f"Backup dump.zip not found for timestamp: {timestamp}")
+
+    return preflight_restore(backup_path)
+
+
+def preflight_uploaded_backup() -> dict:
+    """Run the restore preflight checks against the uploaded tmp/backup.zip."""
+    return preflight_restore(upload.UPLOAD_PATH)
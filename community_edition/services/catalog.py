@@ -0,0 +1,230 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import UTC, datetime
+from typing import Any, Final
+
+from .chunkstore import INDEX_NAME, get_index_sizes, load_index, validate_backup
+from .dump import DUMP_CHUNK_SIZE, get_backup_format
+from .paths import BACKUP_DIR
+
+# Persistent index of the backups under BACKUP_DIR, one entry per backup folder.
+# An entry is only re-read when the folder's mtime changes, which happens when
+# dump.zip (or chunks.json, for the chunk store) is (re)placed in it.
+CATALOG_NAME: Final[str] = ".catalog.json"
+CATALOG_VERSION: Final[int] = 3
+TIMESTAMP_FORMAT: Final[str] = "%Y%m%d%H%M%S"
+SORT_KEYS: Final[tuple[str, ...]] = ("created", "size", "physical_size", "timestamp")
+DEFAULT_PER_PAGE: Final[int] = 20
+MAX_PER_PAGE: Final[int] = 200
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_catalog: dict[str, Any] = {"path": None, "entries": {}}
+
+
+def get_catalog_path() -> str:
+    return os.path.join(BACKUP_DIR, CATALOG_NAME)
+
+
+def file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(DUMP_CHUNK_SIZE):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _created_at(folder: str, archive_mtime: float) -> datetime:
+    """Backup folders are named after their UTC creation time; fall back to the archive mtime."""
+    try:
+        return datetime.strptime(folder, TIMESTAMP_FORMAT)
+    except ValueError:
+        return datetime.fromtimestamp(archive_mtime, UTC).replace(tzinfo=None)
+
+
+def _stat_backup(folder: str) -> tuple[str, str, os.stat_result] | None:
+    """Path, store and stat of the dump.zip or chunks.json of a backup folder."""
+    for name, store in (("dump.zip", "archive"), (INDEX_NAME, "chunks")):
+        backup_path = os.path.join(BACKUP_DIR, folder, name)
+        try:
+            return backup_path, store, os.stat(backup_path)
+        except FileNotFoundError:
+            continue
+    return None
+
+
+def _read_entry(folder: str, folder_mtime_ns: int) -> dict[str, Any] | None:
+    found = _stat_backup(folder)
+    if found is None:
+        return None
+
+    backup_path, store, stat = found
+    created = _created_at(folder, stat.st_mtime)
+    entry = {
+        "timestamp": folder,
+        "path": backup_path,
+        "store": store,
+        "date": created.strftime("%Y-%m-%d"),
+        "created": created.strftime("%Y-%m-%d %H:%M:%S"),
+        # For a dump.zip both are the archive size; for the chunk store the logical
+        # size is that of the dumps and the physical size that of their stored chunks.
+        "size": stat.st_size,
+        "physical_size": stat.st_size,
+        "mtime_ns": folder_mtime_ns,
+        "archive_mtime_ns": stat.st_mtime_ns,
+        "sha256": None,
+        "verification": None,
+        "format": None,
+        "realm_code": None,
+        "space_code": None,
+        "versions": [],
+        "error": None,
+    }
+    try:
+        if store == "chunks":
+            entry["size"], entry["physical_size"] = get_index_sizes(load_index(backup_path))
+        manifest = validate_backup(backup_path)
+        entry.update(
+            format=get_backup_format(manifest),
+            realm_code=manifest.get("realm_code"),
+            space_code=manifest.get("space_code"),
+            versions=manifest.get("versions", []),
+        )
+    except (OSError, ValueError, KeyError) as e:
+        entry["error"] = str(e)
+    return entry
+
+
+def _load() -> dict[str, dict[str, Any]]:
+    """Entries of the on-disk catalog, kept in memory until BACKUP_DIR changes."""
+    path = get_catalog_path()
+    if _catalog["path"] == path:
+        return _catalog["entries"]
+
+    entries = {}
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") == CATALOG_VERSION:
+            entries = data.get("entries", {})
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable backup catalog {path}: {e}")
+
+    _catalog.update(path=path, entries=entries)
+    return entries
+
+
+def _save(entries: dict[str, dict[str, Any]]) -> None:
+    path = get_catalog_path()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": CATALOG_VERSION, "entries": entries}, f)
+    os.replace(tmp_path, path)
+
+
+def refresh_catalog() -> dict[str, dict[str, Any]]:
+    """
+    Bring the catalog in line with BACKUP_DIR and return its entries.
+    Only folders that are new or whose mtime changed have their archive read.
+    """
+    with _lock:
+        entries = _load()
+        if not os.path.isdir(BACKUP_DIR):
+            logger.error(f"Backup directory not found: {BACKUP_DIR}")
+            return {}
+
+        changed = False
+        seen = set()
+        with os.scandir(BACKUP_DIR) as it:
+            for dir_entry in it:
+                if dir_entry.name.startswith(".") or not dir_entry.is_dir(follow_symlinks=False):
+                    continue
+                folder = dir_entry.name
+                mtime_ns = dir_entry.stat(follow_symlinks=False).st_mtime_ns
+                current = entries.get(folder)
+                if current is not None and current["mtime_ns"] == mtime_ns:
+                    seen.add(folder)
+                    continue
+
+                entry = _read_entry(folder, mtime_ns)
+                changed = True
+                if entry is None:
+                    entries.pop(folder, None)
+                    continue
+                if current is not None and current["archive_mtime_ns"] == entry["archive_mtime_ns"]:
+                    entry.update(sha256=current["sha256"], verification=current["verification"])
+                entries[folder] = entry
+                seen.add(folder)
+
+        for folder in set(entries) - seen:
+            del entries[folder]
+            changed = True
+
+        if changed:
+            _save(entries)
+        return dict(entries)
+
+
+def record_backup(timestamp: str) -> dict[str, Any] | None:
+    """Add or update a backup in the catalog, including its SHA-256 checksum."""
+    refresh_catalog()
+    with _lock:
+        entries = _load()
+        entry = entries.get(timestamp)
+        if entry is None:
+            return None
+        if entry["sha256"] is None:
+            entry["sha256"] = file_sha256(entry["path"])
+            _save(entries)
+        return dict(entry)
+
+
+def update_backup_entry(timestamp: str, **fields: Any) -> None:
+    """Store extra fields, such as a verification result, on a catalog entry."""
+    with _lock:
+        entries = _load()
+        if timestamp in entries:
+            entries[timestamp].update(fields)
+            _save(entries)
+
+
+def get_backup_entry(timestamp: str) -> dict[str, Any] | None:
+    return refresh_catalog().get(timestamp)
+
+
+def list_backups(
+    page: int = 1,
+    per_page: int = DEFAULT_PER_PAGE,
+    sort: str = "created",
+    order: str = "desc",
+) -> dict[str, Any]:
+    """One page of the catalog, sorted by one of SORT_KEYS."""
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Unsupported sort key: {sort}")
+    if order not in ("asc", "desc"):
+        raise ValueError(f"Unsupported sort order: {order}")
+    per_page = min(max(per_page, 1), MAX_PER_PAGE)
+
+    backups = sorted(
+        refresh_catalog().values(),
+        key=lambda entry: (entry[sort], entry["timestamp"]),
+        reverse=order == "desc",
+    )
+    pages = max((len(backups) + per_page - 1) // per_page, 1)
+    page = min(max(page, 1), pages)
+    start = (page - 1) * per_page
+    return {
+        "backups": backups[start : start + per_page],
+        "total": len(backups),
+        "page": page,
+        "pages": pages,
+        "per_page": per_page,
+        "sort": sort,
+        "order": order,
+    }
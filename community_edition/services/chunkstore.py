@@ -0,0 +1,415 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Final
+
+from .container import start_database
+from .dump import (
+    DUMP_CHUNK_SIZE,
+    DUMP_DATABASES,
+    MANIFEST_NAME,
+    SPOOL_COMPRESSION_LEVEL,
+    build_manifest,
+    check_backup_format,
+    create_dump_archive,
+    database_name,
+    dump_members,
+    get_compression_level,
+    new_dump_dir,
+    run_pg_dump,
+    validate_backup_archive,
+)
+from .env import load_env
+from .paths import BACKUP_DIR
+
+# Optional deduplicating backend (BACKUP_STORE=chunks). Dumps are split into
+# content-defined chunks stored once under dumps/.chunks/, keyed by their
+# SHA-256; a backup folder then only holds chunks.json listing its members as
+# chunk references. A regular dump.zip is rebuilt from the chunks on demand.
+BACKUP_STORES: Final[tuple[str, ...]] = ("archive", "chunks")
+CHUNK_DIR_NAME: Final[str] = ".chunks"
+INDEX_NAME: Final[str] = "chunks.json"
+INDEX_VERSION: Final[int] = 1
+
+# Chunks end at a line break whose line hashes to zero under the mask, so an
+# insert only changes the chunks around it. pg_dump output is line oriented;
+# data without line breaks (already compressed directory-format files) is
+# cut at MAX_CHUNK_SIZE.
+MIN_CHUNK_SIZE: Final[int] = 64 * 1024
+MAX_CHUNK_SIZE: Final[int] = 4 * 1024 * 1024
+BOUNDARY_MASK: Final[int] = 0x7FF
+
+logger = logging.getLogger(__name__)
+
+# Held while chunks are written or collected, so garbage collection never
+# removes chunks of a backup whose index isn't written yet.
+_store_lock = threading.Lock()
+
+
+def get_backup_store(env: dict[str, str]) -> str:
+    store = env.get("BACKUP_STORE") or "archive"
+    if store not in BACKUP_STORES:
+        raise ValueError(f"Unsupported backup store: {store}")
+    return store
+
+
+def get_chunk_dir() -> str:
+    return os.path.join(BACKUP_DIR, CHUNK_DIR_NAME)
+
+
+def _chunk_path(digest: str) -> str:
+    return os.path.join(get_chunk_dir(), digest[:2], digest)
+
+
+def is_chunked_backup(path: str) -> bool:
+    return os.path.basename(path) == INDEX_NAME
+
+
+def store_chunk(data: bytes, compression_level: int) -> list:
+    """Store a chunk unless it is already present. Returns [sha256, size, stored size]."""
+    digest = hashlib.sha256(data).hexdigest()
+    path = _chunk_path(digest)
+    try:
+        return [digest, len(data), os.path.getsize(path)]
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    compressed = zlib.compress(data, compression_level)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(compressed)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return [digest, len(data), len(compressed)]
+
+
+def read_chunk(digest: str) -> bytes:
+    with open(_chunk_path(digest), "rb") as f:
+        data = zlib.decompress(f.read())
+    if hashlib.sha256(data).hexdigest() != digest:
+        raise ValueError(f"Backup chunk {digest} is corrupt")
+    return data
+
+
+class ChunkWriter:
+    """Writable sink that splits what is written into content-defined chunks and stores them."""
+
+    def __init__(self, compression_level: int):
+        self.compression_level = compression_level
+        self.chunks: list[list] = []
+        self.size = 0
+        self._hasher = hashlib.sha256()
+        self._buffer = bytearray()
+        self._line_start = 0
+
+    def _next_cut(self) -> int:
+        buffer = self._buffer
+        end = min(len(buffer), MAX_CHUNK_SIZE)
+        while (newline := buffer.find(b"\n", self._line_start, end)) != -1:
+            line_start, self._line_start = self._line_start, newline + 1
+            if newline + 1 >= MIN_CHUNK_SIZE and zlib.crc32(buffer[line_start:newline]) & BOUNDARY_MASK == 0:
+                return newline + 1
+        return MAX_CHUNK_SIZE if len(buffer) >= MAX_CHUNK_SIZE else 0
+
+    def _emit(self, cut: int) -> None:
+        self.chunks.append(store_chunk(bytes(self._buffer[:cut]), self.compression_level))
+        self.size += cut
+        del self._buffer[:cut]
+        self._line_start = 0
+
+    def write(self, data: bytes) -> int:
+        self._hasher.update(data)
+        self._buffer += data
+        while cut := self._next_cut():
+            self._emit(cut)
+        return len(data)
+
+    def close(self) -> None:
+        if self._buffer:
+            self._emit(len(self._buffer))
+
+    def checksum(self) -> dict[str, Any]:
+        return {"size": self.size, "sha256": self._hasher.hexdigest()}
+
+
+def _write_index(dump_dir: str, backup_format: str, manifest: dict[str, Any], members: list[dict]) -> str:
+    index_path = os.path.join(dump_dir, INDEX_NAME)
+    tmp_path = f"{index_path}.partial"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": INDEX_VERSION, "format": backup_format, "manifest": manifest, "members": members}, f)
+    os.replace(tmp_path, index_path)
+    return index_path
+
+
+def _chunk_database(container_id: str, db_user: str, name: str, compression_level: int) -> dict[str, Any]:
+    writer = ChunkWriter(compression_level)
+    run_pg_dump(container_id, db_user, database_name(name), writer)
+    writer.close()
+    return {"name": f"{name}.sql", **writer.checksum(), "chunks": writer.chunks}
+
+
+def _chunk_archive(zip_path: str, compression_level: int) -> tuple[dict[str, Any], list[dict]]:
+    """Chunk the members of an existing backup archive. Returns its manifest and the member list."""
+    manifest = validate_backup_archive(zip_path)
+    members = []
+    with zipfile.ZipFile(zip_path) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or info.filename == MANIFEST_NAME:
+                continue
+            writer = ChunkWriter(compression_level)
+            with zf.open(info) as source:
+                shutil.copyfileobj(source, writer, DUMP_CHUNK_SIZE)
+            writer.close()
+            members.append({"name": info.filename, **writer.checksum(), "chunks": writer.chunks})
+    return manifest, members
+
+
+def create_chunked_backup(
+    compression_level: int | None = None,
+    backup_format: str | None = None,
+    jobs: int | None = None,
+) -> str:
+    """
+    Dump the databases into the chunk store and write dumps/<timestamp>/chunks.json.
+
+    Plain dumps are chunked straight from pg_dump, in parallel, so only new
+    chunks are ever written. Directory-format dumps are taken into an
+    uncompressed dump.zip first and chunked from there.
+    Returns the path of the index.
+    """
+    env = load_env()
+    db_user = env.get("DB_USER", "")
+    if compression_level is None:
+        compression_level = get_compression_level(env)
+    backup_format = check_backup_format(backup_format if backup_format is not None else env.get("BACKUP_FORMAT"))
+
+    if backup_format == "directory":
+        zip_path = create_dump_archive(compression_level=0, backup_format=backup_format, jobs=jobs)
+        dump_dir = os.path.dirname(zip_path)
+        try:
+            with _store_lock:
+                manifest, members = _chunk_archive(zip_path, compression_level)
+                return _write_index(dump_dir, backup_format, manifest, members)
+        except Exception:
+            shutil.rmtree(dump_dir, ignore_errors=True)
+            raise
+        finally:
+            if os.path.exists(zip_path):
+                os.remove(zip_path)
+
+    timestamp, dump_dir = new_dump_dir()
+    try:
+        container_id = start_database(db_user)
+        logger.info(f"Dumping databases {', '.join(DUMP_DATABASES)} into the chunk store for {timestamp}")
+        with _store_lock, ThreadPoolExecutor(max_workers=len(DUMP_DATABASES)) as executor:
+            futures = [
+                executor.submit(_chunk_database, container_id, db_user, name, compression_level)
+                for name in DUMP_DATABASES
+            ]
+            members = [future.result() for future in futures]
+            checksums = {member["name"]: {"size": member["size"], "sha256": member["sha256"]} for member in members}
+            manifest = build_manifest(env, timestamp, backup_format, members=checksums)
+            return _write_index(dump_dir, backup_format, manifest, members)
+    except Exception:
+        shutil.rmtree(dump_dir, ignore_errors=True)
+        raise
+
+
+def load_index(index_path: str) -> dict[str, Any]:
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except json.JSONDecodeError as exc:
+        raise ValueError(f"Backup chunk index is not valid JSON: {exc}") from exc
+    if not isinstance(index, dict) or index.get("version") != INDEX_VERSION:
+        raise ValueError("Unsupported backup chunk index")
+    return index
+
+
+def validate_chunked_backup(index_path: str) -> dict[str, Any]:
+    """Check a chunk index like validate_backup_archive checks an archive; returns the manifest."""
+    index = load_index(index_path)
+    manifest = index.get("manifest")
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("versions"), list):
+        raise ValueError("Backup manifest is missing the 'versions' list")
+
+    names = {member["name"] for member in index.get("members", [])}
+    missing = [name for name in dump_members(manifest) if name not in names]
+    missing += [
+        f"chunk {chunk[0]}"
+        for member in index["members"]
+        for chunk in member["chunks"]
+        if not os.path.exists(_chunk_path(chunk[0]))
+    ][:1]
+    if missing:
+        raise ValueError(f"Backup is missing: {', '.join(missing)}")
+    return manifest
+
+
+def validate_backup(path: str) -> dict[str, Any]:
+    """Validate a dump.zip archive or a chunks.json index and return the backup manifest."""
+    if is_chunked_backup(path):
+        return validate_chunked_backup(path)
+    return validate_backup_archive(path)
+
+
+def get_index_chunks(index: dict[str, Any]) -> dict[str, int]:
+    """The distinct chunks of a backup: stored size by digest."""
+    return {digest: stored_size for member in index["members"] for digest, _, stored_size in member["chunks"]}
+
+
+def get_index_sizes(index: dict[str, Any]) -> tuple[int, int]:
+    """Logical size (the dumps' own size) and physical size (its distinct chunks as stored) of a backup."""
+    logical = sum(member["size"] for member in index["members"])
+    return logical, sum(get_index_chunks(index).values())
+
+
+class _ChunkReader(io.RawIOBase):
+    def __init__(self, chunks: list[list]):
+        self._digests = iter(chunk[0] for chunk in chunks)
+        self._current = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._current:
+            digest = next(self._digests, None)
+            if digest is None:
+                return 0
+            self._current = memoryview(read_chunk(digest))
+        size = min(len(buffer), len(self._current))
+        buffer[:size] = self._current[:size]
+        self._current = self._current[size:]
+        return size
+
+
+class ChunkedBackup:
+    """Read-only view of a chunked backup with the parts of the zipfile.ZipFile API restores use."""
+
+    def __init__(self, index_path: str):
+        self.index = load_index(index_path)
+        self._members = {member["name"]: member for member in self.index["members"]}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        pass
+
+    def namelist(self) -> list[str]:
+        return list(self._members)
+
+    def infolist(self) -> list[zipfile.ZipInfo]:
+        infos = []
+        for member in self._members.values():
+            info = zipfile.ZipInfo(member["name"])
+            info.file_size = member["size"]
+            infos.append(info)
+        return infos
+
+    def open(self, name: str | zipfile.ZipInfo) -> io.BufferedReader:
+        if isinstance(name, zipfile.ZipInfo):
+            name = name.filename
+        if name not in self._members:
+            raise KeyError(f"There is no item named {name!r} in the backup")
+        return io.BufferedReader(_ChunkReader(self._members[name]["chunks"]), DUMP_CHUNK_SIZE)
+
+
+def open_backup(path: str) -> zipfile.ZipFile | ChunkedBackup:
+    return ChunkedBackup(path) if is_chunked_backup(path) else zipfile.ZipFile(path)
+
+
+class _StreamSink:
+    """Write-only, unseekable target that lets zipfile output be yielded as it is produced."""
+
+    def __init__(self):
+        self._parts: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> Iterator[bytes]:
+        parts, self._parts = self._parts, []
+        yield from parts
+
+
+def stream_backup_zip(index_path: str) -> Iterator[bytes]:
+    """Rebuild a regular dump.zip from a chunked backup, yielding it piece by piece."""
+    with ChunkedBackup(index_path) as backup:
+        # Directory-format table data is already compressed by pg_dump.
+        if backup.index["format"] == "directory":
+            compression = zipfile.ZIP_STORED
+        else:
+            compression = zipfile.ZIP_DEFLATED
+        sink = _StreamSink()
+        zf = zipfile.ZipFile(sink, "w", compression, compresslevel=SPOOL_COMPRESSION_LEVEL)
+        for info in backup.infolist():
+            with backup.open(info) as source, zf.open(info.filename, "w", force_zip64=True) as target:
+                while block := source.read(DUMP_CHUNK_SIZE):
+                    target.write(block)
+                    yield from sink.drain()
+        zf.writestr(MANIFEST_NAME, json.dumps(backup.index["manifest"], indent=4))
+        zf.close()
+        yield from sink.drain()
+
+
+def collect_garbage() -> int:
+    """
+    Remove chunks no backup references any more. Returns the number of bytes freed.
+    Skipped while a backup is being written, its chunks are collected next time.
+    """
+    chunk_dir = get_chunk_dir()
+    if not os.path.isdir(chunk_dir) or not _store_lock.acquire(blocking=False):
+        return 0
+
+    try:
+        referenced = set()
+        with os.scandir(BACKUP_DIR) as it:
+            for entry in it:
+                index_path = os.path.join(entry.path, INDEX_NAME)
+                if entry.name.startswith(".") or not os.path.exists(index_path):
+                    continue
+                index = load_index(index_path)
+                referenced.update(chunk[0] for member in index["members"] for chunk in member["chunks"])
+
+        freed = 0
+        cutoff = time.time() - 60
+        for prefix in os.listdir(chunk_dir):
+            prefix_dir = os.path.join(chunk_dir, prefix)
+            for name in os.listdir(prefix_dir):
+                path = os.path.join(prefix_dir, name)
+                if name in referenced:
+                    continue
+                # Leftovers of an interrupted chunk write are only removed once stale.
+                if name.startswith(".tmp-") and os.path.getmtime(path) > cutoff:
+                    continue
+                freed += os.path.getsize(path)
+                os.remove(path)
+    finally:
+        _store_lock.release()
+
+    if freed:
+        logger.info(f"Removed {freed} bytes of unreferenced backup chunks")
+    return freed
@@ -1,19 +1,182 @@
+import logging
+import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Final
+
+from .dockerapi import get_docker_client
+from .env import ENV_FILE
+from .health import wait_until
+from .paths import PROJECT_DIR
+
+# Where the Docker socket is reachable these talk to the Engine API through a
+# pooled connection; otherwise they run the docker CLI as before. Creating and
+# recreating containers is always left to compose (`make up`).
+COMPOSE_FILE: Final[str] = "docker-compose.yml"
+STOP_TIMEOUT: Final[int] = 10
+
+logger = logging.getLogger(__name__)
+
+# Containers stopped by down_containers, and the compose inputs they were created from.
+_stopped: dict[str, Any] = {"ids": [], "fingerprint": None}
+
+
+def _compose_fingerprint() -> tuple:
+    """Size and mtime of the files compose builds the containers from."""
+    fingerprint = []
+    for path in (COMPOSE_FILE, ENV_FILE):
+        try:
+            stat = os.stat(path)
+            fingerprint.append((path, stat.st_size, stat.st_mtime_ns))
+        except FileNotFoundError:
+            fingerprint.append((path, None, None))
+    return tuple(fingerprint)
+
+
+def _make(target: str) -> None:
+    result = subprocess.run(["make", target], check=False, capture_output=True, text=True)
+    if result.returncode != 0:
+        verb = "stop" if target == "down" else "start"
+        raise RuntimeError(f"Failed to {verb} containers: {result.stderr}")
+
+
+def _run_all(action, container_ids: list[str]) -> None:
+    if not container_ids:
+        return
+    with ThreadPoolExecutor(max_workers=len(container_ids)) as executor:
+        list(executor.map(action, container_ids))
 
 
 def down_containers() -> None:
     """
-    Stop all running containers using 'make down' command.
+    Stop all running containers, through the Docker API when available,
+    otherwise using 'make down' command.
     """
-    result_down = subprocess.run(["make", "down"], check=False, capture_output=True, text=True)
-    if result_down.returncode != 0:
-        raise RuntimeError(f"Failed to stop containers: {result_down.stderr}")
+    client = get_docker_client()
+    if client is None:
+        _stopped.update(ids=[], fingerprint=None)
+        _make("down")
+        return
+
+    container_ids = [container["Id"] for container in client.ps()]
+    try:
+        _run_all(lambda container_id: client.stop(container_id, STOP_TIMEOUT), container_ids)
+    except Exception as e:
+        raise RuntimeError(f"Failed to stop containers: {e}") from e
+    _stopped.update(ids=container_ids, fingerprint=_compose_fingerprint())
 
 
 def up_containers() -> None:
     """
-    Start all containers using 'make up' command.
+    Start all containers. Containers stopped by down_containers are started
+    again through the Docker API if the compose file and .env are unchanged;
+    anything else goes through 'make up' command.
+    """
+    client = get_docker_client()
+    container_ids, fingerprint = _stopped["ids"], _stopped["fingerprint"]
+    _stopped.update(ids=[], fingerprint=None)
+    if client is not None and container_ids and fingerprint == _compose_fingerprint():
+        try:
+            _run_all(client.start, container_ids)
+            return
+        except Exception as e:
+            logger.warning(f"Could not restart the stopped containers, recreating them: {e}")
+    _make("up")
+
+
+def get_container_id(service: str) -> str:
+    """
+    Return the id of the running container of a compose service.
     """
-    result_up = subprocess.run(["make", "up"], check=False, capture_output=True, text=True)
-    if result_up.returncode != 0:
-        raise RuntimeError(f"Failed to start containers: {result_up.stderr}")
+    client = get_docker_client()
+    if client is not None:
+        containers = client.ps(service)
+        if not containers:
+            raise RuntimeError(f"Container for service '{service}' is not running")
+        return containers[0]["Id"]
+
+    result = subprocess.run(
+        ["docker", "compose", "ps", "-q", service],
+        check=False,
+        capture_output=True,
+        text=True,
+        cwd=PROJECT_DIR,
+    )
+    container_id = (result.stdout or "").strip().splitlines()
+    if result.returncode != 0 or not container_id:
+        raise RuntimeError(f"Container for service '{service}' is not running: {result.stderr}")
+    return container_id[0]
+
+
+def _is_postgres_ready(container_id: str, db_user: str) -> bool:
+    command = ["pg_isready", "-U", db_user]
+    client = get_docker_client()
+    if client is not None:
+        exit_code, _, _ = client.exec(container_id, command)
+        return exit_code == 0
+    ready = subprocess.run(["docker", "exec", container_id, *command], check=False, capture_output=True)
+    return ready.returncode == 0
+
+
+def start_database(db_user: str, timeout: float = 120) -> str:
+    """
+    Start the PostgreSQL service and wait until it accepts connections.
+    Returns the database container id.
+    """
+    result = subprocess.run(
+        ["docker", "compose", "up", "-d", "db"],
+        check=False,
+        capture_output=True,
+        text=True,
+        cwd=PROJECT_DIR,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to start database container: {result.stderr}")
+
+    try:
+        wait_until(lambda: _is_postgres_ready(get_container_id("db"), db_user), "PostgreSQL readiness", timeout)
+    except TimeoutError:
+        raise RuntimeError(f"PostgreSQL did not become ready within {timeout} seconds") from None
+    return get_container_id("db")
+
+
+def is_service_running(service: str) -> bool:
+    """
+    Check whether a compose service has a running container.
+    """
+    client = get_docker_client()
+    if client is not None:
+        return bool(client.ps(service))
+
+    result = subprocess.run(
+        ["docker", "compose", "ps", "-q", service],
+        check=False,
+        capture_output=True,
+        text=True,
+        cwd=PROJECT_DIR,
+    )
+    return result.returncode == 0 and bool((result.stdout or "").strip())
+
+
+def restart_services(services: list[str]) -> None:
+    """
+    Restart the containers of compose services.
+    """
+    client = get_docker_client()
+    if client is not None:
+        container_ids = [container["Id"] for service in services for container in client.ps(service)]
+        try:
+            _run_all(lambda container_id: client.restart(container_id, STOP_TIMEOUT), container_ids)
+        except Exception as e:
+            raise RuntimeError(f"Failed to restart {', '.join(services)}: {e}") from e
+        return
+
+    result = subprocess.run(
+        ["docker", "compose", "restart", *services],
+        check=False,
+        capture_output=True,
+        text=True,
+        cwd=PROJECT_DIR,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to restart {', '.join(services)}: {result.stderr}")
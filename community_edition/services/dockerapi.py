@@ -0,0 +1,296 @@
+import contextlib
+import http.client
+import json
+import os
+import queue
+import re
+import socket
+import struct
+import threading
+import urllib.parse
+from collections.abc import Iterator
+from typing import Any, Final
+
+from .paths import PROJECT_DIR
+
+# A small Docker Engine API client over the daemon's unix socket. Requests
+# reuse keep-alive connections from a pool instead of starting a docker CLI
+# process each; log follows and exec sessions, which hold their connection
+# until the stream ends, get a connection of their own.
+DEFAULT_DOCKER_SOCKET: Final[str] = "/var/run/docker.sock"
+API_VERSION: Final[str] = "v1.41"
+POOL_SIZE: Final[int] = 4
+REQUEST_TIMEOUT: Final[float] = 60.0
+STREAM_STDOUT: Final[int] = 1
+STREAM_STDERR: Final[int] = 2
+
+_FRAME_HEADER: Final[struct.Struct] = struct.Struct(">BxxxL")
+
+
+class DockerAPIError(RuntimeError):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Docker API error {status}: {message}")
+        self.status = status
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float | None = REQUEST_TIMEOUT):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+def get_socket_path() -> str:
+    """The daemon socket from DOCKER_HOST if it is a unix:// address, else the default one."""
+    host = os.environ.get("DOCKER_HOST", "")
+    return host[len("unix://") :] if host.startswith("unix://") else DEFAULT_DOCKER_SOCKET
+
+
+def get_compose_project() -> str:
+    """Compose project name, as `docker compose` derives it from the project directory."""
+    name = os.environ.get("COMPOSE_PROJECT_NAME") or os.path.basename(PROJECT_DIR)
+    return re.sub(r"[^a-z0-9_-]", "", name.lower())
+
+
+def demultiplex(read) -> Iterator[tuple[int, bytes]]:
+    """Split a multiplexed attach/logs stream, read with read(n), into (stream, payload) frames."""
+    while True:
+        header = read(_FRAME_HEADER.size)
+        if len(header) < _FRAME_HEADER.size:
+            return
+        stream, size = _FRAME_HEADER.unpack(header)
+        payload = read(size)
+        yield stream, payload
+        if len(payload) < size:
+            return
+
+
+class LogStream:
+    """
+    (stream, data) pieces of a log or exec output as they arrive, on a connection
+    of its own. close() may be called from another thread to end a follow.
+    """
+
+    def __init__(self, connection: _UnixHTTPConnection, response: http.client.HTTPResponse, tty: bool = False):
+        self.connection = connection
+        self.response = response
+        self.tty = tty
+
+    def __iter__(self) -> Iterator[tuple[int, bytes]]:
+        if self.tty:
+            while data := self.response.read1(64 * 1024):
+                yield STREAM_STDOUT, data
+        else:
+            yield from demultiplex(self.response.read)
+
+    def close(self) -> None:
+        if self.connection.sock is not None:
+            with contextlib.suppress(OSError):
+                self.connection.sock.shutdown(socket.SHUT_RDWR)
+        self.connection.close()
+
+    def __enter__(self) -> "LogStream":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class DockerClient:
+    def __init__(self, socket_path: str, timeout: float = REQUEST_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._pool: queue.LifoQueue[_UnixHTTPConnection] = queue.LifoQueue(maxsize=POOL_SIZE)
+
+    def _connection(self) -> _UnixHTTPConnection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return _UnixHTTPConnection(self.socket_path, self.timeout)
+
+    def _release(self, connection: _UnixHTTPConnection) -> None:
+        try:
+            self._pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    @staticmethod
+    def _url(path: str, params: dict[str, Any] | None = None) -> str:
+        query = {key: value for key, value in (params or {}).items() if value is not None}
+        return f"/{API_VERSION}{path}" + (f"?{urllib.parse.urlencode(query)}" if query else "")
+
+    @staticmethod
+    def _send(connection: _UnixHTTPConnection, method: str, url: str, body: Any) -> http.client.HTTPResponse:
+        payload = None if body is None else json.dumps(body).encode()
+        headers = {"Content-Type": "application/json"} if payload is not None else {}
+        connection.request(method, url, body=payload, headers=headers)
+        return connection.getresponse()
+
+    @staticmethod
+    def _check(response: http.client.HTTPResponse, data: bytes) -> None:
+        if response.status >= 400:
+            try:
+                message = json.loads(data).get("message", "")
+            except ValueError:
+                message = data.decode("utf-8", errors="replace")
+            raise DockerAPIError(response.status, message)
+
+    def request(self, method: str, path: str, params: dict[str, Any] | None = None, body: Any = None) -> Any:
+        """Make a request on a pooled connection and return the decoded JSON body (None if empty)."""
+        url = self._url(path, params)
+        connection = self._connection()
+        try:
+            try:
+                response = self._send(connection, method, url, body)
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # The daemon closed an idle pooled connection; retry once on a new one.
+                connection.close()
+                response = self._send(connection, method, url, body)
+            data = response.read()
+        except BaseException:
+            connection.close()
+            raise
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(connection)
+        self._check(response, data)
+        return json.loads(data) if data else None
+
+    def _stream(
+        self,
+        method: str,
+        path: str,
+        params: dict[str, Any] | None = None,
+        body: Any = None,
+        timeout: float | None = None,
+    ) -> tuple[_UnixHTTPConnection, http.client.HTTPResponse]:
+        connection = _UnixHTTPConnection(self.socket_path, timeout)
+        try:
+            response = self._send(connection, method, self._url(path, params), body)
+            if response.status >= 400:
+                self._check(response, response.read())
+        except BaseException:
+            connection.close()
+            raise
+        return connection, response
+
+    def ping(self) -> bool:
+        connection = _UnixHTTPConnection(self.socket_path, timeout=2)
+        try:
+            connection.request("GET", "/_ping")
+            return connection.getresponse().status == 200
+        except OSError:
+            return False
+        finally:
+            connection.close()
+
+    def ps(self, service: str | None = None, all: bool = False, project: str | None = None) -> list[dict[str, Any]]:
+        """Containers of the compose project (one-off `compose run` containers excluded), optionally of one service."""
+        labels = [f"com.docker.compose.project={project or get_compose_project()}", "com.docker.compose.oneoff=False"]
+        if service:
+            labels.append(f"com.docker.compose.service={service}")
+        filters = json.dumps({"label": labels})
+        return self.request("GET", "/containers/json", {"all": int(all), "filters": filters})
+
+    def inspect(self, container: str) -> dict[str, Any]:
+        return self.request("GET", f"/containers/{container}/json")
+
+    def image_exists(self, image: str) -> bool:
+        try:
+            self.request("GET", f"/images/{image}/json")
+        except DockerAPIError as e:
+            if e.status == 404:
+                return False
+            raise
+        return True
+
+    def pull(self, image: str) -> Iterator[dict[str, Any]]:
+        """Pull an image, yielding the daemon's progress messages as they arrive."""
+        name, tag = image, "latest"
+        if ":" in image.rsplit("/", 1)[-1]:
+            name, tag = image.rsplit(":", 1)
+        connection, response = self._stream("POST", "/images/create", {"fromImage": name, "tag": tag})
+        try:
+            while line := response.readline():
+                if not line.strip():
+                    continue
+                message = json.loads(line)
+                if "error" in message:
+                    raise DockerAPIError(500, message["error"])
+                yield message
+        finally:
+            connection.close()
+
+    def start(self, container: str) -> None:
+        self.request("POST", f"/containers/{container}/start")
+
+    def stop(self, container: str, timeout: int = 10) -> None:
+        self.request("POST", f"/containers/{container}/stop", {"t": timeout})
+
+    def restart(self, container: str, timeout: int = 10) -> None:
+        self.request("POST", f"/containers/{container}/restart", {"t": timeout})
+
+    def stats(self, container: str) -> dict[str, Any]:
+        """A single resource usage sample."""
+        return self.request("GET", f"/containers/{container}/stats", {"stream": 0})
+
+    def logs(
+        self,
+        container: str,
+        tail: int | str = "all",
+        since: str | None = None,
+        until: str | None = None,
+        follow: bool = False,
+        timestamps: bool = True,
+    ) -> "LogStream":
+        """A container's log as a LogStream; since and until are Unix times."""
+        tty = self.inspect(container)["Config"].get("Tty", False)
+        params = {
+            "stdout": 1,
+            "stderr": 1,
+            "tail": tail,
+            "since": since,
+            "until": until,
+            "follow": int(follow),
+            "timestamps": int(timestamps),
+        }
+        connection, response = self._stream("GET", f"/containers/{container}/logs", params)
+        return LogStream(connection, response, tty)
+
+    def exec(self, container: str, command: list[str], timeout: float | None = None) -> tuple[int, bytes, bytes]:
+        """Run a command in a container; returns its exit code, stdout and stderr."""
+        created = self.request(
+            "POST",
+            f"/containers/{container}/exec",
+            body={"Cmd": command, "AttachStdout": True, "AttachStderr": True},
+        )
+        connection, response = self._stream(
+            "POST", f"/exec/{created['Id']}/start", body={"Detach": False, "Tty": False}, timeout=timeout
+        )
+        output: dict[int, list[bytes]] = {STREAM_STDOUT: [], STREAM_STDERR: []}
+        with LogStream(connection, response) as frames:
+            for stream, data in frames:
+                output.setdefault(stream, []).append(data)
+        exit_code = self.request("GET", f"/exec/{created['Id']}/json")["ExitCode"]
+        return exit_code, b"".join(output[STREAM_STDOUT]), b"".join(output[STREAM_STDERR])
+
+
+_clients: dict[str, DockerClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_docker_client() -> DockerClient | None:
+    """Shared client for the daemon socket, or None when there is no socket to talk to."""
+    path = get_socket_path()
+    if not os.path.exists(path):
+        return None
+    with _clients_lock:
+        if path not in _clients:
+            _clients[path] = DockerClient(path)
+        return _clients[path]
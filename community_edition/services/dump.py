@@ -0,0 +1,356 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime, timedelta
+from typing import IO, Any, Final
+
+from .container import start_database
+from .env import load_env
+from .paths import BACKUP_DIR
+from .versions import VERSION_MAPPING
+
+# Dumped in parallel. The first database is streamed straight into its archive
+# member; the others are spooled compressed until the archive is free to write.
+DUMP_DATABASES: Final[tuple[str, ...]] = ("backend", "workflow")
+DUMP_CHUNK_SIZE: Final[int] = 1024 * 1024
+DEFAULT_COMPRESSION_LEVEL: Final[int] = 6
+SPOOL_COMPRESSION_LEVEL: Final[int] = 1
+MANIFEST_NAME: Final[str] = "manifest.json"
+
+# "plain": <name>.sql members restored with psql.
+# "directory": pg_dump -Fd output stored under <name>/ and restored with pg_restore -j N.
+BACKUP_FORMATS: Final[tuple[str, ...]] = ("plain", "directory")
+
+logger = logging.getLogger(__name__)
+
+
+def database_name(name: str) -> str:
+    return f"{name}_realm00000"
+
+
+def get_compression_level(env: dict[str, str]) -> int:
+    try:
+        level = int(env.get("BACKUP_COMPRESSION_LEVEL", DEFAULT_COMPRESSION_LEVEL))
+    except ValueError:
+        return DEFAULT_COMPRESSION_LEVEL
+    return min(max(level, 0), 9)
+
+
+def check_backup_format(backup_format: str | None) -> str:
+    backup_format = backup_format or "plain"
+    if backup_format not in BACKUP_FORMATS:
+        raise ValueError(f"Unsupported backup format: {backup_format}")
+    return backup_format
+
+
+def get_backup_format(manifest: dict[str, Any]) -> str:
+    """Archives written before the format was recorded are plain SQL."""
+    return check_backup_format(manifest.get("format"))
+
+
+def get_parallel_jobs(env: dict[str, str]) -> int:
+    """Number of pg_dump/pg_restore jobs, BACKUP_JOBS or the host's core count."""
+    try:
+        jobs = int(env.get("BACKUP_JOBS") or 0)
+    except ValueError:
+        jobs = 0
+    return jobs if jobs > 0 else os.cpu_count() or 1
+
+
+def dump_members(manifest: dict[str, Any]) -> list[str]:
+    """Archive members each database dump must be present as, for the manifest's format."""
+    if get_backup_format(manifest) == "directory":
+        return [f"{name}/toc.dat" for name in DUMP_DATABASES]
+    return [f"{name}.sql" for name in DUMP_DATABASES]
+
+
+def validate_backup_archive(path: str) -> dict[str, Any]:
+    """
+    Check the zip central directory and manifest of a backup archive without extracting it.
+    Returns the parsed manifest, raises ValueError if the archive is unusable.
+    """
+    try:
+        with zipfile.ZipFile(path) as zf:
+            names = set(zf.namelist())
+            if MANIFEST_NAME not in names:
+                raise ValueError(f"Backup archive has no {MANIFEST_NAME}")
+            with zf.open(MANIFEST_NAME) as f:
+                manifest = json.load(f)
+    except zipfile.BadZipFile as exc:
+        raise ValueError(f"Backup file is not a valid zip archive: {exc}") from exc
+    except json.JSONDecodeError as exc:
+        raise ValueError(f"Backup manifest is not valid JSON: {exc}") from exc
+
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("versions"), list):
+        raise ValueError("Backup manifest is missing the 'versions' list")
+
+    missing = [name for name in dump_members(manifest) if name not in names]
+    if missing:
+        raise ValueError(f"Backup archive is missing: {', '.join(missing)}")
+
+    return manifest
+
+
+class HashingWriter:
+    """Pass-through sink that records the size and SHA-256 of everything written to it."""
+
+    def __init__(self, sink: IO[bytes]):
+        self.sink = sink
+        self.size = 0
+        self._hasher = hashlib.sha256()
+
+    def write(self, data: bytes) -> int:
+        self.sink.write(data)
+        self._hasher.update(data)
+        self.size += len(data)
+        return len(data)
+
+    def checksum(self) -> dict[str, Any]:
+        return {"size": self.size, "sha256": self._hasher.hexdigest()}
+
+
+def build_manifest(
+    env: dict[str, str],
+    timestamp: str,
+    backup_format: str = "plain",
+    members: dict[str, dict[str, Any]] | None = None,
+) -> dict[str, Any]:
+    """
+    Build manifest.json with the same layout create-dumps.sh writes, plus the dump
+    format and, when given, the size and SHA-256 of every archive member.
+    """
+    versions = [
+        {"app": app_name, "version": env[env_var]} for env_var, app_name in VERSION_MAPPING.items() if env.get(env_var)
+    ]
+    return {
+        "name": "Community edition",
+        "space_code": env.get("BASE_API_URL", ""),
+        "realm_code": env.get("REALM_CODE", ""),
+        "versions": versions,
+        "date": datetime.strptime(timestamp, "%Y%m%d%H%M%S").strftime("%Y-%m-%d"),
+        "owner": {"username": "community_edition"},
+        "format": backup_format,
+        **({"members": members} if members is not None else {}),
+    }
+
+
+def run_pg_dump(container_id: str, db_user: str, database: str, sink: IO[bytes]) -> None:
+    """Stream `pg_dump` of a database into a writable binary file object."""
+    with tempfile.TemporaryFile() as stderr:
+        proc = subprocess.Popen(
+            ["docker", "exec", container_id, "pg_dump", "-U", db_user, "-d", database],
+            stdout=subprocess.PIPE,
+            stderr=stderr,
+        )
+        try:
+            while block := proc.stdout.read(DUMP_CHUNK_SIZE):
+                sink.write(block)
+        finally:
+            # Closing the pipe early makes pg_dump exit if the sink failed.
+            proc.stdout.close()
+            returncode = proc.wait()
+
+        if returncode != 0:
+            stderr.seek(0)
+            message = stderr.read().decode("utf-8", errors="replace")
+            raise RuntimeError(f"pg_dump of '{database}' failed: {message}")
+
+
+def _dump_to_spool(container_id: str, db_user: str, database: str, spool_path: str) -> None:
+    with gzip.open(spool_path, "wb", compresslevel=SPOOL_COMPRESSION_LEVEL) as spool:
+        run_pg_dump(container_id, db_user, database, spool)
+
+
+def _dump_to_member(
+    zf: zipfile.ZipFile, container_id: str, db_user: str, database: str, member: str
+) -> dict[str, Any]:
+    with zf.open(member, "w", force_zip64=True) as sink:
+        writer = HashingWriter(sink)
+        run_pg_dump(container_id, db_user, database, writer)
+    return writer.checksum()
+
+
+def _dump_directory_format(container_id: str, db_user: str, database: str, container_dir: str, jobs: int) -> None:
+    """Run `pg_dump -Fd -j N` inside the database container into container_dir."""
+    result = subprocess.run(
+        [
+            "docker",
+            "exec",
+            container_id,
+            "sh",
+            "-c",
+            'rm -rf "$3" && pg_dump -U "$1" -d "$2" -Fd -j "$4" -f "$3"',
+            "sh",
+            db_user,
+            database,
+            container_dir,
+            str(jobs),
+        ],
+        check=False,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"pg_dump of '{database}' failed: {result.stderr}")
+
+
+def _copy_directory_to_archive(
+    zf: zipfile.ZipFile, container_id: str, container_dir: str, prefix: str
+) -> dict[str, dict[str, Any]]:
+    """Stream a directory out of the container as tar and store its files under prefix/ in the archive."""
+    checksums = {}
+    proc = subprocess.Popen(
+        ["docker", "exec", container_id, "tar", "-C", container_dir, "-cf", "-", "."],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        with tarfile.open(fileobj=proc.stdout, mode="r|") as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                # pg_dump already compressed the table data, store it as is.
+                info = zipfile.ZipInfo(f"{prefix}/{os.path.normpath(member.name)}", time.localtime()[:6])
+                info.compress_type = zipfile.ZIP_STORED
+                with tar.extractfile(member) as source, zf.open(info, "w", force_zip64=True) as sink:
+                    writer = HashingWriter(sink)
+                    shutil.copyfileobj(source, writer, DUMP_CHUNK_SIZE)
+                checksums[info.filename] = writer.checksum()
+    finally:
+        proc.stdout.close()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise RuntimeError(f"Failed to read '{container_dir}' from the database container")
+    return checksums
+
+
+def _write_directory_dumps(
+    zf: zipfile.ZipFile, container_id: str, db_user: str, timestamp: str, jobs: int
+) -> dict[str, dict[str, Any]]:
+    checksums = {}
+    container_dirs = {name: f"/tmp/finmars-dump-{timestamp}-{name}" for name in DUMP_DATABASES}
+    try:
+        with ThreadPoolExecutor(max_workers=len(DUMP_DATABASES)) as executor:
+            futures = [
+                executor.submit(
+                    _dump_directory_format, container_id, db_user, database_name(name), container_dirs[name], jobs
+                )
+                for name in DUMP_DATABASES
+            ]
+            for future in futures:
+                future.result()
+
+        for name in DUMP_DATABASES:
+            checksums.update(_copy_directory_to_archive(zf, container_id, container_dirs[name], name))
+    finally:
+        subprocess.run(
+            ["docker", "exec", container_id, "rm", "-rf", *container_dirs.values()],
+            check=False,
+            capture_output=True,
+        )
+    return checksums
+
+
+def _write_plain_dumps(
+    zf: zipfile.ZipFile, container_id: str, db_user: str, dump_dir: str
+) -> dict[str, dict[str, Any]]:
+    streamed, *spooled = DUMP_DATABASES
+    spool_paths = {name: os.path.join(dump_dir, f".{name}.sql.gz") for name in spooled}
+
+    with ThreadPoolExecutor(max_workers=len(DUMP_DATABASES)) as executor:
+        futures = [
+            executor.submit(_dump_to_member, zf, container_id, db_user, database_name(streamed), f"{streamed}.sql")
+        ]
+        futures += [
+            executor.submit(_dump_to_spool, container_id, db_user, database_name(name), spool_paths[name])
+            for name in spooled
+        ]
+        checksums = {f"{streamed}.sql": futures[0].result()}
+        for future in futures[1:]:
+            future.result()
+
+    for name in spooled:
+        with (
+            gzip.open(spool_paths[name], "rb") as spool,
+            zf.open(f"{name}.sql", "w", force_zip64=True) as sink,
+        ):
+            writer = HashingWriter(sink)
+            shutil.copyfileobj(spool, writer, DUMP_CHUNK_SIZE)
+        checksums[f"{name}.sql"] = writer.checksum()
+        os.remove(spool_paths[name])
+    return checksums
+
+
+def new_dump_dir() -> tuple[str, str]:
+    """
+    Create dumps/<timestamp>/ for a new backup, returns the timestamp and the directory.
+    The directory is always a new one: if a backup of this second exists, the
+    next free second is taken, so a failing backup never removes another's files.
+    """
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    moment = datetime.now(UTC)
+    while True:
+        timestamp = moment.strftime("%Y%m%d%H%M%S")
+        dump_dir = os.path.join(BACKUP_DIR, timestamp)
+        try:
+            os.mkdir(dump_dir)
+            return timestamp, dump_dir
+        except FileExistsError:
+            moment += timedelta(seconds=1)
+
+
+def create_dump_archive(
+    compression_level: int | None = None,
+    backup_format: str | None = None,
+    jobs: int | None = None,
+) -> str:
+    """
+    Dump the backend and workflow databases concurrently into dumps/<timestamp>/dump.zip.
+
+    The format defaults to BACKUP_FORMAT from .env ("plain" when unset); the
+    directory format runs pg_dump with `jobs` workers per database.
+    Returns the path of the created archive. The archive is written under a
+    temporary name and only renamed to dump.zip once complete.
+    """
+    env = load_env()
+    db_user = env.get("DB_USER", "")
+    if compression_level is None:
+        compression_level = get_compression_level(env)
+    if backup_format is None:
+        backup_format = env.get("BACKUP_FORMAT")
+    backup_format = check_backup_format(backup_format)
+    if jobs is None:
+        jobs = get_parallel_jobs(env)
+
+    timestamp, dump_dir = new_dump_dir()
+    dump_zip_path = os.path.join(dump_dir, "dump.zip")
+    partial_path = f"{dump_zip_path}.partial"
+
+    try:
+        container_id = start_database(db_user)
+        logger.info(f"Dumping databases {', '.join(DUMP_DATABASES)} ({backup_format} format) into {dump_zip_path}")
+
+        with zipfile.ZipFile(partial_path, "w", zipfile.ZIP_DEFLATED, compresslevel=compression_level) as zf:
+            if backup_format == "directory":
+                checksums = _write_directory_dumps(zf, container_id, db_user, timestamp, jobs)
+            else:
+                checksums = _write_plain_dumps(zf, container_id, db_user, dump_dir)
+
+            manifest = build_manifest(env, timestamp, backup_format, members=checksums)
+            zf.writestr(MANIFEST_NAME, json.dumps(manifest, indent=4))
+
+        os.replace(partial_path, dump_zip_path)
+    except Exception:
+        shutil.rmtree(dump_dir, ignore_errors=True)
+        raise
+
+    return dump_zip_path
@@ -1,18 +1,125 @@
+import logging
 import os
+import re
+import threading
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Final
 
 ENV_FILE = ".env"
 
+# .env is parsed once and kept until the file changes: each lookup costs a
+# stat() of the file, and it is re-read only when its inode, size or mtime
+# differ from those of the parsed copy (`make update-versions` and the setup
+# scripts replace or rewrite it behind the app's back).
+_KEY_PATTERN: Final[re.Pattern] = re.compile(r"[A-Za-z_][A-Za-z0-9_.]*")
+_ESCAPES: Final[dict[str, str]] = {"n": "\n", "t": "\t", "r": "\r", '"': '"', "\\": "\\", "$": "$"}
 
-def load_env() -> dict[str, str]:
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class EnvConfig:
+    """The parsed contents of a .env file, shared by every reader until the file changes."""
+
+    path: str
+    signature: tuple | None = None
+    values: MappingProxyType = field(default_factory=lambda: MappingProxyType({}))
+
+    def get(self, key: str, default: str | None = None) -> str | None:
+        return self.values.get(key, default)
+
+
+_lock = threading.Lock()
+_configs: dict[str, EnvConfig] = {}
+
+
+def _unquote(value: str, path: str, number: int) -> str:
+    quote = value[0]
+    chars = []
+    i = 1
+    while i < len(value):
+        char = value[i]
+        if char == quote:
+            rest = value[i + 1 :].strip()
+            if rest and not rest.startswith("#"):
+                logger.warning(f"{path}:{number}: ignoring text after the closing quote")
+            return "".join(chars)
+        if char == "\\" and quote == '"' and i + 1 < len(value):
+            i += 1
+            chars.append(_ESCAPES.get(value[i], "\\" + value[i]))
+        else:
+            chars.append(char)
+        i += 1
+    logger.warning(f"{path}:{number}: missing closing quote")
+    return "".join(chars)
+
+
+def parse_env(text: str, path: str = ENV_FILE) -> dict[str, str]:
+    """
+    Parse .env text: KEY=value lines with an optional `export ` prefix, single
+    or double quoted values (with backslash escapes in double quotes) and
+    comment lines. An unquoted value is taken as written, " #" included, as
+    .env files always have been here; a comment may follow a quoted value.
+    Surrounding whitespace is dropped from values, also inside quotes.
+    Malformed lines are logged and skipped.
+    """
     env: dict[str, str] = {}
-    if not os.path.exists(ENV_FILE):
-        return env
-
-    with open(ENV_FILE) as f:
-        for line in f:
-            line_stripped = line.strip()
-            if not line_stripped or line_stripped.startswith("#"):
-                continue
-            key, value = line_stripped.split("=", 1)
-            env[key] = value.strip().strip('"').strip("'").strip()
+    for number, line in enumerate(text.splitlines(), start=1):
+        line_stripped = line.strip()
+        if not line_stripped or line_stripped.startswith("#"):
+            continue
+        if line_stripped.startswith("export "):
+            line_stripped = line_stripped[len("export ") :].lstrip()
+        key, separator, value = line_stripped.partition("=")
+        key, value = key.strip(), value.strip()
+        if not separator or not _KEY_PATTERN.fullmatch(key):
+            logger.warning(f"{path}:{number}: ignoring malformed line")
+            continue
+        if value[:1] in ('"', "'"):
+            value = _unquote(value, path, number)
+        env[key] = value.strip()
     return env
+
+
+def _signature(stat: os.stat_result) -> tuple:
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def get_config(path: str = ENV_FILE) -> EnvConfig:
+    """The parsed .env, re-read only when the file has changed since it was last parsed."""
+    path = os.path.abspath(path)
+    try:
+        signature = _signature(os.stat(path))
+    except FileNotFoundError:
+        signature = None
+
+    config = _configs.get(path)
+    if config is not None and config.signature == signature:
+        return config
+
+    with _lock:
+        config = _configs.get(path)
+        if config is not None and config.signature == signature:
+            return config
+        try:
+            with open(path) as f:
+                # Take the signature of what is actually read, in case the file changed again meanwhile.
+                signature = _signature(os.fstat(f.fileno()))
+                values = parse_env(f.read(), path)
+        except FileNotFoundError:
+            signature, values = None, {}
+        config = EnvConfig(path, signature, MappingProxyType(values))
+        _configs[path] = config
+        return config
+
+
+def invalidate_env() -> None:
+    """Forget the parsed files, for writers that may not change what the signature covers."""
+    with _lock:
+        _configs.clear()
+
+
+def load_env() -> dict[str, str]:
+    """A copy of the .env values, as a plain dict."""
+    return dict(get_config().values)
@@ -0,0 +1,212 @@
+import json
+import logging
+import re
+import subprocess
+import threading
+import time
+from collections.abc import Callable, Sequence
+from datetime import UTC, datetime
+from typing import Any, Final
+
+from .dockerapi import get_docker_client
+from .paths import PROJECT_DIR
+
+# The state and health of every compose service, polled on a fixed cadence
+# into an in-memory snapshot that the status endpoint serves without touching
+# docker. Each poll is a single container listing. wait_until_healthy reads
+# fresh state itself, backing off between polls.
+STATUS_INTERVAL: Final[float] = 5.0
+WAIT_TIMEOUT: Final[float] = 300.0
+WAIT_INITIAL_DELAY: Final[float] = 0.5
+WAIT_MAX_DELAY: Final[float] = 5.0
+READY_STATES: Final[tuple[str, ...]] = ("healthy", "running", "completed")
+FAILED_STATES: Final[tuple[str, ...]] = ("unhealthy", "exited", "dead")
+# Worst first: a service shows the state of its least healthy container.
+STATE_ORDER: Final[tuple[str, ...]] = (
+    "unhealthy",
+    "dead",
+    "exited",
+    "restarting",
+    "starting",
+    "created",
+    "paused",
+    "removing",
+    "running",
+    "healthy",
+    "completed",
+)
+
+_STATUS_HEALTH: Final[re.Pattern] = re.compile(r"\((healthy|unhealthy|health: starting)\)")
+_STATUS_EXIT_CODE: Final[re.Pattern] = re.compile(r"^Exited \((\d+)\)")
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_snapshot: dict[str, Any] = {"updated_at": None, "polled_at": None, "services": {}, "error": None}
+_state: dict[str, Any] = {"running": False}
+
+
+def _effective_state(state: str, health: str | None, exit_code: int | None) -> str:
+    """The health of a running container with a healthcheck, "completed" for one that exited with 0, else its state."""
+    if state == "running" and health:
+        return health
+    if state == "exited" and exit_code == 0:
+        return "completed"
+    return state
+
+
+def list_containers() -> list[dict[str, Any]]:
+    """Every container of the compose project with its service, state, health and status text."""
+    client = get_docker_client()
+    if client is not None:
+        containers = []
+        for container in client.ps(all=True):
+            status = container.get("Status", "")
+            health = _STATUS_HEALTH.search(status)
+            exit_code = _STATUS_EXIT_CODE.match(status)
+            containers.append(
+                {
+                    "service": (container.get("Labels") or {}).get("com.docker.compose.service", ""),
+                    "name": container["Names"][0].lstrip("/"),
+                    "state": _effective_state(
+                        container["State"],
+                        health and health.group(1).removeprefix("health: "),
+                        exit_code and int(exit_code.group(1)),
+                    ),
+                    "status": status,
+                }
+            )
+        return containers
+
+    result = subprocess.run(
+        ["docker", "compose", "ps", "--all", "--format", "json"],
+        check=False,
+        capture_output=True,
+        text=True,
+        cwd=PROJECT_DIR,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to list containers: {result.stderr}")
+    output = result.stdout.strip()
+    # Older compose versions print one JSON array, newer ones a JSON object per line.
+    entries = json.loads(output) if output.startswith("[") else [json.loads(line) for line in output.splitlines()]
+    return [
+        {
+            "service": entry.get("Service", ""),
+            "name": entry.get("Name", ""),
+            "state": _effective_state(entry.get("State", ""), entry.get("Health"), entry.get("ExitCode")),
+            "status": entry.get("Status", ""),
+        }
+        for entry in entries
+    ]
+
+
+def _summarize(containers: list[dict[str, Any]]) -> dict[str, dict[str, Any]]:
+    services: dict[str, dict[str, Any]] = {}
+    for container in sorted(containers, key=lambda c: (c["service"], c["name"])):
+        services.setdefault(container["service"], {"state": None, "containers": []})["containers"].append(container)
+    for service in services.values():
+        states = [container["state"] for container in service["containers"]]
+        service["state"] = min(states, key=lambda s: STATE_ORDER.index(s) if s in STATE_ORDER else -1)
+    return services
+
+
+def refresh_status() -> dict[str, Any]:
+    """Poll docker now and return the new snapshot; a failed poll keeps the last services and records the error."""
+    polled_at = time.monotonic()
+    try:
+        services = _summarize(list_containers())
+    except Exception as e:
+        with _lock:
+            _snapshot.update(polled_at=polled_at, error=str(e))
+            return dict(_snapshot)
+    with _lock:
+        _snapshot.update(
+            updated_at=datetime.now(UTC).isoformat(timespec="seconds"),
+            polled_at=polled_at,
+            services=services,
+            error=None,
+        )
+        return dict(_snapshot)
+
+
+def get_status_snapshot() -> dict[str, Any]:
+    """
+    The latest snapshot. Without the poller running, docker is polled when
+    the snapshot is older than STATUS_INTERVAL.
+    """
+    with _lock:
+        polled_at = _snapshot["polled_at"]
+        snapshot = dict(_snapshot)
+    if not _state["running"] and (polled_at is None or time.monotonic() - polled_at >= STATUS_INTERVAL):
+        snapshot = refresh_status()
+    return {key: value for key, value in snapshot.items() if key != "polled_at"} | {"polling": _state["running"]}
+
+
+def wait_until(
+    predicate: Callable[[], bool],
+    description: str,
+    timeout: float = WAIT_TIMEOUT,
+    initial_delay: float = WAIT_INITIAL_DELAY,
+    max_delay: float = WAIT_MAX_DELAY,
+) -> None:
+    """
+    Call predicate until it returns True, sleeping initial_delay after the first
+    attempt and doubling up to max_delay. Raises TimeoutError after timeout.
+    """
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while not predicate():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"{description} did not happen within {timeout:g} seconds")
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
+
+def wait_until_healthy(services: Sequence[str], timeout: float = WAIT_TIMEOUT) -> None:
+    """
+    Wait until every container of the services is healthy, or running if it
+    has no healthcheck (completed for one-off services). Raises RuntimeError as
+    soon as one is unhealthy or has stopped, or after timeout.
+    """
+    last: dict[str, str] = {}
+
+    def ready() -> bool:
+        snapshot = refresh_status()
+        if snapshot["error"]:
+            raise RuntimeError(snapshot["error"])
+        for service in services:
+            last[service] = snapshot["services"].get(service, {}).get("state") or "missing"
+        failed = [service for service in services if last[service] in FAILED_STATES]
+        if failed:
+            raise RuntimeError(f"Services did not become healthy: {_describe(failed, last)}")
+        return all(state in READY_STATES for state in last.values())
+
+    try:
+        wait_until(ready, f"Health of {', '.join(services)}", timeout)
+    except TimeoutError as e:
+        waiting = [service for service in services if last.get(service) not in READY_STATES]
+        raise RuntimeError(f"Services did not become healthy: {_describe(waiting, last)}") from e
+
+
+def _describe(services: Sequence[str], states: dict[str, str]) -> str:
+    return ", ".join(f"{service}: {states.get(service, 'missing')}" for service in services)
+
+
+def _poll() -> None:
+    while True:
+        snapshot = refresh_status()
+        if snapshot["error"]:
+            logger.debug(f"Service status poll failed: {snapshot['error']}")
+        time.sleep(STATUS_INTERVAL)
+
+
+def start_status_poller() -> threading.Thread | None:
+    """Poll the service status every STATUS_INTERVAL seconds in the background."""
+    if _state["running"]:
+        return None
+    _state["running"] = True
+    thread = threading.Thread(target=_poll, name="status-poller", daemon=True)
+    thread.start()
+    return thread
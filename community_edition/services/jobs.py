@@ -0,0 +1,251 @@
+import contextvars
+import copy
+import logging
+import threading
+import uuid
+from collections import deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime
+from typing import Any, Final
+
+# Long-running operations (backups, restores, upgrades) run here instead of
+# inside the request. Jobs sharing a conflict key run one at a time in
+# submission order; the others wait as "queued" without holding a worker.
+JOB_WORKERS: Final[int] = 2
+JOB_OUTPUT_LINES: Final[int] = 2000
+JOB_HISTORY: Final[int] = 50
+STACK_CONFLICT_KEY: Final[str] = "stack"
+FINISHED_STATUSES: Final[tuple[str, ...]] = ("succeeded", "failed")
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+_changed = threading.Condition()
+_jobs: dict[str, dict[str, Any]] = {}
+_busy_keys: set[str] = set()
+_waiting: dict[str, deque[str]] = {}
+_queued_funcs: dict[str, Callable[[], Any]] = {}
+_current_job: contextvars.ContextVar[str | None] = contextvars.ContextVar("current_job", default=None)
+
+
+def _now() -> str:
+    return datetime.now(UTC).isoformat(timespec="seconds")
+
+
+def _touch(job: dict[str, Any]) -> None:
+    """Record a change to a job and wake up anyone waiting for one. Call with _changed held."""
+    job["revision"] += 1
+    _changed.notify_all()
+
+
+def _prune_history() -> None:
+    finished = [job_id for job_id, job in _jobs.items() if job["status"] in FINISHED_STATUSES]
+    for job_id in finished[: max(len(finished) - JOB_HISTORY, 0)]:
+        del _jobs[job_id]
+
+
+def submit_job(
+    kind: str, title: str, func: Callable[[], Any], conflict_key: str | None = STACK_CONFLICT_KEY
+) -> dict[str, Any]:
+    """Queue func to run in the background and return a snapshot of the new job."""
+    job = {
+        "id": uuid.uuid4().hex,
+        "kind": kind,
+        "title": title,
+        "status": "queued",
+        "message": "",
+        "conflict_key": conflict_key,
+        "steps": [],
+        "output": [],
+        "output_offset": 0,
+        "progress": None,
+        "created_at": _now(),
+        "started_at": None,
+        "finished_at": None,
+        "revision": 0,
+    }
+    with _changed:
+        _prune_history()
+        _jobs[job["id"]] = job
+        if conflict_key is not None and conflict_key in _busy_keys:
+            _waiting.setdefault(conflict_key, deque()).append(job["id"])
+            _queued_funcs[job["id"]] = func
+            logger.info(f"Job '{title}' queued behind a running {conflict_key} job")
+        else:
+            if conflict_key is not None:
+                _busy_keys.add(conflict_key)
+            _executor.submit(_run, job["id"], func)
+        return copy.deepcopy(job)
+
+
+def _release(conflict_key: str | None) -> None:
+    """Start the next job waiting on conflict_key, if any. Call with _changed held."""
+    if conflict_key is None:
+        return
+    waiting = _waiting.get(conflict_key)
+    if waiting:
+        job_id = waiting.popleft()
+        _executor.submit(_run, job_id, _queued_funcs.pop(job_id))
+    else:
+        _busy_keys.discard(conflict_key)
+
+
+def _run(job_id: str, func: Callable[[], Any]) -> None:
+    with _changed:
+        job = _jobs[job_id]
+        job.update(status="running", started_at=_now())
+        _touch(job)
+
+    token = _current_job.set(job_id)
+    try:
+        result = func()
+    except Exception as e:
+        logger.exception(f"Job '{job['title']}' failed")
+        _finish(job, "failed", str(e))
+    else:
+        _finish(job, "succeeded", result if isinstance(result, str) else "")
+    finally:
+        _current_job.reset(token)
+        with _changed:
+            _release(job["conflict_key"])
+
+
+def _finish(job: dict[str, Any], status: str, message: str) -> None:
+    with _changed:
+        for step_entry in job["steps"]:
+            if step_entry["status"] == "running":
+                step_entry.update(status="done" if status == "succeeded" else "failed", finished_at=_now())
+        job.update(status=status, message=message, finished_at=_now())
+        _touch(job)
+
+
+def step(name: str, previous_status: str = "done") -> None:
+    """Mark the start of a new step of the current job and close the previous one."""
+    job_id = _current_job.get()
+    if job_id is None:
+        return
+    with _changed:
+        job = _jobs[job_id]
+        for step_entry in job["steps"]:
+            if step_entry["status"] == "running":
+                step_entry.update(status=previous_status, finished_at=_now())
+        job["steps"].append({"name": name, "status": "running", "started_at": _now(), "finished_at": None})
+        _touch(job)
+    logger.info(name)
+
+
+def log(line: str) -> None:
+    """Append output to the current job; a no-op outside of a job."""
+    job_id = _current_job.get()
+    if job_id is None:
+        return
+    with _changed:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        job["output"].extend(line.splitlines() or [""])
+        overflow = len(job["output"]) - JOB_OUTPUT_LINES
+        if overflow > 0:
+            del job["output"][:overflow]
+            job["output_offset"] += overflow
+        _touch(job)
+
+
+def set_progress(progress: dict[str, Any] | None) -> None:
+    """Publish structured progress, such as per-image pull bytes, on the current job; a no-op outside of a job."""
+    job_id = _current_job.get()
+    if job_id is None:
+        return
+    with _changed:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        job["progress"] = copy.deepcopy(progress)
+        _touch(job)
+
+
+class JobLogHandler(logging.Handler):
+    """Copies log records emitted while a job runs into that job's output."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if _current_job.get() is None or record.name == __name__:
+            return
+        try:
+            log(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+def get_job(job_id: str, since: int = 0) -> dict[str, Any] | None:
+    """
+    Snapshot of a job. Output lines are numbered from the start of the job;
+    only lines from `since` on are returned, so pollers can fetch increments.
+    """
+    with _changed:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        snapshot = copy.deepcopy({key: value for key, value in job.items() if key != "output"})
+        start = max(since - job["output_offset"], 0)
+        snapshot["output"] = job["output"][start:]
+        snapshot["output_start"] = job["output_offset"] + start
+        snapshot["output_end"] = job["output_offset"] + len(job["output"])
+        if job["status"] == "queued" and job["conflict_key"] is not None:
+            waiting = list(_waiting.get(job["conflict_key"], ()))
+            snapshot["queue_position"] = waiting.index(job_id) + 1 if job_id in waiting else 0
+        return snapshot
+
+
+def is_job_active(kind: str) -> bool:
+    """Whether a job of this kind is queued or running."""
+    with _changed:
+        return any(job["kind"] == kind and job["status"] not in FINISHED_STATUSES for job in _jobs.values())
+
+
+def list_jobs() -> list[dict[str, Any]]:
+    """All known jobs, newest first, without their output."""
+    with _changed:
+        job_ids = list(reversed(_jobs))
+    snapshots = [get_job(job_id, since=1 << 62) for job_id in job_ids]
+    return [snapshot for snapshot in snapshots if snapshot is not None]
+
+
+def wait_for_job(job_id: str, timeout: float | None = None) -> dict[str, Any] | None:
+    """Block until the job has finished or the timeout expires, then return its snapshot."""
+    with _changed:
+        _changed.wait_for(
+            lambda: job_id not in _jobs or _jobs[job_id]["status"] in FINISHED_STATUSES,
+            timeout=timeout,
+        )
+    return get_job(job_id)
+
+
+def follow_job(job_id: str, keepalive: float = 15.0) -> Iterator[dict[str, Any] | None]:
+    """
+    Yield a snapshot whenever the job changes, each carrying only new output,
+    until it finishes. Yields None when nothing changed for `keepalive` seconds.
+    """
+    revision = -1
+    since = 0
+    while True:
+        with _changed:
+            if job_id not in _jobs:
+                return
+            _changed.wait_for(
+                lambda seen=revision: job_id not in _jobs or _jobs[job_id]["revision"] > seen, timeout=keepalive
+            )
+            if job_id not in _jobs:
+                return
+            changed = _jobs[job_id]["revision"] > revision
+        if not changed:
+            yield None
+            continue
+        snapshot = get_job(job_id, since=since)
+        revision, since = snapshot["revision"], snapshot["output_end"]
+        yield snapshot
+        if snapshot["status"] in FINISHED_STATUSES:
+            return
+
+
+logging.getLogger("community_edition").addHandler(JobLogHandler())
@@ -1,18 +1,192 @@
 import json
+import logging
 import subprocess
+import threading
+import time
 from typing import Any, Final
+from urllib.parse import quote
 
-from .backup import PROJECT_DIR
+import requests
+from requests.adapters import HTTPAdapter
+
+from .env import get_config
+from .paths import PROJECT_DIR
 
 ADD_KEYCLOAK_USER_CMD: Final[list[str]] = ["make", "add-user"]
 LIST_KEYCLOAK_USERS_CMD: Final[list[str]] = ["make", "list-users"]
 
+# Users are managed through the Keycloak admin REST API at KEYCLOAK_ADMIN_URL
+# (KEYCLOAK_SERVER_URL by default) over a pooled session, as the admin from
+# .env, checking its certificate unless VERIFY_SSL is false. The access token
+# is kept until TOKEN_REFRESH_MARGIN before it expires and then renewed with
+# the refresh token. Without a URL, or while Keycloak cannot be reached, the
+# kcadm.sh scripts are run inside the container instead.
+ADMIN_REALM: Final[str] = "master"
+ADMIN_CLIENT_ID: Final[str] = "admin-cli"
+DEFAULT_REALM: Final[str] = "finmars"
+REQUEST_TIMEOUT: Final[float] = 10.0
+TOKEN_REFRESH_MARGIN: Final[float] = 30.0
+POOL_SIZE: Final[int] = 4
+UNAVAILABLE_RETRY: Final[float] = 60.0
+
+logger = logging.getLogger(__name__)
+
+
+class KeycloakError(RuntimeError):
+    """An error response from Keycloak; status is its HTTP status."""
+
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status
+
+
+class KeycloakUnavailable(KeycloakError):
+    """Keycloak could not be connected to."""
+
+
+class KeycloakAdminClient:
+    """Client of the Keycloak admin REST API, logged in as an admin of the master realm."""
+
+    def __init__(self, server_url: str, username: str, password: str, verify: bool = True):
+        self.server_url = server_url.rstrip("/")
+        self.username = username
+        self.password = password
+        self._session = requests.Session()
+        self._session.verify = verify
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._token: dict[str, Any] = {"access": None, "expires_at": 0.0, "refresh": None, "refresh_expires_at": 0.0}
+
+    def _post_token(self, data: dict[str, str]) -> requests.Response:
+        url = f"{self.server_url}/realms/{ADMIN_REALM}/protocol/openid-connect/token"
+        try:
+            return self._session.post(url, data={"client_id": ADMIN_CLIENT_ID, **data}, timeout=REQUEST_TIMEOUT)
+        except requests.ConnectionError as e:
+            raise KeycloakUnavailable(f"Cannot connect to Keycloak at {self.server_url}: {e}") from e
+
+    def get_token(self) -> str:
+        """A valid access token, renewed with the refresh token or the password when close to expiring."""
+        with self._lock:
+            token = self._token
+            now = time.monotonic()
+            if token["access"] and now < token["expires_at"] - TOKEN_REFRESH_MARGIN:
+                return token["access"]
+
+            response = None
+            if token["refresh"] and now < token["refresh_expires_at"] - TOKEN_REFRESH_MARGIN:
+                response = self._post_token({"grant_type": "refresh_token", "refresh_token": token["refresh"]})
+                if not response.ok:
+                    # The session may have ended on the server; log in again.
+                    response = None
+            if response is None:
+                response = self._post_token(
+                    {"grant_type": "password", "username": self.username, "password": self.password}
+                )
+            if not response.ok:
+                raise KeycloakError(
+                    f"Failed to log in to Keycloak: {response.status_code} {response.text}", response.status_code
+                )
+
+            data = response.json()
+            token.update(
+                access=data["access_token"],
+                expires_at=now + data.get("expires_in", 60),
+                refresh=data.get("refresh_token"),
+                refresh_expires_at=now + data.get("refresh_expires_in", 0),
+            )
+            return token["access"]
+
+    def invalidate_token(self) -> None:
+        with self._lock:
+            self._token.update(access=None, expires_at=0.0)
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """A request to /admin/realms/<path>; a rejected token is renewed and the request retried once."""
+        url = f"{self.server_url}/admin/realms/{path}"
+        for attempt in range(2):
+            headers = {"Authorization": f"Bearer {self.get_token()}"}
+            try:
+                response = self._session.request(method, url, headers=headers, timeout=REQUEST_TIMEOUT, **kwargs)
+            except requests.ConnectionError as e:
+                raise KeycloakUnavailable(f"Cannot connect to Keycloak at {self.server_url}: {e}") from e
+            if response.status_code != 401 or attempt:
+                break
+            self.invalidate_token()
+        if not response.ok:
+            raise KeycloakError(
+                f"Keycloak {method} {path} failed: {response.status_code} {response.text}", response.status_code
+            )
+        return response
+
+    def list_users(self, realm: str) -> list[dict[str, Any]]:
+        return self.request("GET", f"{quote(realm)}/users").json()
+
+    def create_user(self, realm: str, username: str, password: str) -> None:
+        user = {
+            "username": username,
+            "enabled": True,
+            "credentials": [{"type": "password", "value": password, "temporary": False}],
+        }
+        try:
+            self.request("POST", f"{quote(realm)}/users", json=user)
+        except KeycloakError as e:
+            if e.status == 409:
+                raise KeycloakError(f"User '{username}' already exists in realm '{realm}'.", e.status) from e
+            raise
+
+
+_clients: dict[tuple[str, str, str, bool], KeycloakAdminClient] = {}
+_unavailable: dict[str, float] = {}
+_clients_lock = threading.Lock()
+
+
+def get_keycloak_client() -> KeycloakAdminClient | None:
+    """
+    The admin client for the Keycloak configured in .env, or None when no URL
+    or admin credentials are set, or Keycloak was unreachable within the last
+    UNAVAILABLE_RETRY seconds.
+    """
+    env = get_config()
+    server_url = env.get("KEYCLOAK_ADMIN_URL") or env.get("KEYCLOAK_SERVER_URL")
+    username, password = env.get("ADMIN_USERNAME"), env.get("ADMIN_PASSWORD")
+    verify = (env.get("VERIFY_SSL") or "true").lower() not in ("false", "0", "no")
+    if not server_url or not username or not password:
+        return None
+    with _clients_lock:
+        if time.monotonic() < _unavailable.get(server_url, 0):
+            return None
+        key = (server_url, username, password, verify)
+        if key not in _clients:
+            _clients[key] = KeycloakAdminClient(server_url, username, password, verify)
+        return _clients[key]
+
+
+def _mark_unavailable(client: KeycloakAdminClient, error: Exception) -> None:
+    logger.warning(f"{error}; using the kcadm.sh scripts for {UNAVAILABLE_RETRY:g} seconds")
+    with _clients_lock:
+        _unavailable[client.server_url] = time.monotonic() + UNAVAILABLE_RETRY
+
+
+def get_realm() -> str:
+    return get_config().get("KEYCLOAK_REALM") or DEFAULT_REALM
+
 
 def add_keycloak_user(username: str, password: str) -> str:
     username = username.strip()
     if not username or not password:
         raise ValueError("Username and password are required.")
 
+    client = get_keycloak_client()
+    if client is not None:
+        realm = get_realm()
+        try:
+            client.create_user(realm, username, password)
+            return f"User {username} has been created in realm {realm}."
+        except KeycloakUnavailable as e:
+            _mark_unavailable(client, e)
+
     cmd = [*ADD_KEYCLOAK_USER_CMD, f"USERNAME={username}", f"PASSWORD={password}"]
 
     result = subprocess.run(
@@ -37,8 +211,16 @@ def add_keycloak_user(username: str, password: str) -> str:
 
 def list_keycloak_users() -> list[dict[str, Any]]:
     """
-    Return parsed list of users from `make list-users`, which calls the list-keycloak-users.sh helper.
+    Return the users of the realm from the admin API, or parsed from `make list-users`,
+    which calls the list-keycloak-users.sh helper.
     """
+    client = get_keycloak_client()
+    if client is not None:
+        try:
+            return client.list_users(get_realm())
+        except KeycloakUnavailable as e:
+            _mark_unavailable(client, e)
+
     result = subprocess.run(
         LIST_KEYCLOAK_USERS_CMD,
         check=False,
@@ -0,0 +1,222 @@
+import heapq
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Iterator, Sequence
+from datetime import UTC, datetime
+from typing import Any, Final
+
+from .dockerapi import get_docker_client
+from .env import load_env
+from .logs import DEFAULT_TAIL, LOG_KEEPALIVE, build_logs_command, stream_container_logs, stream_logs
+from .logstore import enqueue_line, start_log_store
+
+# A single long-lived `docker compose logs --follow` feeds a ring buffer per
+# service, so the log pages are served from memory instead of a new docker
+# process per view. Each line gets a sequence number, which is how readers
+# follow the buffers and resume after a reconnect.
+DEFAULT_BUFFER_LINES: Final[int] = 5000
+COLLECTOR_RETRY: Final[float] = 5.0
+COLLECTOR_MAX_RETRY: Final[float] = 60.0
+
+logger = logging.getLogger(__name__)
+
+_changed = threading.Condition()
+_buffers: dict[str, deque[dict[str, Any]]] = {}
+_dropped: dict[str, int] = {}
+# Per container, the newest timestamp collected and the lines carrying it.
+_last_seen: dict[str, tuple[str, set[str]]] = {}
+_state: dict[str, Any] = {
+    "running": False,
+    "capacity": DEFAULT_BUFFER_LINES,
+    "seq": 0,
+    "started_at": None,
+    "connected": False,
+    "reconnects": 0,
+    "last_error": None,
+}
+
+
+def get_buffer_lines(env: dict[str, str]) -> int:
+    """Lines kept per service, LOG_BUFFER_LINES; 0 disables the collector."""
+    try:
+        lines = int(env.get("LOG_BUFFER_LINES") or DEFAULT_BUFFER_LINES)
+    except ValueError:
+        logger.warning("Ignoring invalid LOG_BUFFER_LINES")
+        return DEFAULT_BUFFER_LINES
+    return max(lines, 0)
+
+
+def _time_key(timestamp: str) -> str:
+    """Docker trims trailing zeros off the fraction; pad it so timestamps compare as strings."""
+    whole, _, fraction = timestamp.rstrip("Z").partition(".")
+    return f"{whole}.{fraction:0<9}"
+
+
+def _is_repeat(entry: dict[str, Any]) -> bool:
+    """
+    Whether a line was already collected before a reconnect. Lines of one
+    container arrive in time order, those of different containers need not.
+    Call with _changed held.
+    """
+    if entry["time"] is None or entry["container"] not in _last_seen:
+        return False
+    key = _time_key(entry["time"])
+    last, lines = _last_seen[entry["container"]]
+    return key < last or (key == last and entry["line"] in lines)
+
+
+def add_line(entry: dict[str, Any]) -> None:
+    """
+    Append a parsed log line to its service's buffer, evicting (and counting)
+    the oldest when full, and pass it on to the log store.
+    """
+    service = entry["service"] or ""
+    with _changed:
+        if _is_repeat(entry):
+            return
+        buffer = _buffers.get(service)
+        if buffer is None:
+            buffer = _buffers[service] = deque(maxlen=_state["capacity"])
+            _dropped[service] = 0
+        if len(buffer) == buffer.maxlen:
+            _dropped[service] += 1
+        _state["seq"] += 1
+        buffer.append({**entry, "seq": _state["seq"]})
+
+        if entry["time"] is not None:
+            key = _time_key(entry["time"])
+            container = entry["container"]
+            if container not in _last_seen or _last_seen[container][0] != key:
+                _last_seen[container] = (key, set())
+            _last_seen[container][1].add(entry["line"])
+        _changed.notify_all()
+    enqueue_line(entry)
+
+
+def _selected(services: Sequence[str]) -> list[deque[dict[str, Any]]]:
+    if not services:
+        return list(_buffers.values())
+    return [_buffers[service] for service in services if service in _buffers]
+
+
+def _tail(services: Sequence[str], tail: int | None) -> list[dict[str, Any]]:
+    """The last `tail` lines of each selected service (all with None), merged in arrival order."""
+    parts = []
+    for buffer in _selected(services):
+        start = 0 if tail is None else max(len(buffer) - tail, 0)
+        parts.append([buffer[i] for i in range(start, len(buffer))])
+    return list(heapq.merge(*parts, key=lambda entry: entry["seq"]))
+
+
+def _after(services: Sequence[str], seq: int) -> list[dict[str, Any]]:
+    """Lines newer than seq, read from the end of each buffer so the cost is that of the new lines."""
+    parts = []
+    for buffer in _selected(services):
+        part = []
+        for entry in reversed(buffer):
+            if entry["seq"] <= seq:
+                break
+            part.append(entry)
+        parts.append(part[::-1])
+    return list(heapq.merge(*parts, key=lambda entry: entry["seq"]))
+
+
+def get_buffered_lines(services: Sequence[str] = (), tail: int | None = None) -> list[dict[str, Any]]:
+    with _changed:
+        return _tail(services, tail)
+
+
+def follow_lines(
+    services: Sequence[str] = (),
+    tail: int | None = DEFAULT_TAIL,
+    after: int | None = None,
+    follow: bool = True,
+    keepalive: float = LOG_KEEPALIVE,
+) -> Iterator[dict[str, Any] | None]:
+    """
+    Yield buffered lines, then with follow every new line as it is collected.
+    Starts after sequence number `after` if given (a reconnecting reader),
+    otherwise with the last `tail` lines per service. Yields None as a keepalive.
+    """
+    with _changed:
+        if after is not None and after <= _state["seq"]:
+            entries = _after(services, after)
+        else:
+            entries = _tail(services, tail)
+        seq = _state["seq"]
+    yield from entries
+
+    while follow:
+        with _changed:
+            _changed.wait_for(lambda seen=seq: _state["seq"] > seen, timeout=keepalive)
+            entries = _after(services, seq)
+            seq = _state["seq"]
+        if not entries:
+            yield None
+        yield from entries
+
+
+def is_collector_running() -> bool:
+    return _state["running"]
+
+
+def get_collector_status() -> dict[str, Any]:
+    """Collector state with the buffered and dropped line counts per service."""
+    with _changed:
+        status = dict(_state)
+        status["services"] = {
+            service: {"lines": len(buffer), "dropped": _dropped[service]} for service, buffer in _buffers.items()
+        }
+        status["dropped"] = sum(_dropped.values())
+    return status
+
+
+def _collect() -> None:
+    delay = COLLECTOR_RETRY
+    while True:
+        with _changed:
+            since = min((key for key, _ in _last_seen.values()), default=None)
+        try:
+            # The first connection backfills the buffers; reconnects pick up where the last one stopped.
+            tail, since = (_state["capacity"], None) if since is None else ("all", f"{since[:19]}Z")
+            client = get_docker_client()
+            if client is not None:
+                lines = stream_container_logs(client, tail=tail, since=since, follow=True)
+            else:
+                lines = stream_logs(build_logs_command(tail=tail, since=since, follow=True))
+            _state["connected"] = True
+            for entry in lines:
+                if entry is not None:
+                    add_line(entry)
+                    delay = COLLECTOR_RETRY
+            _state["last_error"] = None
+        except Exception as e:
+            logger.warning(f"Log collector stopped: {e}")
+            _state["last_error"] = str(e)
+            delay = min(delay * 2, COLLECTOR_MAX_RETRY)
+        _state["connected"] = False
+        _state["reconnects"] += 1
+        # docker compose logs exits when no container is running; try again shortly.
+        time.sleep(delay)
+
+
+def start_log_collector() -> threading.Thread | None:
+    """
+    Start following the compose logs in the background, and the log store they
+    feed, unless LOG_BUFFER_LINES is 0.
+    """
+    capacity = get_buffer_lines(load_env())
+    if capacity == 0:
+        logger.info("Log collection is disabled (LOG_BUFFER_LINES=0), and with it the log store")
+        return None
+    if _state["running"]:
+        return None
+    start_log_store()
+
+    _state.update(running=True, capacity=capacity, started_at=datetime.now(UTC).isoformat(timespec="seconds"))
+    thread = threading.Thread(target=_collect, name="log-collector", daemon=True)
+    thread.start()
+    logger.info(f"Collecting service logs, {capacity} lines per service")
+    return thread
@@ -0,0 +1,104 @@
+import mmap
+import os
+from typing import Any, Final
+
+from .setup import LOG_FILE
+
+# The app's own log files are served a window at a time: the last N lines,
+# the N lines before an offset (paging backwards) or what was appended since
+# an offset (polling). Offsets are byte offsets of line starts, so they stay
+# valid while the file grows; a window only ever holds complete lines, and
+# the cost of reading one is that of the window, not of the file.
+APP_LOG_FILE: Final[str] = "app.log"
+LOG_FILES: Final[dict[str, str]] = {"setup": LOG_FILE, "app": APP_LOG_FILE}
+DEFAULT_WINDOW_LINES: Final[int] = 200
+MAX_WINDOW_LINES: Final[int] = 5000
+MAX_WINDOW_BYTES: Final[int] = 1024 * 1024
+
+
+def get_log_file(name: str) -> str:
+    """The path of a log file by name, one of LOG_FILES."""
+    if name not in LOG_FILES:
+        raise ValueError(f"Unknown log file '{name}', expected one of: {', '.join(LOG_FILES)}")
+    return LOG_FILES[name]
+
+
+def _window(data: bytes, start: int, size: int, reset: bool = False) -> dict[str, Any]:
+    return {
+        "start": start,
+        "end": start + len(data),
+        "size": size,
+        "reset": reset,
+        "lines": data.decode("utf-8", errors="replace").splitlines(),
+    }
+
+
+def _check_lines(lines: int) -> None:
+    if not 1 <= lines <= MAX_WINDOW_LINES:
+        raise ValueError(f"lines must be between 1 and {MAX_WINDOW_LINES}")
+
+
+def read_tail(path: str, lines: int = DEFAULT_WINDOW_LINES, before: int | None = None) -> dict[str, Any]:
+    """
+    The last `lines` complete lines of the file, or those ending at offset
+    `before` (the start of an earlier window). The file is scanned backwards
+    from the end of the window, and at most MAX_WINDOW_BYTES of it.
+    """
+    _check_lines(lines)
+    try:
+        with open(path, "rb") as f:
+            return _read_tail(f.fileno(), lines, before)
+    except FileNotFoundError:
+        return _window(b"", 0, 0)
+
+
+def _read_tail(fd: int, lines: int, before: int | None) -> dict[str, Any]:
+    size = os.fstat(fd).st_size
+    if before is not None and not 0 <= before <= size:
+        raise ValueError(f"before must be an offset between 0 and {size}")
+    end = size if before is None else before
+    if end == 0:
+        return _window(b"", 0, size)
+
+    with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as data:
+        if before is None:
+            # A line still being written is left for the next poll.
+            end = data.rfind(b"\n", 0, end) + 1
+        limit = max(end - MAX_WINDOW_BYTES, 0)
+        start = end
+        for _ in range(lines):
+            if start <= limit:
+                break
+            # A newline right before the limit still marks a line starting within it.
+            newline = data.rfind(b"\n", max(limit - 1, 0), start - 1)
+            if newline < 0 and limit > 0:
+                # The line reaches back past the byte limit: keep a part of it only if it is all there is.
+                start = start if start < end else limit
+                break
+            start = newline + 1
+        return _window(data[start:end], start, size)
+
+
+def read_since(path: str, offset: int, max_bytes: int = MAX_WINDOW_BYTES) -> dict[str, Any]:
+    """
+    The complete lines appended from offset on, at most max_bytes of them. An
+    offset past the end means the file was truncated or replaced, and reading
+    starts over from the beginning with "reset" set.
+    """
+    if offset < 0:
+        raise ValueError("since must be a non-negative offset")
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            reset = offset > size
+            if reset:
+                offset = 0
+            f.seek(offset)
+            data = f.read(min(size - offset, max_bytes))
+    except FileNotFoundError:
+        return _window(b"", 0, 0, reset=offset > 0)
+    complete = data.rfind(b"\n") + 1
+    if complete == 0 and len(data) == max_bytes:
+        # A single line longer than max_bytes is served in pieces.
+        complete = len(data)
+    return _window(data[:complete], offset, size, reset=reset)
@@ -1,20 +1,261 @@
+import os
+import queue
+import re
+import selectors
 import subprocess
-from typing import Final
+import threading
+import time
+import zlib
+from collections.abc import Iterable, Iterator, Sequence
+from datetime import datetime
+from typing import Any, Final
 
-from .backup import PROJECT_DIR
+from .dockerapi import DockerClient, LogStream
+from .paths import PROJECT_DIR
 
 DEFAULT_LOGS_COMMAND: Final[list[str]] = ["docker", "compose", "logs"]
 
+# Streaming reads the compose output in blocks and yields it line by line, so
+# memory stays bounded however long the history or the follow runs.
+DEFAULT_TAIL: Final[int] = 200
+MAX_TAIL: Final[int] = 10000
+MAX_LINE_BYTES: Final[int] = 64 * 1024
+LOG_READ_SIZE: Final[int] = 64 * 1024
+LOG_KEEPALIVE: Final[float] = 15.0
+LOG_COMPRESSION_LEVEL: Final[int] = 6
+LOG_QUEUE_LINES: Final[int] = 1000
+# A follow through the Docker API lists the containers again this often, to
+# pick up those recreated (with new IDs) by an upgrade or `make up`.
+LOG_RESCAN_INTERVAL: Final[float] = 5.0
 
-def get_docker_compose_logs() -> str:
+_SERVICE_PATTERN: Final[re.Pattern] = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]*")
+# RFC 3339 dates, Unix timestamps and relative durations such as 42m or 1h30m, as docker accepts them.
+_TIME_PATTERN: Final[re.Pattern] = re.compile(
+    r"\d{4}-\d{2}-\d{2}(?:T\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:\d{2})?)?"
+    r"|\d+(?:\.\d+)?"
+    r"|(?:\d+(?:\.\d+)?(?:ns|us|ms|s|m|h))+"
+)
+# "core-1  | 2025-01-01T00:00:00.000000000Z message"; the timestamp is only there with --timestamps.
+_LINE_PATTERN: Final[re.Pattern] = re.compile(
+    r"^(?P<container>\S+)\s+\|(?: (?P<time>\d{4}-\d{2}-\d{2}T\S+))?(?: (?P<message>.*))?$"
+)
+_DURATION_PATTERN: Final[re.Pattern] = re.compile(r"(\d+(?:\.\d+)?)(ns|us|ms|s|m|h)")
+_DURATION_UNITS: Final[dict[str, float]] = {"ns": 1e-9, "us": 1e-6, "ms": 1e-3, "s": 1, "m": 60, "h": 3600}
+
+
+def build_logs_command(
+    services: Sequence[str] = (),
+    tail: int | str = DEFAULT_TAIL,
+    since: str | None = None,
+    until: str | None = None,
+    follow: bool = False,
+) -> list[str]:
+    """
+    `docker compose logs` arguments for the given filters. tail is a line count
+    per service (at most MAX_TAIL) or "all"; since/until take what docker does.
+    Raises ValueError for anything else.
+    """
+    if tail != "all":
+        try:
+            tail = int(tail)
+        except ValueError:
+            raise ValueError(f"tail must be a number of lines or 'all', got {tail!r}") from None
+        if not 0 <= tail <= MAX_TAIL:
+            raise ValueError(f"tail must be between 0 and {MAX_TAIL}")
+
+    command = [*DEFAULT_LOGS_COMMAND, "--no-color", "--timestamps", "--tail", str(tail)]
+    for flag, value in (("--since", since), ("--until", until)):
+        if not value:
+            continue
+        if not _TIME_PATTERN.fullmatch(value):
+            raise ValueError(f"Invalid {flag[2:]} time: {value!r}")
+        command += [flag, value]
+    if follow:
+        command.append("--follow")
+
+    for service in services:
+        if not _SERVICE_PATTERN.fullmatch(service):
+            raise ValueError(f"Invalid service name: {service!r}")
+    return [*command, *services]
+
+
+def parse_log_line(line: str) -> dict[str, Any]:
+    """Split a compose log line into its container, service, timestamp and message."""
+    match = _LINE_PATTERN.match(line)
+    if match is None:
+        return {"container": None, "service": None, "time": None, "message": line, "line": line}
+    container = match.group("container")
+    return {
+        "container": container,
+        "service": re.sub(r"-\d+$", "", container),
+        "time": match.group("time"),
+        "message": match.group("message") or "",
+        "line": line,
+    }
+
+
+def _split_lines(pending: bytes) -> tuple[list[bytes], bytes]:
+    """Complete lines, with any longer than MAX_LINE_BYTES cut into pieces, and the unfinished rest."""
+    *complete, pending = pending.split(b"\n")
+    lines = []
+    for line in complete:
+        lines += [line[i : i + MAX_LINE_BYTES] for i in range(0, len(line), MAX_LINE_BYTES)] or [b""]
+    while len(pending) > MAX_LINE_BYTES:
+        lines.append(pending[:MAX_LINE_BYTES])
+        pending = pending[MAX_LINE_BYTES:]
+    return lines, pending
+
+
+def _decode(raw: bytes) -> dict[str, Any]:
+    return parse_log_line(raw.decode("utf-8", errors="replace").rstrip("\r"))
+
+
+def stream_logs(command: list[str], keepalive: float = LOG_KEEPALIVE) -> Iterator[dict[str, Any] | None]:
+    """
+    Run a command from build_logs_command and yield its lines as parse_log_line
+    dicts as they arrive. Yields None when nothing arrived for `keepalive` seconds.
+    The process is stopped when the generator is closed.
+    """
+    proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=PROJECT_DIR)
     try:
-        result = subprocess.run(
-            DEFAULT_LOGS_COMMAND,
-            check=False,
-            capture_output=True,
-            text=True,
-            cwd=PROJECT_DIR,
-        )
-        return result.stdout or result.stderr or ""
-    except Exception as exc:  # pragma: no cover - defensive fallback
-        return f"Failed to fetch docker compose logs: {exc}"
+        fd = proc.stdout.fileno()
+        pending = b""
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            while True:
+                if not selector.select(keepalive):
+                    yield None
+                    continue
+                data = os.read(fd, LOG_READ_SIZE)
+                if not data:
+                    break
+                lines, pending = _split_lines(pending + data)
+                for raw in lines:
+                    yield _decode(raw)
+        if pending:
+            yield _decode(pending)
+    finally:
+        if proc.poll() is None:
+            proc.terminate()
+        proc.stdout.close()
+        proc.wait()
+
+
+def to_unix_time(value: str, now: float | None = None) -> str:
+    """
+    A since/until value accepted by build_logs_command as the Unix time the
+    Docker API takes. Dates without a zone are local time, as docker reads them.
+    """
+    if _DURATION_PATTERN.match(value) and not _DURATION_PATTERN.sub("", value):
+        seconds = sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in _DURATION_PATTERN.findall(value))
+        return f"{(now if now is not None else time.time()) - seconds:.9f}"
+    if re.fullmatch(r"\d+(?:\.\d+)?", value):
+        return value
+    return f"{datetime.fromisoformat(value).timestamp():.9f}"
+
+
+def _container_prefix(container: dict[str, Any]) -> bytes:
+    """The "core-1  | " prefix `docker compose logs` puts on a container's lines."""
+    labels = container.get("Labels") or {}
+    service = labels.get("com.docker.compose.service")
+    number = labels.get("com.docker.compose.container-number")
+    name = f"{service}-{number}" if service and number else container["Names"][0].lstrip("/")
+    return f"{name}  | ".encode()
+
+
+def _read_container(stream: LogStream, prefix: bytes, lines: queue.Queue, stop: threading.Event) -> None:
+    def put(item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                lines.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    pending: dict[int, bytes] = {}
+    try:
+        for kind, data in stream:
+            complete, pending[kind] = _split_lines(pending.get(kind, b"") + data)
+            for raw in complete:
+                if not put(_decode(prefix + raw)):
+                    return
+        for rest in pending.values():
+            if rest:
+                put(_decode(prefix + rest))
+        put(None)
+    except Exception as e:
+        put(e if not stop.is_set() else None)
+
+
+def stream_container_logs(
+    client: DockerClient,
+    services: Sequence[str] = (),
+    tail: int | str = DEFAULT_TAIL,
+    since: str | None = None,
+    until: str | None = None,
+    follow: bool = False,
+    keepalive: float = LOG_KEEPALIVE,
+    rescan: float = LOG_RESCAN_INTERVAL,
+) -> Iterator[dict[str, Any] | None]:
+    """
+    stream_logs through the Docker API: the same lines, in the compose format,
+    for filters already checked by build_logs_command. Each container's log is
+    read by a thread of its own; closing the generator closes their connections.
+    A follow, like `docker compose logs -f`, also follows containers that are
+    created while it runs, from their first line.
+    """
+    since = to_unix_time(since) if since else None
+    until = to_unix_time(until) if until else None
+    lines: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_LINES)
+    stop = threading.Event()
+    streams: dict[str, LogStream] = {}
+
+    def attach(container_tail: int | str) -> int:
+        attached = 0
+        for service in services or [None]:
+            for container in client.ps(service, all=True):
+                if container["Id"] in streams:
+                    continue
+                stream = client.logs(container["Id"], container_tail, since, until, follow)
+                streams[container["Id"]] = stream
+                reader = threading.Thread(
+                    target=_read_container, args=(stream, _container_prefix(container), lines, stop), daemon=True
+                )
+                reader.start()
+                attached += 1
+        return attached
+
+    try:
+        running = attach(tail)
+        next_scan = time.monotonic() + rescan
+        while running:
+            if follow and time.monotonic() >= next_scan:
+                running += attach("all")
+                next_scan = time.monotonic() + rescan
+            try:
+                item = lines.get(timeout=min(keepalive, rescan) if follow else keepalive)
+            except queue.Empty:
+                yield None
+                continue
+            if item is None:
+                running -= 1
+            elif isinstance(item, OSError):
+                raise item
+            elif isinstance(item, Exception):
+                raise OSError(str(item)) from item
+            else:
+                yield item
+    finally:
+        stop.set()
+        for stream in streams.values():
+            stream.close()
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = LOG_COMPRESSION_LEVEL) -> Iterator[bytes]:
+    """gzip-compress a byte stream, yielding compressed blocks as zlib's buffer fills."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if compressed := compressor.compress(chunk):
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,311 @@
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections.abc import Sequence
+from datetime import UTC, datetime, timedelta
+from typing import Any, Final
+
+from .env import load_env
+from .paths import PROJECT_DIR
+
+# Collected log lines are also written to SQLite: indexed by service, level and
+# time, with an FTS5 index over the messages. Lines go through a bounded queue
+# to a single writer thread that inserts them in batches; searches use their
+# own connections, which WAL mode lets run alongside the writer. Results are
+# newest first by id; the service and level indexes carry the id, so a filtered
+# page is an index range scan however many lines are stored. The lines come
+# from the log collector (logbuffer), which starts the store along with itself:
+# without a collector there is nothing to store.
+LOG_DB_PATH: Final[str] = os.path.join(PROJECT_DIR, "logs.sqlite3")
+LOG_LEVELS: Final[tuple[str, ...]] = ("CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG")
+DEFAULT_RETENTION_DAYS: Final[int] = 7
+DEFAULT_MAX_LINES: Final[int] = 2_000_000
+DEFAULT_SEARCH_LIMIT: Final[int] = 100
+MAX_SEARCH_LIMIT: Final[int] = 1000
+WRITE_QUEUE_LINES: Final[int] = 50_000
+WRITE_BATCH_LINES: Final[int] = 2000
+WRITE_INTERVAL: Final[float] = 1.0
+PRUNE_INTERVAL: Final[float] = 300.0
+PRUNE_BATCH_LINES: Final[int] = 50_000
+
+_LEVEL_PATTERN: Final[re.Pattern] = re.compile(r"\b(CRITICAL|FATAL|ERROR|WARNING|WARN|INFO|DEBUG)\b")
+_LEVEL_ALIASES: Final[dict[str, str]] = {"FATAL": "CRITICAL", "WARN": "WARNING"}
+_RELATIVE_PATTERN: Final[re.Pattern] = re.compile(r"(\d+)([smhd])")
+_RELATIVE_UNITS: Final[dict[str, str]] = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+_SCHEMA: Final[str] = """
+CREATE TABLE IF NOT EXISTS lines (
+    id INTEGER PRIMARY KEY,
+    time TEXT NOT NULL,
+    service TEXT NOT NULL,
+    container TEXT,
+    level TEXT,
+    message TEXT NOT NULL,
+    line TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lines_time ON lines (time);
+CREATE INDEX IF NOT EXISTS lines_service ON lines (service);
+CREATE INDEX IF NOT EXISTS lines_level ON lines (level);
+CREATE VIRTUAL TABLE IF NOT EXISTS lines_fts USING fts5(message, content='lines', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS lines_insert AFTER INSERT ON lines BEGIN
+    INSERT INTO lines_fts (rowid, message) VALUES (new.id, new.message);
+END;
+CREATE TRIGGER IF NOT EXISTS lines_delete AFTER DELETE ON lines BEGIN
+    INSERT INTO lines_fts (lines_fts, rowid, message) VALUES ('delete', old.id, old.message);
+END;
+"""
+
+logger = logging.getLogger(__name__)
+
+_queue: queue.Queue[dict[str, Any]] = queue.Queue(maxsize=WRITE_QUEUE_LINES)
+_state: dict[str, Any] = {"running": False, "written": 0, "dropped": 0, "pruned": 0, "last_error": None}
+_state_lock = threading.Lock()
+
+
+def get_store_settings(env: dict[str, str]) -> dict[str, int]:
+    """LOG_STORE_RETENTION_DAYS and LOG_STORE_MAX_LINES; a max of 0 disables the store."""
+    settings = {}
+    for key, env_key, default in (
+        ("retention_days", "LOG_STORE_RETENTION_DAYS", DEFAULT_RETENTION_DAYS),
+        ("max_lines", "LOG_STORE_MAX_LINES", DEFAULT_MAX_LINES),
+    ):
+        value = (env.get(env_key) or "").strip()
+        if not value:
+            settings[key] = default
+        elif value.isdigit():
+            settings[key] = int(value)
+        else:
+            raise ValueError(f"{env_key} must be a whole number, got {value!r}")
+    return settings
+
+
+def connect(path: str | None = None) -> sqlite3.Connection:
+    connection = sqlite3.connect(path or LOG_DB_PATH, timeout=10)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(_SCHEMA)
+    return connection
+
+
+def time_key(moment: datetime) -> str:
+    """Timestamps are stored as fixed-width UTC strings, so they sort and compare as text."""
+    return moment.astimezone(UTC).strftime("%Y-%m-%dT%H:%M:%S.%f000")
+
+
+def _docker_time_key(timestamp: str) -> str:
+    whole, _, fraction = timestamp.rstrip("Z").partition(".")
+    return f"{whole}.{fraction[:9]:0<9}"
+
+
+def parse_time(value: str, now: datetime | None = None) -> str:
+    """Time key for an ISO 8601 time (UTC unless it says otherwise) or a relative one such as 15m, 2h or 7d."""
+    value = value.strip()
+    if _RELATIVE_PATTERN.fullmatch(value):
+        amount, unit = _RELATIVE_PATTERN.fullmatch(value).groups()
+        return time_key((now or datetime.now(UTC)) - timedelta(**{_RELATIVE_UNITS[unit]: int(amount)}))
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid time: {value!r}") from None
+    return time_key(moment if moment.tzinfo else moment.replace(tzinfo=UTC))
+
+
+def detect_level(message: str) -> str | None:
+    match = _LEVEL_PATTERN.search(message[:200])
+    if match is None:
+        return None
+    return _LEVEL_ALIASES.get(match.group(1), match.group(1))
+
+
+def _row(entry: dict[str, Any]) -> tuple:
+    stamp = _docker_time_key(entry["time"]) if entry.get("time") else time_key(datetime.now(UTC))
+    return (
+        stamp,
+        entry.get("service") or "",
+        entry.get("container"),
+        detect_level(entry["message"]),
+        entry["message"],
+        entry["line"],
+    )
+
+
+def insert_lines(connection: sqlite3.Connection, entries: Sequence[dict[str, Any]]) -> None:
+    with connection:
+        connection.executemany(
+            "INSERT INTO lines (time, service, container, level, message, line) VALUES (?, ?, ?, ?, ?, ?)",
+            [_row(entry) for entry in entries],
+        )
+
+
+def prune(connection: sqlite3.Connection, retention_days: int, max_lines: int, now: datetime | None = None) -> int:
+    """Delete lines older than retention_days and the oldest beyond max_lines, in batches; returns the count."""
+    cutoff = time_key((now or datetime.now(UTC)) - timedelta(days=retention_days))
+    deleted = 0
+    while True:
+        with connection:
+            newest_id = connection.execute("SELECT max(id) FROM lines").fetchone()[0] or 0
+            # Ids only grow, so everything at or below newest_id - max_lines is over the limit.
+            cursor = connection.execute(
+                "DELETE FROM lines WHERE id IN (SELECT id FROM lines WHERE time < ? OR id <= ? ORDER BY id LIMIT ?)",
+                (cutoff, newest_id - max_lines, PRUNE_BATCH_LINES),
+            )
+        deleted += cursor.rowcount
+        if cursor.rowcount < PRUNE_BATCH_LINES:
+            return deleted
+
+
+def _fts_query(text: str) -> str:
+    """Every word must match; each is quoted so FTS5 syntax in the search text is taken literally."""
+    words = text.split()
+    return " ".join('"{}"'.format(word.replace('"', '""')) for word in words)
+
+
+def search_logs(
+    services: Sequence[str] = (),
+    levels: Sequence[str] = (),
+    since: str | None = None,
+    until: str | None = None,
+    text: str | None = None,
+    before: int | None = None,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    connection: sqlite3.Connection | None = None,
+) -> dict[str, Any]:
+    """
+    Newest-first page of stored lines matching every given filter. Pages are
+    keyed on the line id: pass the returned `next_before` as `before` for the
+    next (older) page, which keeps deep pages as fast as the first.
+    """
+    for level in levels:
+        if level not in LOG_LEVELS:
+            raise ValueError(f"Unknown log level: {level}")
+    limit = min(max(limit, 1), MAX_SEARCH_LIMIT)
+
+    searching = bool(text and text.strip())
+    # With search text, the FTS index drives the query; "+" keeps the planner off the other indexes.
+    column = "+lines.{}" if searching else "lines.{}"
+    clauses, params = [], []
+    if services:
+        clauses.append(f"{column.format('service')} IN ({', '.join('?' * len(services))})")
+        params += services
+    if levels:
+        clauses.append(f"{column.format('level')} IN ({', '.join('?' * len(levels))})")
+        params += levels
+    if since:
+        clauses.append(f"{column.format('time')} >= ?")
+        params.append(parse_time(since))
+    if until:
+        clauses.append(f"{column.format('time')} <= ?")
+        params.append(parse_time(until))
+    source, order = "lines", "lines.id"
+    if searching:
+        source, order = "lines_fts JOIN lines ON lines.id = lines_fts.rowid", "lines_fts.rowid"
+        clauses.append("lines_fts MATCH ?")
+        params.append(_fts_query(text))
+    if before is not None:
+        clauses.append(f"{order} < ?")
+        params.append(before)
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    query = (
+        f"SELECT lines.id, lines.time, lines.service, lines.container, lines.level, lines.message, lines.line "
+        f"FROM {source} {where} ORDER BY {order} DESC LIMIT ?"
+    )
+    own_connection = connection is None
+    connection = connection or connect()
+    try:
+        rows = [dict(row) for row in connection.execute(query, [*params, limit + 1])]
+    finally:
+        if own_connection:
+            connection.close()
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return {"lines": rows, "next_before": rows[-1]["id"] if more else None, "limit": limit}
+
+
+def _count(**counts: int) -> None:
+    with _state_lock:
+        for key, count in counts.items():
+            _state[key] += count
+
+
+def enqueue_line(entry: dict[str, Any]) -> None:
+    """Hand a collected line to the writer; counted as dropped if the writer has fallen behind."""
+    if not _state["running"]:
+        return
+    try:
+        _queue.put_nowait(entry)
+    except queue.Full:
+        _count(dropped=1)
+
+
+def _drain(timeout: float) -> list[dict[str, Any]]:
+    batch = []
+    try:
+        batch.append(_queue.get(timeout=timeout))
+        while len(batch) < WRITE_BATCH_LINES:
+            batch.append(_queue.get_nowait())
+    except queue.Empty:
+        pass
+    return batch
+
+
+def _write(settings: dict[str, int]) -> None:
+    try:
+        connection = connect()
+    except (sqlite3.Error, OSError) as e:
+        # Without a database there is nothing to write to: stop taking lines.
+        logger.error(f"Log store disabled, could not open {LOG_DB_PATH}: {e}")
+        with _state_lock:
+            _state.update(running=False, last_error=str(e))
+        while batch := _drain(0):
+            _count(dropped=len(batch))
+        return
+    next_prune = 0.0
+    while True:
+        batch = _drain(WRITE_INTERVAL)
+        try:
+            if batch:
+                insert_lines(connection, batch)
+                _count(written=len(batch))
+                batch = []
+            if time.monotonic() >= next_prune:
+                _count(pruned=prune(connection, settings["retention_days"], settings["max_lines"]))
+                next_prune = time.monotonic() + PRUNE_INTERVAL
+            with _state_lock:
+                _state["last_error"] = None
+        except sqlite3.Error as e:
+            logger.warning(f"Could not write to the log store: {e}")
+            with _state_lock:
+                _state["last_error"] = str(e)
+            _count(dropped=len(batch))
+
+
+def is_store_running() -> bool:
+    return _state["running"]
+
+
+def get_store_status() -> dict[str, Any]:
+    with _state_lock:
+        return {**_state, "queued": _queue.qsize(), "path": LOG_DB_PATH}
+
+
+def start_log_store() -> threading.Thread | None:
+    """Start the writer thread unless LOG_STORE_MAX_LINES is 0."""
+    try:
+        settings = get_store_settings(load_env())
+    except ValueError as e:
+        logger.warning(f"Log store disabled: {e}")
+        return None
+    with _state_lock:
+        if settings["max_lines"] == 0 or _state["running"]:
+            return None
+        _state["running"] = True
+    thread = threading.Thread(target=_write, args=(settings,), name="log-store", daemon=True)
+    thread.start()
+    logger.info(f"Storing service logs in {LOG_DB_PATH} for {settings['retention_days']} days")
+    return thread
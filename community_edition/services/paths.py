@@ -0,0 +1,4 @@
+import os
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+BACKUP_DIR = os.path.join(PROJECT_DIR, "dumps")
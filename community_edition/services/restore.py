@@ -0,0 +1,387 @@
+import contextlib
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import zipfile
+from collections.abc import Iterable, Iterator
+from typing import Any, Final
+
+from .catalog import refresh_catalog
+from .chunkstore import ChunkedBackup, is_chunked_backup, load_index, open_backup, validate_backup
+from .container import is_service_running, start_database
+from .dump import (
+    DUMP_CHUNK_SIZE,
+    DUMP_DATABASES,
+    MANIFEST_NAME,
+    database_name,
+    get_backup_format,
+    get_parallel_jobs,
+)
+from .env import load_env
+from .health import wait_until_healthy
+from .paths import BACKUP_DIR, PROJECT_DIR
+from .retention import estimate_next_backup_size
+from .versions import get_current_versions
+
+MIGRATION_SERVICES: Final[tuple[str, ...]] = ("core-migration", "workflow-migration")
+APPLICATION_SERVICES: Final[tuple[str, ...]] = (
+    "core",
+    "core-worker",
+    "workflow",
+    "workflow-worker",
+    "workflow-scheduler",
+)
+# Realm/space codes are alphanumeric; an occurrence only counts as a code when
+# it is not part of a longer alphanumeric run.
+CODE_CHARS: Final[bytes] = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+# Where the postgres_data volume lives; the project directory's disk is checked
+# instead when Docker keeps its data elsewhere.
+DOCKER_DATA_DIR: Final[str] = "/var/lib/docker"
+
+logger = logging.getLogger(__name__)
+
+
+def parse_version(version: str) -> tuple[int, ...]:
+    """Parse the major.minor.patch part of an image version such as '1.24.0-stable'."""
+    numbers = []
+    for part in version.split("-", 1)[0].split(".")[:3]:
+        match = re.match(r"\d+", part)
+        numbers.append(int(match.group()) if match else 0)
+    return tuple(numbers)
+
+
+def check_version_compatibility(manifest: dict[str, Any]) -> None:
+    """Refuse to restore a backup taken on a newer version than this installation runs."""
+    current = {data["app_name"]: data["current_version"] for data in get_current_versions().values()}
+
+    for entry in manifest.get("versions", []):
+        app, version = entry.get("app"), entry.get("version", "")
+        current_version = current.get(app)
+        if not current_version:
+            logger.warning(f"Unknown app in backup: {app}")
+            continue
+        if parse_version(version) > parse_version(current_version):
+            raise ValueError(
+                f"Version incompatible for {app}: backup={version} > current={current_version}. "
+                "Cannot restore from a newer backup version!"
+            )
+
+
+def _docker_exec(container_id: str, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(["docker", "exec", container_id, *args], check=False, capture_output=True, text=True)
+
+
+def get_code_replacements(manifest: dict[str, Any], env: dict[str, str]) -> dict[str, str]:
+    """Map the realm/space codes the backup was taken under to this installation's codes, where they differ."""
+    replacements = {}
+    for key, env_key in (("space_code", "BASE_API_URL"), ("realm_code", "REALM_CODE")):
+        source, target = manifest.get(key) or "", env.get(env_key) or ""
+        if not source or not target or source == target:
+            continue
+        if not (source.isascii() and source.isalnum() and target.isascii() and target.isalnum()):
+            raise ValueError(f"Cannot rewrite {key} '{source}' -> '{target}': codes must be alphanumeric")
+        replacements[source] = target
+    return replacements
+
+
+def _substitute(pattern: re.Pattern, segment: bytes, start: int, table: dict[bytes, bytes]) -> bytes:
+    parts = []
+    last = start
+    for match in pattern.finditer(segment, start):
+        parts.append(segment[last : match.start()])
+        parts.append(table[match.group()])
+        last = match.end()
+    parts.append(segment[last:])
+    return b"".join(parts)
+
+
+def rewrite_codes(chunks: Iterable[bytes], replacements: dict[str, str]) -> Iterator[bytes]:
+    """
+    Rewrite realm/space codes in a byte stream in a single pass with bounded memory.
+
+    Each chunk is cut after its last non-code byte, so no occurrence can straddle
+    the cut; the alphanumeric tail is carried into the next chunk. An alphanumeric
+    run longer than any code can't be a code and is emitted as is. One byte of
+    already emitted context is kept so a match at the start of a chunk is only
+    accepted when preceded by a separator.
+    """
+    if not replacements:
+        yield from chunks
+        return
+
+    table = {source.encode(): target.encode() for source, target in replacements.items()}
+    codes = b"|".join(re.escape(code) for code in sorted(table, key=len, reverse=True))
+    # Mid-stream a code must be followed by a separator we have actually seen;
+    # at the end of the stream the end itself is a boundary.
+    in_stream = re.compile(rb"(?<![A-Za-z0-9])(?:" + codes + rb")(?=[^A-Za-z0-9])")
+    at_end = re.compile(rb"(?<![A-Za-z0-9])(?:" + codes + rb")(?![A-Za-z0-9])")
+
+    longest = max(len(code) for code in table)
+    previous = b""
+    carry = b""
+    for chunk in chunks:
+        buffer = carry + chunk
+        cut = len(buffer.rstrip(CODE_CHARS))
+        if not cut and len(buffer) > longest:
+            cut = len(buffer)
+        if cut:
+            yield _substitute(in_stream, previous + buffer[:cut], len(previous), table)
+            previous = buffer[cut - 1 : cut]
+        carry = buffer[cut:]
+    yield _substitute(at_end, previous + carry, len(previous), table)
+
+
+def _check_codes(manifest: dict[str, Any], env: dict[str, str]) -> dict[str, str]:
+    replacements = get_code_replacements(manifest, env)
+    if replacements and get_backup_format(manifest) == "directory":
+        # Table data is compressed binary in this format, the codes can't be rewritten in place.
+        raise ValueError(
+            "Directory-format backups can only be restored under the same realm/space codes "
+            f"(backup uses {', '.join(replacements)})"
+        )
+    return replacements
+
+
+def get_member_sizes(path: str) -> dict[str, int]:
+    """Uncompressed size of each dump member of a backup, read from the zip central directory or the chunk index."""
+    if is_chunked_backup(path):
+        return {member["name"]: member["size"] for member in load_index(path)["members"]}
+    with zipfile.ZipFile(path) as zf:
+        return {info.filename: info.file_size for info in zf.infolist() if info.filename != MANIFEST_NAME}
+
+
+def get_restore_size(path: str) -> int:
+    """Uncompressed size of the dumps in a backup."""
+    return sum(get_member_sizes(path).values())
+
+
+def _disk_requirements(path: str, backup_format: str, safety_backup: bool) -> dict[int, dict[str, Any]]:
+    """Space the restore needs, grouped by the device it is needed on."""
+    data_dir = DOCKER_DATA_DIR if os.path.isdir(DOCKER_DATA_DIR) else PROJECT_DIR
+    sizes = get_member_sizes(path)
+    needs = [(data_dir, sum(sizes.values()), "restored databases")]
+    if backup_format == "directory":
+        # Each database's dump is copied into the container's /tmp for pg_restore,
+        # one database at a time, next to the databases restored so far.
+        copies = [
+            sum(size for member, size in sizes.items() if member.startswith(f"{name}/")) for name in DUMP_DATABASES
+        ]
+        needs.append((data_dir, max(copies, default=0), "dump copied into the database container"))
+    if safety_backup and os.path.isdir(BACKUP_DIR):
+        needs.append((BACKUP_DIR, estimate_next_backup_size(list(refresh_catalog().values())), "safety backup"))
+
+    requirements: dict[int, dict[str, Any]] = {}
+    for directory, size, purpose in needs:
+        device = os.stat(directory).st_dev
+        requirement = requirements.setdefault(device, {"path": directory, "required": 0, "purposes": []})
+        requirement["required"] += size
+        requirement["purposes"].append(purpose)
+    return requirements
+
+
+def preflight_restore(path: str, safety_backup: bool = True) -> dict[str, Any]:
+    """
+    Check that a backup can be restored before anything is stopped: the manifest
+    (read from the zip central directory or the chunk index, nothing is extracted),
+    version compatibility, realm/space codes and free disk space for the restored
+    databases, the copy of a directory-format dump in the database container and,
+    with safety_backup, the backup taken beforehand.
+    Raises ValueError listing every problem found.
+    """
+    env = load_env()
+    manifest = validate_backup(path)
+
+    problems = []
+    replacements: dict[str, str] = {}
+    try:
+        check_version_compatibility(manifest)
+    except ValueError as e:
+        problems.append(str(e))
+    try:
+        replacements = _check_codes(manifest, env)
+    except ValueError as e:
+        problems.append(str(e))
+
+    disks = []
+    for requirement in _disk_requirements(path, get_backup_format(manifest), safety_backup).values():
+        free = shutil.disk_usage(requirement["path"]).free
+        disks.append({**requirement, "free": free})
+        if free < requirement["required"]:
+            problems.append(
+                f"Not enough free disk space on {requirement['path']} for the "
+                f"{' and '.join(requirement['purposes'])}: {requirement['required']} bytes needed, {free} free"
+            )
+
+    if problems:
+        raise ValueError(f"Restore preflight failed: {'; '.join(problems)}")
+    return {
+        "format": get_backup_format(manifest),
+        "realm_code": manifest.get("realm_code"),
+        "space_code": manifest.get("space_code"),
+        "versions": manifest.get("versions", []),
+        "replacements": replacements,
+        "disks": disks,
+    }
+
+
+def recreate_database(container_id: str, db_user: str, database: str) -> None:
+    _docker_exec(container_id, "psql", "-U", db_user, "-c", f"DROP DATABASE IF EXISTS {database};")
+    result = _docker_exec(container_id, "psql", "-U", db_user, "-c", f"CREATE DATABASE {database};")
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to create database '{database}': {result.stderr}")
+
+
+def _copy_members_to_container(
+    zf: zipfile.ZipFile | ChunkedBackup, prefix: str, container_id: str, container_dir: str
+) -> None:
+    """Stream the archive members under prefix/ into container_dir as a tar, without extracting on the host."""
+    with tempfile.TemporaryFile() as stderr:
+        extract = 'rm -rf "$1" && mkdir -p "$1" && tar -xf - -C "$1"'
+        proc = subprocess.Popen(
+            ["docker", "exec", "-i", container_id, "sh", "-c", extract, "sh", container_dir],
+            stdin=subprocess.PIPE,
+            stderr=stderr,
+        )
+        try:
+            with tarfile.open(fileobj=proc.stdin, mode="w|") as tar:
+                for info in zf.infolist():
+                    if info.is_dir() or not info.filename.startswith(f"{prefix}/"):
+                        continue
+                    tar_info = tarfile.TarInfo(info.filename[len(prefix) + 1 :])
+                    tar_info.size = info.file_size
+                    with zf.open(info) as source:
+                        tar.addfile(tar_info, source)
+        finally:
+            proc.stdin.close()
+            returncode = proc.wait()
+
+        if returncode != 0:
+            stderr.seek(0)
+            raise RuntimeError(f"Failed to copy '{prefix}' dump into the database container: {stderr.read()!r}")
+
+
+def _restore_directory_dump(
+    zf: zipfile.ZipFile | ChunkedBackup, container_id: str, db_user: str, name: str, jobs: int
+) -> None:
+    database = database_name(name)
+    container_dir = f"/tmp/finmars-restore-{name}"
+    try:
+        _copy_members_to_container(zf, name, container_id, container_dir)
+        logger.info(f"Restoring database '{database}' with pg_restore -j {jobs}")
+        result = _docker_exec(
+            container_id, "pg_restore", "-U", db_user, "-d", database, "-j", str(jobs), container_dir
+        )
+    finally:
+        _docker_exec(container_id, "rm", "-rf", container_dir)
+
+    if result.returncode != 0:
+        # Like psql for plain dumps, pg_restore carries on past individual statement
+        # errors and only reports them at the end; anything else is fatal.
+        if "errors ignored on restore" not in result.stderr:
+            raise RuntimeError(f"pg_restore of '{database}' failed: {result.stderr}")
+        logger.warning(f"pg_restore of '{database}' reported errors: {result.stderr}")
+
+
+def _restore_plain_dump(
+    zf: zipfile.ZipFile | ChunkedBackup, container_id: str, db_user: str, name: str, replacements: dict[str, str]
+) -> None:
+    """Pipe a plain SQL member through the code rewriter straight into psql."""
+    database = database_name(name)
+    logger.info(f"Importing database '{database}' from '{name}.sql'")
+    with zf.open(f"{name}.sql") as source, tempfile.TemporaryFile() as stderr:
+        proc = subprocess.Popen(
+            ["docker", "exec", "-i", container_id, "psql", "-q", "-U", db_user, "-d", database],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=stderr,
+        )
+        try:
+            with contextlib.suppress(BrokenPipeError):  # psql exited early, reported below
+                for block in rewrite_codes(iter(lambda: source.read(DUMP_CHUNK_SIZE), b""), replacements):
+                    proc.stdin.write(block)
+        finally:
+            with contextlib.suppress(BrokenPipeError):
+                proc.stdin.close()
+            returncode = proc.wait()
+
+        if returncode != 0:
+            stderr.seek(0)
+            message = stderr.read().decode("utf-8", errors="replace")
+            raise RuntimeError(f"Failed to import {name} database: {message}")
+
+
+def run_migrations() -> None:
+    for service in MIGRATION_SERVICES:
+        result = subprocess.run(
+            ["docker", "compose", "run", "--rm", "-T", service],
+            check=False,
+            capture_output=True,
+            text=True,
+            cwd=PROJECT_DIR,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Migration '{service}' failed: {result.stderr}")
+
+
+def restart_application_services() -> None:
+    """Restart the services holding restored data, if the stack is running, and wait until they are up."""
+    if not is_service_running("core"):
+        return
+    result = subprocess.run(
+        ["docker", "compose", "restart", *APPLICATION_SERVICES],
+        check=False,
+        capture_output=True,
+        text=True,
+        cwd=PROJECT_DIR,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to restart application services: {result.stderr}")
+    wait_until_healthy(APPLICATION_SERVICES)
+
+
+def restore_archive(path: str) -> None:
+    """
+    Restore a backup archive or chunked backup index in place: plain SQL members
+    are streamed through the code rewriter into psql, directory-format members are
+    restored with parallel pg_restore. Migrations are applied and application
+    services restarted afterwards.
+    """
+    env = load_env()
+    manifest = validate_backup(path)
+    backup_format = get_backup_format(manifest)
+
+    check_version_compatibility(manifest)
+    replacements = _check_codes(manifest, env)
+    for source, target in replacements.items():
+        logger.info(f"Rewriting code '{source}' -> '{target}'")
+
+    db_user = env.get("DB_USER", "")
+    jobs = get_parallel_jobs(env)
+    container_id = start_database(db_user)
+
+    with open_backup(path) as zf:
+        for name in DUMP_DATABASES:
+            recreate_database(container_id, db_user, database_name(name))
+            if backup_format == "directory":
+                _restore_directory_dump(zf, container_id, db_user, name, jobs)
+            else:
+                _restore_plain_dump(zf, container_id, db_user, name, replacements)
+
+    run_migrations()
+    restart_application_services()
+    logger.info(f"Backup restored successfully from {path}")
+
+
+if __name__ == "__main__":
+    # Used by the restore_backup setup step for an archive uploaded through the setup form.
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    backup_path = os.path.join("tmp", "backup.zip")
+    try:
+        restore_archive(backup_path)
+    finally:
+        if os.path.exists(backup_path):
+            os.remove(backup_path)
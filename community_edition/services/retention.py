@@ -0,0 +1,260 @@
+import logging
+import os
+import re
+import shutil
+from collections import Counter
+from collections.abc import Callable, Iterable
+from datetime import datetime
+from typing import Any, Final
+
+from .catalog import refresh_catalog
+from .chunkstore import collect_garbage, get_index_chunks, load_index
+from .env import load_env
+from .paths import BACKUP_DIR
+
+# Grandfather-father-son retention plus a disk budget for dumps/. A backup is
+# kept if any keep rule selects it; the budget and free-space rules then prune
+# the oldest remaining backups. The newest backup is never pruned, and neither
+# are protected ones, such as a backup that is about to be restored.
+#
+# Backups in the chunk store share chunks, so they are measured by their chunks
+# (a "chunks" mapping of digest to stored size on each backup): the usage is
+# that of the distinct chunks, and deleting backups frees only the chunks no
+# remaining backup references. Without it a backup counts its physical size.
+RETENTION_SETTINGS: Final[dict[str, str]] = {
+    "keep_last": "BACKUP_KEEP_LAST",
+    "keep_daily": "BACKUP_KEEP_DAILY",
+    "keep_weekly": "BACKUP_KEEP_WEEKLY",
+    "keep_monthly": "BACKUP_KEEP_MONTHLY",
+    "max_usage": "BACKUP_MAX_DISK_USAGE",
+    "min_free": "BACKUP_MIN_FREE_SPACE",
+}
+SIZE_UNITS: Final[dict[str, int]] = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+CREATED_FORMAT: Final[str] = "%Y-%m-%d %H:%M:%S"
+
+logger = logging.getLogger(__name__)
+
+# Chunk lists of the chunk-store indexes by path, with the index mtime they were read at.
+_index_chunks: dict[str, tuple[int, dict[str, int]]] = {}
+
+
+def parse_size(value: str) -> int:
+    """Parse a byte size such as '500M', '20G' or '1048576'."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*", value, re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid size: {value!r}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+def get_retention_policy(env: dict[str, str]) -> dict[str, int | None]:
+    """Retention settings from .env; unset settings are None."""
+    policy: dict[str, int | None] = {}
+    for key, env_key in RETENTION_SETTINGS.items():
+        value = (env.get(env_key) or "").strip()
+        if not value:
+            policy[key] = None
+        elif key in ("max_usage", "min_free"):
+            policy[key] = parse_size(value)
+        elif value.isdigit():
+            policy[key] = int(value)
+        else:
+            raise ValueError(f"{env_key} must be a whole number, got {value!r}")
+    return policy
+
+
+def is_policy_enabled(policy: dict[str, int | None]) -> bool:
+    return any(value is not None for value in policy.values())
+
+
+def _period_keys(created: datetime) -> dict[str, tuple]:
+    iso = created.isocalendar()
+    return {
+        "keep_daily": (created.year, created.month, created.day),
+        "keep_weekly": (iso.year, iso.week),
+        "keep_monthly": (created.year, created.month),
+    }
+
+
+def select_retained(backups: list[dict[str, Any]], policy: dict[str, int | None]) -> set[str]:
+    """
+    Timestamps kept by the keep rules: the newest `keep_last` backups and the newest
+    backup of each of the last `keep_daily` days, `keep_weekly` weeks and `keep_monthly` months.
+    Without any keep rule every backup is retained.
+    """
+    rules = ("keep_last", "keep_daily", "keep_weekly", "keep_monthly")
+    if all(policy.get(rule) is None for rule in rules):
+        return {backup["timestamp"] for backup in backups}
+
+    newest_first = sorted(backups, key=lambda b: (b["created"], b["timestamp"]), reverse=True)
+    retained = {backup["timestamp"] for backup in newest_first[: policy.get("keep_last") or 0]}
+    for rule in ("keep_daily", "keep_weekly", "keep_monthly"):
+        limit = policy.get(rule) or 0
+        seen_periods: set[tuple] = set()
+        for backup in newest_first:
+            if len(seen_periods) >= limit:
+                break
+            period = _period_keys(datetime.strptime(backup["created"], CREATED_FORMAT))[rule]
+            if period not in seen_periods:
+                seen_periods.add(period)
+                retained.add(backup["timestamp"])
+    return retained
+
+
+def _track_usage(backups: list[dict[str, Any]]) -> tuple[int, Callable[[dict[str, Any]], int]]:
+    """
+    The space the backups take, and a function that releases one of them and
+    returns the space that frees: its chunks no other backup still references.
+    """
+    references: Counter[str] = Counter()
+    chunk_sizes: dict[str, int] = {}
+    used = 0
+    for backup in backups:
+        if backup.get("chunks") is None:
+            used += backup["physical_size"]
+            continue
+        references.update(backup["chunks"].keys())
+        chunk_sizes.update(backup["chunks"])
+    used += sum(chunk_sizes.values())
+
+    def release(backup: dict[str, Any]) -> int:
+        if backup.get("chunks") is None:
+            return backup["physical_size"]
+        freed = 0
+        for digest in backup["chunks"]:
+            references[digest] -= 1
+            if references[digest] == 0:
+                freed += chunk_sizes[digest]
+        return freed
+
+    return used, release
+
+
+def plan_retention(
+    backups: list[dict[str, Any]],
+    policy: dict[str, int | None],
+    reserve: int = 0,
+    free_space: int | None = None,
+    protect: Iterable[str] = (),
+) -> dict[str, Any]:
+    """
+    Decide which backups to delete. `reserve` is the space a backup about to be
+    taken is expected to need, `free_space` the free space on the backup disk;
+    the `protect`ed timestamps are never deleted.
+    Returns the kept timestamps, the deletions (oldest first, with a reason) and
+    the disk usage before and after.
+    """
+    if not is_policy_enabled(policy):
+        return {"keep": [b["timestamp"] for b in backups], "delete": [], "used": None, "used_after": None}
+
+    oldest_first = sorted(backups, key=lambda b: (b["created"], b["timestamp"]))
+    kept = set(protect) | ({oldest_first[-1]["timestamp"]} if oldest_first else set())
+    retained = select_retained(backups, policy)
+
+    used, release = _track_usage(backups)
+    freed = 0
+    delete = []
+    for backup in oldest_first:
+        if backup["timestamp"] not in retained and backup["timestamp"] not in kept:
+            delete.append({"timestamp": backup["timestamp"], "reason": "not retained by the keep rules"})
+            freed += release(backup)
+
+    for backup in oldest_first:
+        if backup["timestamp"] in kept or backup["timestamp"] not in retained:
+            continue  # the newest and protected ones are always kept, the others are already deleted
+        if policy["max_usage"] is not None and used - freed + reserve > policy["max_usage"]:
+            reason = "over the disk budget"
+        elif policy["min_free"] is not None and free_space is not None:
+            if free_space + freed - reserve >= policy["min_free"]:
+                break
+            reason = "not enough free disk space"
+        else:
+            break
+        delete.append({"timestamp": backup["timestamp"], "reason": reason})
+        freed += release(backup)
+
+    deleted = {entry["timestamp"] for entry in delete}
+    return {
+        "keep": [b["timestamp"] for b in reversed(oldest_first) if b["timestamp"] not in deleted],
+        "delete": delete,
+        "used": used,
+        "used_after": used - freed,
+    }
+
+
+def estimate_next_backup_size(backups: list[dict[str, Any]]) -> int:
+    """
+    A new backup is assumed to take as much space as the most recent one did:
+    its physical size, or in the chunk store the chunks it added that no
+    earlier backup had.
+    """
+    if not backups:
+        return 0
+    latest = max(backups, key=lambda b: (b["created"], b["timestamp"]))
+    if latest.get("chunks") is None:
+        return latest["physical_size"]
+    earlier: set[str] = set()
+    for backup in backups:
+        if backup is not latest and backup.get("chunks") is not None:
+            earlier.update(backup["chunks"])
+    return sum(size for digest, size in latest["chunks"].items() if digest not in earlier)
+
+
+def _stored_chunks(backup: dict[str, Any]) -> dict[str, int] | None:
+    """The chunks of a chunk-store backup, from its index; None for a dump.zip or an unreadable index."""
+    if backup.get("store") != "chunks":
+        return None
+    cached = _index_chunks.get(backup["path"])
+    if cached is None or cached[0] != backup["archive_mtime_ns"]:
+        try:
+            cached = (backup["archive_mtime_ns"], get_index_chunks(load_index(backup["path"])))
+        except (OSError, ValueError, KeyError):
+            return None
+        _index_chunks[backup["path"]] = cached
+    return cached[1]
+
+
+def preview_retention(for_new_backup: bool = False, protect: Iterable[str] = ()) -> dict[str, Any]:
+    """What apply_retention would delete right now, plus the policy and disk figures it used."""
+    policy = get_retention_policy(load_env())
+    backups = [{**backup, "chunks": _stored_chunks(backup)} for backup in refresh_catalog().values()]
+    for path in set(_index_chunks) - {backup["path"] for backup in backups}:
+        _index_chunks.pop(path, None)
+    reserve = estimate_next_backup_size(backups) if for_new_backup else 0
+    free_space = shutil.disk_usage(BACKUP_DIR).free if os.path.isdir(BACKUP_DIR) else None
+    plan = plan_retention(backups, policy, reserve=reserve, free_space=free_space, protect=protect)
+    return {
+        **plan,
+        "enabled": is_policy_enabled(policy),
+        "policy": policy,
+        "reserve": reserve,
+        "free_space": free_space,
+    }
+
+
+def apply_retention(for_new_backup: bool = False, protect: Iterable[str] = ()) -> list[str]:
+    """
+    Delete the backups the retention policy prunes, except the `protect`ed ones;
+    returns their timestamps. With for_new_backup, space for the next backup
+    (see estimate_next_backup_size) is made first, and RuntimeError is raised
+    if the budget still can't fit it.
+    """
+    plan = preview_retention(for_new_backup=for_new_backup, protect=protect)
+    deleted = []
+    for entry in plan["delete"]:
+        logger.info(f"Pruning backup {entry['timestamp']}: {entry['reason']}")
+        shutil.rmtree(os.path.join(BACKUP_DIR, entry["timestamp"]), ignore_errors=True)
+        deleted.append(entry["timestamp"])
+    if deleted:
+        collect_garbage()
+
+    if for_new_backup and plan["enabled"]:
+        policy, reserve = plan["policy"], plan["reserve"]
+        if policy["max_usage"] is not None and plan["used_after"] + reserve > policy["max_usage"]:
+            raise RuntimeError(
+                f"Backup disk budget of {policy['max_usage']} bytes can't fit a new backup of ~{reserve} bytes"
+            )
+        # Before the first backup there is no dumps/ to measure yet.
+        free_space = shutil.disk_usage(BACKUP_DIR).free if os.path.isdir(BACKUP_DIR) else None
+        if policy["min_free"] is not None and free_space is not None and free_space - reserve < policy["min_free"]:
+            raise RuntimeError(f"Not enough free disk space for a new backup: {free_space} bytes free")
+    return deleted
@@ -1,11 +1,63 @@
+import contextlib
+import copy
+import fcntl
 import json
+import logging
 import os
 import subprocess
 import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import UTC, datetime
+from typing import Any, Final
 
 STATE_FILE = ".init-setup-state.json"
 LOG_FILE = "init-setup-log.txt"
 
+# The setup steps run in-process as a dependency graph: once a step is
+# requested, it and every pending step whose dependencies have finished run
+# as soon as they can, up to SETUP_WORKERS at a time. A failed step counts as
+# finished, as it did when the steps ran one after the other. Steps that
+# bring compose containers up or down never overlap, since init-keycloak
+# ends with `docker compose down`. A step still in_progress in the state file
+# was interrupted and is run again.
+#
+# Step output is streamed line by line into LOG_FILE and into an in-memory
+# channel that the status page follows; every save of the state is published
+# there too. The state file records when each step started and finished
+# under "timings".
+#
+# The state file is shared by the runner and the UI, possibly in separate
+# processes: it is replaced atomically (temp file, fsync, rename), changed
+# under an advisory lock on STATE_LOCK_FILE, and cached in memory until its
+# inode, size or mtime change. Each change it goes through bumps a version
+# number that wait_for_state_change() blocks on.
+SETUP_WORKERS: Final[int] = 3
+FINISHED_STATES: Final[tuple[str, ...]] = ("done", "failed", "skip")
+ACTIVE_STATES: Final[tuple[str, ...]] = ("requested", "in_progress")
+STACK_STEPS: Final[frozenset[str]] = frozenset({"init_cert", "init_keycloak", "restore_backup", "docker_up"})
+TIMINGS_KEY: Final[str] = "timings"
+SETUP_EVENTS: Final[int] = 5000
+SETUP_KEEPALIVE: Final[float] = 15.0
+STATE_LOCK_FILE = f"{STATE_FILE}.lock"
+STATE_POLL_INTERVAL: Final[float] = 1.0
+STATE_WAIT_TIMEOUT: Final[float] = 25.0
+
+logger = logging.getLogger(__name__)
+
+_log_lock = threading.Lock()
+_runner: dict[str, threading.Thread | None] = {"thread": None}
+_runner_lock = threading.Lock()
+_changed = threading.Condition()
+_events: deque[dict[str, Any]] = deque(maxlen=SETUP_EVENTS)
+_channel: dict[str, int] = {"seq": 0}
+_state_changed = threading.Condition()
+_store: dict[str, Any] = {"signature": None, "state": None, "version": 0}
+
 
 def get_setup_steps() -> list[tuple[str, list[str], str]]:
     return [
@@ -13,13 +65,27 @@ def get_setup_steps() -> list[tuple[str, list[str], str]]:
         ("init_cert", ["make", "init-cert"], "Request Certificates"),
         ("init_keycloak", ["make", "init-keycloak"], "Initializing Single-Sign-On"),
         ("update_versions", ["make", "update-versions"], "Updating Versions"),
-        ("restore_backup", ["make", "restore-backup"], "Restoring Backup"),
+        ("pull_images", ["docker", "compose", "pull", "--quiet"], "Pulling Images"),
+        ("restore_backup", [sys.executable, "-m", "community_edition.services.restore"], "Restoring Backup"),
         ("docker_up", ["make", "up"], "Starting Services"),
     ]
 
 
+def get_step_dependencies() -> dict[str, tuple[str, ...]]:
+    """The steps each step has to wait for."""
+    return {
+        "generate_env": (),
+        "init_cert": ("generate_env",),
+        "init_keycloak": ("generate_env",),
+        "update_versions": ("generate_env",),
+        "pull_images": ("update_versions",),
+        "restore_backup": ("init_keycloak", "pull_images"),
+        "docker_up": ("init_cert", "init_keycloak", "pull_images", "restore_backup"),
+    }
+
+
 def append_log(title: str, stdout: str, stderr: str) -> None:
-    with open(LOG_FILE, "a") as logf:
+    with _log_lock, open(LOG_FILE, "a") as logf:
         logf.write(f"\n\n### {title}\n")
         if stdout:
             logf.write(stdout)
@@ -27,22 +93,172 @@ def append_log(title: str, stdout: str, stderr: str) -> None:
             logf.write(stderr)
 
 
-def save_state(state: dict[str, str]) -> None:
-    with open(STATE_FILE, "w") as f:
-        json.dump(state, f, indent=2)
+def _now() -> str:
+    return datetime.now(UTC).isoformat(timespec="seconds")
+
+
+def publish(event: dict[str, Any]) -> None:
+    """Send an event to everyone following the setup, keeping the last SETUP_EVENTS for late followers."""
+    with _changed:
+        _channel["seq"] += 1
+        _events.append({**event, "seq": _channel["seq"]})
+        _changed.notify_all()
+
+
+def follow_setup(after: int | None = None, keepalive: float = SETUP_KEEPALIVE) -> Iterator[dict[str, Any] | None]:
+    """
+    Yield the current state and the kept output, or with `after` (a
+    reconnecting follower) every kept event after that sequence number, then
+    each new event as it is published. Yields None as a keepalive.
+    """
+    with _changed:
+        if after is None:
+            entries = [event for event in _events if event["type"] == "output"]
+        else:
+            entries = [event for event in _events if event["seq"] > after]
+        seq = _channel["seq"]
+    if after is None:
+        yield {"type": "state", "state": load_state(), "seq": seq}
+    yield from entries
+
+    while True:
+        with _changed:
+            _changed.wait_for(lambda seen=seq: _channel["seq"] > seen, timeout=keepalive)
+            entries = [event for event in _events if event["seq"] > seq]
+            seq = _channel["seq"]
+        if not entries:
+            yield None
+        yield from entries
+
+
+def _signature() -> tuple | None:
+    try:
+        stat = os.stat(STATE_FILE)
+    except FileNotFoundError:
+        return None
+    return (os.path.abspath(STATE_FILE), stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+@contextlib.contextmanager
+def _file_lock() -> Iterator[None]:
+    """Hold the advisory lock that serializes changes to the state file, across threads and processes."""
+    with open(STATE_LOCK_FILE, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _write(state: dict[str, Any]) -> None:
+    directory = os.path.dirname(os.path.abspath(STATE_FILE))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(STATE_FILE)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, STATE_FILE)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temp_path)
+        raise
+    directory_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(directory_fd)
+    finally:
+        os.close(directory_fd)
+
+
+def _remember(state: dict[str, Any] | None, signature: tuple | None) -> None:
+    """Cache the state as read or written; a new state bumps the version. Call with _state_changed held."""
+    changed = state != _store["state"]
+    _store.update(state=copy.deepcopy(state), signature=signature)
+    if changed:
+        _store["version"] += 1
+        _state_changed.notify_all()
+        if state is not None:
+            publish({"type": "state", "state": copy.deepcopy(state)})
+
+
+def _refresh() -> dict[str, Any] | None:
+    """The cached state, re-read if the file changed (None if missing). Call with _state_changed held."""
+    signature = _signature()
+    if signature is not None and signature == _store["signature"]:
+        return _store["state"]
+    state = None
+    if signature is not None:
+        try:
+            with open(STATE_FILE) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            signature = None
+        except json.JSONDecodeError:
+            # Caught halfway through a write by something that doesn't replace the
+            # file atomically: keep the cached state and read it again next time.
+            return _store["state"]
+    _remember(state, signature)
+    return _store["state"]
+
+
+def save_state(state: dict[str, Any]) -> None:
+    with _file_lock():
+        _write(state)
+        with _state_changed:
+            _remember(state, _signature())
+
+
+@contextlib.contextmanager
+def locked_state() -> Iterator[dict[str, Any]]:
+    """
+    The current state to change in place; it is saved when the block exits,
+    if changed. Other writers wait until then, so nothing is lost in between.
+    """
+    with _file_lock():
+        with _state_changed:
+            current = _refresh()
+        state = copy.deepcopy(current) if current is not None else _initial_state()
+        yield state
+        if state != current:
+            _write(state)
+            with _state_changed:
+                _remember(state, _signature())
+
+
+def _initial_state() -> dict[str, Any]:
+    return {step: "pending" for step, _, _ in get_setup_steps()}
 
 
-def default_state() -> dict[str, str]:
-    state = {step: "pending" for step, _, _ in get_setup_steps()}
+def default_state() -> dict[str, Any]:
+    state = _initial_state()
     save_state(state)
     return state
 
 
-def load_state() -> dict[str, str]:
-    if os.path.exists(STATE_FILE):
-        with open(STATE_FILE) as f:
-            return json.load(f)
-    return default_state()
+def load_state() -> dict[str, Any]:
+    """A copy of the state, read from the file only when it has changed."""
+    with _state_changed:
+        state = _refresh()
+    if state is None:
+        return default_state()
+    return copy.deepcopy(state)
+
+
+def wait_for_state_change(version: int | None, timeout: float = STATE_WAIT_TIMEOUT) -> tuple[int, dict[str, Any]]:
+    """
+    Block until the state's version differs from `version` (a version from an
+    earlier call), or timeout passes, and return the version and the state.
+    Changes by other processes are noticed within STATE_POLL_INTERVAL.
+    """
+    load_state()
+    deadline = time.monotonic() + timeout
+    with _state_changed:
+        while True:
+            _refresh()
+            remaining = deadline - time.monotonic()
+            if _store["version"] != version or remaining <= 0:
+                return _store["version"], copy.deepcopy(_store["state"] or {})
+            _state_changed.wait(min(remaining, STATE_POLL_INTERVAL))
 
 
 def disable_autostart() -> None:
@@ -64,51 +280,153 @@ def disable_autostart() -> None:
         pass
 
 
+def is_setup_active(state: dict[str, Any] | None = None) -> bool:
+    """Whether any step is requested or running."""
+    state = load_state() if state is None else state
+    return any(state.get(step) in ACTIVE_STATES for step, _, _ in get_setup_steps())
+
+
+def get_ready_steps(state: dict[str, Any], running: Iterable[str] = ()) -> list[str]:
+    """
+    The steps that can start now, in setup order: requested ones, and pending
+    ones that have dependencies, once those have all finished. Steps missing
+    from the state count as finished.
+    """
+    dependencies = get_step_dependencies()
+    stack_busy = any(name in STACK_STEPS for name in running)
+    ready = []
+    for step, _, _ in get_setup_steps():
+        status = state.get(step)
+        deps = dependencies.get(step, ())
+        if status != "requested" and not (status == "pending" and deps):
+            continue
+        if not all(state.get(dep, "done") in FINISHED_STATES for dep in deps):
+            continue
+        if step in STACK_STEPS:
+            if stack_busy:
+                continue
+            stack_busy = True
+        ready.append(step)
+    return ready
+
+
+def _output(step: str, line: str) -> None:
+    with _log_lock, open(LOG_FILE, "a") as logf:
+        logf.write(f"{step} | {line}\n")
+    publish({"type": "output", "step": step, "line": line})
+
+
+def run_step(step: str, cmd: list[str], title: str) -> bool:
+    """
+    Run one step's command, streaming its output a line at a time to the
+    setup log and the followers. Returns whether it succeeded.
+    """
+    append_log(title, "", "")
+    try:
+        proc = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, errors="replace", bufsize=1
+        )
+    except Exception as e:
+        _output(step, str(e))
+        return False
+    with proc:
+        for line in proc.stdout:
+            _output(step, line.rstrip("\n"))
+    return proc.returncode == 0
+
+
+def run_setup(max_workers: int = SETUP_WORKERS) -> dict[str, Any]:
+    """
+    Run the requested steps and every step they unblock, resuming steps an
+    earlier run left in progress. Returns the final state.
+    """
+    steps = {step: (cmd, title) for step, cmd, title in get_setup_steps()}
+    with locked_state() as state:
+        for step in steps:
+            if state.get(step) == "in_progress":
+                logger.info(f"Resuming setup step {step}")
+                state[step] = "requested"
+
+    running: dict[Future, str] = {}
+    started: dict[str, float] = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="setup") as executor:
+        while True:
+            with locked_state() as state:
+                ready = get_ready_steps(state, running.values())[: max_workers - len(running)]
+                for step in ready:
+                    state[step] = "in_progress"
+                    state.setdefault(TIMINGS_KEY, {})[step] = {
+                        "started_at": _now(),
+                        "finished_at": None,
+                        "duration": None,
+                    }
+            for step in ready:
+                started[step] = time.monotonic()
+                running[executor.submit(run_step, step, *steps[step])] = step
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                step = running.pop(future)
+                duration = round(time.monotonic() - started.pop(step), 1)
+                try:
+                    succeeded = future.result()
+                except Exception:
+                    # One step going wrong must not leave the others in progress.
+                    logger.exception(f"Setup step {step} raised")
+                    succeeded = False
+                with locked_state() as state:
+                    state[step] = "done" if succeeded else "failed"
+                    timing = state.setdefault(TIMINGS_KEY, {}).setdefault(step, {})
+                    timing.update(finished_at=_now(), duration=duration)
+                logger.info(f"Setup step {step}: {state[step]} in {duration}s")
+                if step == "docker_up":
+                    disable_autostart()
+    return load_state()
+
+
+def _run_in_background() -> None:
+    try:
+        run_setup()
+    except Exception:
+        logger.exception("Setup failed")
+    finally:
+        with _runner_lock:
+            _runner["thread"] = None
+
+
+def start_setup() -> threading.Thread:
+    """Run the setup in a background thread unless it is running already; returns the running thread."""
+    with _runner_lock:
+        if _runner["thread"] is None:
+            _runner["thread"] = threading.Thread(target=_run_in_background, name="setup", daemon=True)
+            _runner["thread"].start()
+        return _runner["thread"]
+
+
+def resume_setup() -> threading.Thread | None:
+    """Continue a setup that was requested or under way when the app stopped."""
+    if not os.path.exists(STATE_FILE) or not is_setup_active():
+        return None
+    return start_setup()
+
+
 def run_pending_step() -> None:
     state = load_state()
     print("[init-setup] Loaded state:", state)
     sys.stdout.flush()
-    executed = False
-    for step, cmd, title in get_setup_steps():
-        if state.get(step) == "requested":
-            executed = True
-            state[step] = "in_progress"
-            save_state(state)
-            try:
-                proc = subprocess.run(cmd, check=False, capture_output=True, text=True)
-                append_log(title, proc.stdout, proc.stderr)
-                state[step] = "done" if proc.returncode == 0 else "failed"
-            except Exception as e:
-                append_log(title, "", str(e))
-                state[step] = "failed"
-            save_state(state)
-
-            if step == "docker_up":
-                disable_autostart()
-
-            step_names = [name for name, _, _ in get_setup_steps()]
-
-            current_index = step_names.index(step)
-            while current_index + 1 < len(step_names):
-                current_index += 1
-
-                next_step = step_names[current_index]
-                if state.get(next_step) == "pending":
-                    state[next_step] = "requested"
-                    save_state(state)
-                    break
-                else:
-                    print(f"Skipping step {next_step} because it is not pending")
-
-            if os.path.exists(LOG_FILE):
-                with open(LOG_FILE) as logf:
-                    print(logf.read())
-            sys.stdout.flush()
-            break
-
-    if not executed:
+    if not is_setup_active(state):
         print("[init-setup] No requested steps found, nothing to run.")
         sys.stdout.flush()
+        return
+
+    thread = start_setup()
+    for event in follow_setup(after=_channel["seq"], keepalive=1):
+        if event is None and not thread.is_alive():
+            break
+        if event is not None and event["type"] == "output":
+            print(f"{event['step']} | {event['line']}", flush=True)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,200 @@
+import copy
+import json
+import subprocess
+import threading
+from collections.abc import Sequence
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import Any, Final
+
+from .container import restart_services
+from .dockerapi import get_docker_client
+from .health import wait_until_healthy
+from .jobs import log, set_progress, step
+from .paths import PROJECT_DIR
+from .versions import VERSION_MAPPING
+
+# A version update only touches the services whose image tag changed, plus
+# the services that depend on them (nginx resolves its upstreams when it
+# starts). They are handled a dependency level at a time: one-off services
+# such as core-migration, which others wait on to complete, are run to
+# completion; changed services are recreated; dependents are restarted; and
+# each level has to be healthy before the next one starts.
+COMPLETED_CONDITION: Final[str] = "service_completed_successfully"
+# Images of the services to migrate or recreate are pulled, all at once, before
+# anything is stopped, so only the switchover itself counts as downtime.
+PULL_WORKERS: Final[int] = 4
+PULL_PROGRESS_INTERVAL: Final[float] = 0.5
+
+
+def _compose(args: list[str], action: str) -> str:
+    result = subprocess.run(["docker", "compose", *args], check=False, capture_output=True, text=True, cwd=PROJECT_DIR)
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to {action}: {result.stderr or result.stdout}")
+    return result.stdout
+
+
+def load_compose_services(interpolate: bool = False) -> dict[str, dict[str, Any]]:
+    """
+    The compose services; without interpolate, `${VAR}` references are left in
+    place so images show which variables they depend on.
+    """
+    args = ["config", "--format", "json"] if interpolate else ["config", "--no-interpolate", "--format", "json"]
+    return json.loads(_compose(args, "read the compose configuration"))["services"]
+
+
+def get_version_changes(old_env: dict[str, str], new_env: dict[str, str]) -> dict[str, tuple[str, str]]:
+    """The VERSION_MAPPING variables whose value differs, with their old and new values."""
+    return {
+        env_var: (old_env.get(env_var, ""), new_env.get(env_var, ""))
+        for env_var in VERSION_MAPPING
+        if old_env.get(env_var, "") != new_env.get(env_var, "")
+    }
+
+
+def _dependencies(service: dict[str, Any]) -> dict[str, str]:
+    """Dependency name to condition; depends_on is a list or a mapping."""
+    depends_on = service.get("depends_on") or {}
+    if isinstance(depends_on, list):
+        return {name: "service_started" for name in depends_on}
+    return {name: (options or {}).get("condition", "service_started") for name, options in depends_on.items()}
+
+
+def plan_upgrade(
+    old_env: dict[str, str], new_env: dict[str, str], services: dict[str, dict[str, Any]] | None = None
+) -> list[dict[str, Any]]:
+    """
+    Stages of the rolling upgrade from old_env to new_env, in the order to run
+    them: {"action": "migrate" | "recreate" | "restart", "services": [...]}.
+    Empty when no image version changed.
+    """
+    changes = get_version_changes(old_env, new_env)
+    if not changes:
+        return []
+    services = services if services is not None else load_compose_services()
+    dependencies = {name: _dependencies(service) for name, service in services.items()}
+    one_off = {
+        dep for deps in dependencies.values() for dep, condition in deps.items() if condition == COMPLETED_CONDITION
+    }
+
+    changed = {
+        name
+        for name, service in services.items()
+        if any(f"${{{env_var}}}" in (service.get("image") or "") for env_var in changes)
+    }
+    # Everything that depends on a changed service, directly or not.
+    affected = set(changed)
+    while True:
+        dependents = {name for name, deps in dependencies.items() if name not in affected and affected & set(deps)}
+        if not dependents:
+            break
+        affected |= dependents
+
+    stages = []
+    done: set[str] = set()
+    while affected - done:
+        level = sorted(name for name in affected - done if not (set(dependencies[name]) & (affected - done)))
+        if not level:
+            raise RuntimeError(f"Circular dependencies between {', '.join(sorted(affected - done))}")
+        for action, names in (
+            ("migrate", [name for name in level if name in one_off]),
+            ("recreate", [name for name in level if name in changed and name not in one_off]),
+            ("restart", [name for name in level if name not in changed and name not in one_off]),
+        ):
+            if names:
+                stages.append({"action": action, "services": names})
+        done |= set(level)
+    return stages
+
+
+def get_upgrade_images(stages: list[dict[str, Any]], services: dict[str, dict[str, Any]] | None = None) -> list[str]:
+    """The images the migrate and recreate stages will run, with the new versions filled in."""
+    services = services if services is not None else load_compose_services(interpolate=True)
+    names = {name for stage in stages if stage["action"] != "restart" for name in stage["services"]}
+    return sorted({services[name]["image"] for name in names if services.get(name, {}).get("image")})
+
+
+def _pull(image: str, progress: dict[str, Any], lock: threading.Lock) -> None:
+    """Pull one image, keeping progress up to date with the bytes downloaded over all its layers."""
+    client = get_docker_client()
+    if client is None:
+        with lock:
+            progress["status"] = "pulling"
+        result = subprocess.run(["docker", "pull", "--quiet", image], check=False, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or f"docker pull exited with {result.returncode}")
+        with lock:
+            progress["status"] = "done"
+        return
+
+    if client.image_exists(image):
+        with lock:
+            progress["status"] = "present"
+        return
+    layers: dict[str, tuple[int, int]] = {}
+    with lock:
+        progress["status"] = "pulling"
+    for message in client.pull(image):
+        layer, detail = message.get("id"), message.get("progressDetail") or {}
+        if not layer or layer == image.rsplit(":", 1)[-1]:
+            continue
+        current, total = layers.get(layer, (0, 0))
+        if message.get("status") == "Downloading" and detail.get("total"):
+            current, total = detail.get("current", 0), detail["total"]
+        elif message.get("status") in ("Download complete", "Pull complete", "Already exists"):
+            current = total
+        layers[layer] = (current, total)
+        with lock:
+            progress["current"] = sum(current for current, _ in layers.values())
+            progress["total"] = sum(total for _, total in layers.values())
+    with lock:
+        progress["status"] = "done"
+
+
+def pull_images(images: Sequence[str]) -> None:
+    """
+    Pull the images concurrently, publishing per-image byte progress on the
+    current job. Raises RuntimeError naming every image that could not be pulled.
+    """
+    lock = threading.Lock()
+    progress = {image: {"status": "waiting", "current": 0, "total": 0, "error": None} for image in images}
+
+    def publish() -> None:
+        with lock:
+            set_progress({"images": copy.deepcopy(progress)})
+
+    with ThreadPoolExecutor(max_workers=PULL_WORKERS, thread_name_prefix="pull") as executor:
+        futures = {executor.submit(_pull, image, progress[image], lock): image for image in images}
+        pending = set(futures)
+        while pending:
+            _, pending = wait(pending, timeout=PULL_PROGRESS_INTERVAL, return_when=FIRST_EXCEPTION)
+            publish()
+
+    failed = []
+    for future, image in futures.items():
+        if future.exception() is not None:
+            with lock:
+                progress[image].update(status="failed", error=str(future.exception()))
+            failed.append(f"{image}: {future.exception()}")
+    publish()
+    if failed:
+        raise RuntimeError(f"Failed to pull images: {'; '.join(failed)}")
+
+
+def run_upgrade(stages: list[dict[str, Any]]) -> None:
+    """Run the stages from plan_upgrade, each as a step of the current job."""
+    for stage in stages:
+        names = stage["services"]
+        if stage["action"] == "migrate":
+            for name in names:
+                step(f"Running {name}")
+                log(_compose(["run", "--rm", "--no-deps", name], f"run {name}"))
+            continue
+
+        if stage["action"] == "recreate":
+            step(f"Recreating {', '.join(names)}")
+            log(_compose(["up", "-d", "--no-deps", *names], f"recreate {', '.join(names)}"))
+        else:
+            step(f"Restarting {', '.join(names)}")
+            restart_services(names)
+        step(f"Waiting for {', '.join(names)}")
+        wait_until_healthy(names)
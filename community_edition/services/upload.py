@@ -0,0 +1,168 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import IO, Any, Final
+
+from .dump import validate_backup_archive
+from .paths import PROJECT_DIR
+
+UPLOAD_PATH = os.path.join(PROJECT_DIR, "tmp", "backup.zip")
+UPLOAD_CHUNK_SIZE: Final[int] = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+# Running SHA-256 of the upload in progress, keyed by the offset it covers, so
+# consecutive chunks only hash the bytes they add.
+_hash_lock = threading.RLock()
+_hash_state: dict[str, Any] = {"path": None, "offset": 0, "hasher": None}
+
+
+def _state_path() -> str:
+    return f"{UPLOAD_PATH}.upload.json"
+
+
+def _read_state() -> dict[str, Any]:
+    try:
+        with open(_state_path()) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _write_state(state: dict[str, Any]) -> None:
+    with open(_state_path(), "w") as f:
+        json.dump(state, f)
+
+
+def _hasher_at(offset: int) -> Any:
+    """Return a SHA-256 hasher covering the first `offset` bytes of the upload."""
+    if _hash_state["path"] == UPLOAD_PATH and _hash_state["offset"] == offset:
+        return _hash_state["hasher"]
+
+    # The process restarted or the client rewound: rebuild from what is on disk.
+    hasher = hashlib.sha256()
+    remaining = offset
+    if remaining:
+        with open(UPLOAD_PATH, "rb") as f:
+            while remaining and (block := f.read(min(UPLOAD_CHUNK_SIZE, remaining))):
+                hasher.update(block)
+                remaining -= len(block)
+    return hasher
+
+
+def get_upload_status() -> dict[str, Any]:
+    """Describe the upload currently parked at tmp/backup.zip."""
+    if not os.path.exists(UPLOAD_PATH):
+        return {"offset": 0, "total": None, "name": "", "complete": False, "sha256": None}
+
+    state = _read_state()
+    return {
+        "offset": os.path.getsize(UPLOAD_PATH),
+        "total": state.get("total"),
+        "name": state.get("name", ""),
+        "complete": bool(state.get("complete")),
+        "sha256": state.get("sha256"),
+    }
+
+
+def _finalize_upload(state: dict[str, Any], digest: str) -> dict[str, Any]:
+    expected = state.get("expected_sha256")
+    if expected and expected.lower() != digest:
+        discard_upload()
+        raise ValueError(f"Checksum mismatch: expected {expected}, got {digest}")
+
+    try:
+        manifest = validate_backup_archive(UPLOAD_PATH)
+    except ValueError:
+        discard_upload()
+        raise
+
+    state.update({"complete": True, "sha256": digest})
+    _write_state(state)
+    logger.info(f"Backup upload completed: {state['total']} bytes, sha256={digest}")
+    return manifest
+
+
+def write_upload_chunk(
+    stream: IO[bytes],
+    offset: int,
+    end: int,
+    total: int,
+    name: str = "",
+    expected_sha256: str | None = None,
+) -> dict[str, Any]:
+    """
+    Append the bytes [offset, end) read from `stream` to tmp/backup.zip.
+
+    A chunk starting at 0 begins a new upload; any other chunk must start exactly
+    where the stored data ends. A short read keeps what arrived so the client can
+    resume from the returned offset. Once the last byte lands the archive is
+    validated and the manifest is included in the returned status.
+    """
+    if total <= 0 or not 0 <= offset < end <= total:
+        raise ValueError(f"Invalid chunk range {offset}-{end}/{total}")
+
+    with _hash_lock:
+        if offset == 0:
+            os.makedirs(os.path.dirname(UPLOAD_PATH), exist_ok=True)
+            state = {"total": total, "name": name, "complete": False, "expected_sha256": expected_sha256}
+            _write_state(state)
+            open(UPLOAD_PATH, "wb").close()
+        else:
+            state = _read_state()
+            current = os.path.getsize(UPLOAD_PATH) if os.path.exists(UPLOAD_PATH) else 0
+            if state.get("total") != total or state.get("complete") or current != offset:
+                raise ValueError(f"Upload offset mismatch: server has {current} bytes, chunk starts at {offset}")
+            if expected_sha256:
+                state["expected_sha256"] = expected_sha256
+                _write_state(state)
+
+        hasher = _hasher_at(offset)
+        position = offset
+        with open(UPLOAD_PATH, "r+b") as f:
+            f.seek(offset)
+            while position < end and (block := stream.read(min(UPLOAD_CHUNK_SIZE, end - position))):
+                f.write(block)
+                hasher.update(block)
+                position += len(block)
+        _hash_state.update({"path": UPLOAD_PATH, "offset": position, "hasher": hasher})
+
+        manifest = None
+        if position == total:
+            manifest = _finalize_upload(state, hasher.hexdigest())
+
+    return {**get_upload_status(), "manifest": manifest}
+
+
+def save_uploaded_file(file: IO[bytes]) -> dict[str, Any]:
+    """Stream a whole uploaded file to tmp/backup.zip, hashing and validating it on the way."""
+    os.makedirs(os.path.dirname(UPLOAD_PATH), exist_ok=True)
+    hasher = hashlib.sha256()
+    size = 0
+    with _hash_lock, open(UPLOAD_PATH, "wb") as f:
+        while block := file.read(UPLOAD_CHUNK_SIZE):
+            f.write(block)
+            hasher.update(block)
+            size += len(block)
+        _hash_state.update({"path": None, "offset": 0, "hasher": None})
+
+    state = {"total": size, "name": "", "complete": False}
+    return _finalize_upload(state, hasher.hexdigest())
+
+
+def get_completed_upload() -> dict[str, Any]:
+    """Return the manifest of a fully uploaded, validated backup or raise ValueError."""
+    status = get_upload_status()
+    if not status["complete"] or status["offset"] != status["total"]:
+        raise ValueError("No completed backup upload found")
+    return validate_backup_archive(UPLOAD_PATH)
+
+
+def discard_upload() -> None:
+    with _hash_lock:
+        for path in (UPLOAD_PATH, _state_path()):
+            if os.path.exists(path):
+                os.remove(path)
+        _hash_state.update({"path": None, "offset": 0, "hasher": None})
@@ -0,0 +1,186 @@
+import hashlib
+import logging
+import mmap
+import threading
+import time
+import zipfile
+from datetime import UTC, datetime
+from typing import IO, Any, Final
+
+from .catalog import get_backup_entry, refresh_catalog, update_backup_entry
+from .chunkstore import ChunkedBackup, is_chunked_backup, validate_backup
+from .dump import MANIFEST_NAME
+from .env import load_env
+from .jobs import step, submit_job
+
+# Archives are re-hashed through a read-only memory map in large slices, so the
+# whole-file checksum is one sequential pass without a read() per block; members
+# are then read back through a large buffer, which also checks their CRC-32.
+VERIFY_READ_SIZE: Final[int] = 8 * 1024 * 1024
+VERIFY_CONFLICT_KEY: Final[str] = "verify"
+
+logger = logging.getLogger(__name__)
+
+
+def _hash_member(source: IO[bytes]) -> dict[str, Any]:
+    hasher = hashlib.sha256()
+    size = 0
+    while block := source.read(VERIFY_READ_SIZE):
+        hasher.update(block)
+        size += len(block)
+    return {"size": size, "sha256": hasher.hexdigest()}
+
+
+def _check_members(backup: zipfile.ZipFile | ChunkedBackup, expected: dict[str, dict[str, Any]]) -> list[dict]:
+    """Read every member back and compare it with the size and SHA-256 recorded in the manifest."""
+    results = []
+    for info in backup.infolist():
+        if info.is_dir() or info.filename == MANIFEST_NAME:
+            continue
+        result = {"name": info.filename, "status": "ok", "error": None}
+        try:
+            with backup.open(info) as source:
+                result.update(_hash_member(source))
+        except (zipfile.BadZipFile, ValueError, OSError, EOFError) as e:
+            # zipfile checks each member's CRC-32 as the last block is read.
+            result.update(status="corrupt", error=str(e))
+            results.append(result)
+            continue
+
+        recorded = expected.get(info.filename)
+        if recorded is None:
+            result["status"] = "unchecked"
+        elif (recorded["size"], recorded["sha256"]) != (result["size"], result["sha256"]):
+            result.update(status="mismatch", error="size or SHA-256 differs from the manifest")
+        results.append(result)
+
+    names = {result["name"] for result in results}
+    results += [
+        {"name": name, "status": "missing", "error": "not in the backup"} for name in expected if name not in names
+    ]
+    return results
+
+
+def _verify_archive(path: str, expected: dict[str, dict[str, Any]]) -> tuple[str, list[dict]]:
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        hasher = hashlib.sha256()
+        with memoryview(mapped) as view:
+            for offset in range(0, len(view), VERIFY_READ_SIZE):
+                hasher.update(view[offset : offset + VERIFY_READ_SIZE])
+        archive_sha256 = hasher.hexdigest()
+    with open(path, "rb", buffering=VERIFY_READ_SIZE) as f, zipfile.ZipFile(f) as zf:
+        return archive_sha256, _check_members(zf, expected)
+
+
+def verify_backup_file(path: str, expected_sha256: str | None = None) -> dict[str, Any]:
+    """
+    Re-read a dump.zip or chunked backup and check it against its manifest.
+    Archives are also checked against expected_sha256, the checksum recorded when
+    the backup was taken, if given.
+    """
+    started = time.monotonic()
+    result: dict[str, Any] = {
+        "ok": False,
+        "verified_at": datetime.now(UTC).isoformat(timespec="seconds"),
+        "sha256": None,
+        "members": [],
+        "errors": [],
+    }
+    try:
+        manifest = validate_backup(path)
+        expected = manifest.get("members") or {}
+        if is_chunked_backup(path):
+            with ChunkedBackup(path) as backup:
+                result["members"] = _check_members(backup, expected)
+        else:
+            result["sha256"], result["members"] = _verify_archive(path, expected)
+    except (zipfile.BadZipFile, ValueError, OSError) as e:
+        result["errors"].append(str(e))
+
+    if expected_sha256 and result["sha256"] and result["sha256"] != expected_sha256:
+        result["errors"].append("Archive SHA-256 differs from the one recorded when the backup was taken")
+    result["errors"] += [
+        f"{member['name']}: {member['status']} ({member['error']})"
+        for member in result["members"]
+        if member["status"] not in ("ok", "unchecked")
+    ]
+    result["ok"] = not result["errors"]
+    result["duration"] = round(time.monotonic() - started, 3)
+    return result
+
+
+def verify_backup(timestamp: str) -> dict[str, Any]:
+    """Verify a backup from the catalog and record the outcome on its catalog entry."""
+    entry = get_backup_entry(timestamp)
+    if entry is None:
+        raise ValueError(f"Backup not found: {timestamp}")
+
+    logger.info(f"Verifying backup {timestamp}")
+    result = verify_backup_file(entry["path"], expected_sha256=entry["sha256"])
+    if not result["ok"] and get_backup_entry(timestamp) is None:
+        # Deleted or pruned while it was being read; that is no verification failure.
+        raise ValueError(f"Backup not found: {timestamp}")
+    fields: dict[str, Any] = {"verification": {key: result[key] for key in ("ok", "verified_at", "errors")}}
+    if result["ok"] and entry["sha256"] is None and result["sha256"]:
+        fields["sha256"] = result["sha256"]
+    update_backup_entry(timestamp, **fields)
+
+    if result["ok"]:
+        logger.info(f"Backup {timestamp} verified in {result['duration']}s")
+    else:
+        logger.error(f"Backup {timestamp} failed verification: {'; '.join(result['errors'])}")
+    return result
+
+
+def verify_all_backups() -> str:
+    """
+    Verify every backup in the catalog, least recently verified first. Backups
+    deleted or pruned while the sweep runs are skipped.
+    """
+    entries = sorted(
+        refresh_catalog().values(),
+        key=lambda entry: (entry.get("verification") or {}).get("verified_at") or "",
+    )
+    failed = []
+    skipped = []
+    for entry in entries:
+        step(f"Verifying {entry['timestamp']}")
+        try:
+            result = verify_backup(entry["timestamp"])
+        except ValueError:
+            logger.info(f"Backup {entry['timestamp']} was deleted, skipping it")
+            skipped.append(entry["timestamp"])
+            continue
+        if not result["ok"]:
+            failed.append(entry["timestamp"])
+    checked = len(entries) - len(skipped)
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {checked} backup(s) failed verification: {', '.join(failed)}")
+    return f"{checked} backup(s) verified" + (f", {len(skipped)} deleted meanwhile" if skipped else "")
+
+
+def get_verify_interval(env: dict[str, str]) -> float | None:
+    """Hours between verification sweeps, BACKUP_VERIFY_INTERVAL_HOURS; None when disabled."""
+    try:
+        hours = float(env.get("BACKUP_VERIFY_INTERVAL_HOURS") or 0)
+    except ValueError:
+        logger.warning("Ignoring invalid BACKUP_VERIFY_INTERVAL_HOURS")
+        return None
+    return hours if hours > 0 else None
+
+
+def start_verify_sweep() -> threading.Thread | None:
+    """Start the periodic verification sweep if BACKUP_VERIFY_INTERVAL_HOURS is set."""
+    interval = get_verify_interval(load_env())
+    if interval is None:
+        return None
+
+    def sweep() -> None:
+        while True:
+            time.sleep(interval * 3600)
+            submit_job("verify_sweep", "Verify all backups", verify_all_backups, conflict_key=VERIFY_CONFLICT_KEY)
+
+    thread = threading.Thread(target=sweep, name="backup-verify-sweep", daemon=True)
+    thread.start()
+    logger.info(f"Backups will be verified every {interval:g} hours")
+    return thread
@@ -1,8 +1,13 @@
+import logging
+import shutil
 import subprocess
+import threading
+import time
+from typing import Any, Final
 
 import requests
 
-from community_edition.services.env import load_env
+from community_edition.services.env import ENV_FILE, get_config, invalidate_env, load_env
 
 API_URL = "https://license.finmars.com/api/v1/version/get-latest/?channel=stable"
 
@@ -14,31 +19,156 @@ VERSION_MAPPING = {
     "WORKFLOW_PORTAL_IMAGE_VERSION": "workflow-portal",
 }
 
+# The latest versions are cached in memory and served as they are, however old;
+# once older than the check interval they are revalidated in the background
+# with If-None-Match/If-Modified-Since, so the license API is never waited on
+# by a page view and an unchanged list costs a 304.
+DEFAULT_CHECK_INTERVAL_MINUTES: Final[int] = 60
+FETCH_TIMEOUT: Final[float] = 10.0
+RETRY_SECONDS: Final[float] = 60.0
+REFRESH_WAIT: Final[float] = 3.0
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_cache: dict[str, Any] = {
+    "versions": {},
+    "etag": None,
+    "last_modified": None,
+    "fetched_at": None,
+    "attempted_at": None,
+    "error": None,
+    "refresh": None,
+    "max_age": DEFAULT_CHECK_INTERVAL_MINUTES * 60,
+}
+
+
+def get_check_interval(env: dict[str, str]) -> int:
+    """Seconds between checks, from VERSION_CHECK_INTERVAL_MINUTES."""
+    value = (env.get("VERSION_CHECK_INTERVAL_MINUTES") or "").strip()
+    if not value:
+        return DEFAULT_CHECK_INTERVAL_MINUTES * 60
+    if not value.isdigit() or int(value) == 0:
+        raise ValueError(f"VERSION_CHECK_INTERVAL_MINUTES must be a positive whole number, got {value!r}")
+    return int(value) * 60
+
+
+def _parse_versions(data: dict[str, Any]) -> dict[str, str]:
+    """Map app name to latest version"""
+    latest_versions = {}
+    for result in data.get("results", []):
+        app_name = result.get("app")
+        version = result.get("version")
+        if app_name and version:
+            latest_versions[app_name] = version
+    return latest_versions
+
+
+def refresh_latest_versions() -> None:
+    """
+    Fetch the latest versions into the cache, conditionally when it holds a
+    response already. On failure the last known versions are kept.
+    """
+    with _lock:
+        headers = {}
+        if _cache["etag"]:
+            headers["If-None-Match"] = _cache["etag"]
+        if _cache["last_modified"]:
+            headers["If-Modified-Since"] = _cache["last_modified"]
+        _cache["attempted_at"] = time.time()
 
-def get_latest_versions() -> dict[str, str]:
-    """Fetch latest versions from API"""
     try:
-        response = requests.get(API_URL, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-
-        # Create a mapping of app name to latest version
-        latest_versions = {}
-        for result in data.get("results", []):
-            app_name = result.get("app")
-            version = result.get("version")
-            if app_name and version:
-                latest_versions[app_name] = version
-
-        return latest_versions
+        response = requests.get(API_URL, headers=headers, timeout=FETCH_TIMEOUT)
+        if response.status_code != 304:
+            response.raise_for_status()
+            versions = _parse_versions(response.json())
     except Exception as e:
-        print(f"Error fetching latest versions: {e}")
-        return {}
+        logger.warning(f"Error fetching latest versions: {e}")
+        with _lock:
+            _cache["error"] = str(e)
+        return
+
+    with _lock:
+        if response.status_code != 304:
+            _cache.update(
+                versions=versions,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
+        _cache.update(fetched_at=time.time(), error=None)
+
+
+def _refresh() -> None:
+    try:
+        refresh_latest_versions()
+    finally:
+        with _lock:
+            _cache["refresh"] = None
+
+
+def refresh_in_background() -> threading.Thread:
+    """Start a refresh unless one is running; returns the running refresh."""
+    with _lock:
+        if _cache["refresh"] is None:
+            _cache["refresh"] = threading.Thread(target=_refresh, name="version-refresh", daemon=True)
+            _cache["refresh"].start()
+        return _cache["refresh"]
+
+
+def _is_due(now: float) -> bool:
+    """Whether the cache is stale, waiting RETRY_SECONDS after a failed attempt. Call with _lock held."""
+    if _cache["fetched_at"] is not None and now - _cache["fetched_at"] < _cache["max_age"]:
+        return False
+    return _cache["error"] is None or now - _cache["attempted_at"] >= RETRY_SECONDS
+
+
+def get_latest_versions() -> dict[str, str]:
+    """Latest versions as last fetched (empty until the first fetch); a stale cache is refreshed in the background."""
+    with _lock:
+        versions = dict(_cache["versions"])
+        due = _is_due(time.time())
+    if due:
+        refresh_in_background()
+    return versions
+
+
+def get_latest_versions_status() -> dict[str, Any]:
+    """When the latest versions were fetched, their age in seconds, and the last error."""
+    with _lock:
+        fetched_at = _cache["fetched_at"]
+        age = None if fetched_at is None else max(int(time.time() - fetched_at), 0)
+        return {
+            "fetched_at": fetched_at,
+            "age": age,
+            "stale": age is None or age >= _cache["max_age"],
+            "refreshing": _cache["refresh"] is not None,
+            "error": _cache["error"],
+        }
+
+
+def _refresh_periodically() -> None:
+    while True:
+        thread = refresh_in_background()
+        thread.join()
+        time.sleep(_cache["max_age"])
+
+
+def start_version_refresh() -> threading.Thread:
+    """Fetch the latest versions now and again every VERSION_CHECK_INTERVAL_MINUTES."""
+    try:
+        interval = get_check_interval(load_env())
+    except ValueError as e:
+        logger.warning(f"Using the default version check interval: {e}")
+        interval = DEFAULT_CHECK_INTERVAL_MINUTES * 60
+    _cache["max_age"] = interval
+    thread = threading.Thread(target=_refresh_periodically, name="version-check", daemon=True)
+    thread.start()
+    return thread
 
 
 def get_current_versions() -> dict[str, dict[str, str]]:
     """Get current versions from .env file"""
-    env = load_env()
+    env = get_config()
     current_versions = {}
 
     for env_var, app_name in VERSION_MAPPING.items():
@@ -55,3 +185,10 @@ def set_versions_in_env() -> None:
     result = subprocess.run(["make", "update-versions"], check=False, capture_output=True, text=True)
     if result.returncode != 0:
         raise RuntimeError(f"Failed to update versions: {result.stderr}")
+    invalidate_env()
+
+
+def restore_env_backup() -> None:
+    """Put back the .env that `make update-versions` saved as .env.bak."""
+    shutil.copyfile(f"{ENV_FILE}.bak", ENV_FILE)
+    invalidate_env()
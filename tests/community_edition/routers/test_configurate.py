@@ -1,7 +1,17 @@
+import gzip
 import io
 import types
 
+import pytest
+
 from community_edition.routers import configurate as cfg
+from community_edition.services import backup, catalog, jobs, retention
+
+
+def finished_job(resp):
+    """Wait for the background job started by a request and return its final snapshot."""
+    assert resp.status_code == 202
+    return jobs.wait_for_job(resp.get_json()["job_id"], timeout=5)
 
 
 class TestRoot:
@@ -39,7 +49,20 @@ class TestRoot:
         resp = client.get("/")
 
         assert resp.status_code == 200
-        assert b"logs" in resp.data
+        assert b"/setup/events" in resp.data
+        assert b"Request Certificates" in resp.data
+
+    def test_setup_events_are_public_only_while_setup_runs(self, app, client, monkeypatch):
+        monkeypatch.setattr(cfg, "follow_setup", lambda after: iter([{"type": "state", "state": {}, "seq": 3}]))
+        monkeypatch.setattr("community_edition.app.is_setup_active", lambda: True)
+
+        resp = client.get("/setup/events")
+
+        assert resp.status_code == 200
+        assert resp.data == b'id: 3\ndata: {"type": "state", "state": {}, "seq": 3}\n\n'
+
+        monkeypatch.setattr("community_edition.app.is_setup_active", lambda: False)
+        assert client.get("/setup/events").status_code == 302
 
 
 class TestVersions:
@@ -70,38 +93,89 @@ class TestVersions:
 
 class TestBackup:
     def test_backup_get_lists_backups(self, app, auth_client, monkeypatch):
+        requested = {}
+
+        def fake_list_backups(**kwargs):
+            requested.update(kwargs)
+            return {
+                "backups": [
+                    {
+                        "timestamp": "20250101000000",
+                        "created": "2025-01-01 00:00:00",
+                        "size": 123,
+                    }
+                ],
+                "total": 1,
+                "page": 1,
+                "pages": 1,
+                "per_page": 20,
+                "sort": "created",
+                "order": "desc",
+            }
+
+        monkeypatch.setattr(cfg, "list_backups", fake_list_backups)
         monkeypatch.setattr(
             cfg,
-            "get_backup_list",
-            lambda: [
-                {
-                    "timestamp": "20250101000000",
-                    "created": "2025-01-01 00:00:00",
-                    "size": 123,
-                }
-            ],
+            "preview_retention",
+            lambda: {
+                "enabled": True,
+                "policy": {key: None for key in retention.RETENTION_SETTINGS} | {"keep_daily": 7},
+                "delete": [{"timestamp": "20250101000000", "reason": "not retained by the keep rules"}],
+            },
         )
 
-        resp = auth_client.get("/backup")
+        resp = auth_client.get("/backup?page=2&sort=size&order=asc")
 
         assert resp.status_code == 200
         assert b"20250101000000" in resp.data
+        assert requested == {"page": 2, "per_page": 20, "sort": "size", "order": "asc"}
+        assert b"to be pruned" in resp.data
+
+    def test_backup_retention_preview_and_apply(self, app, auth_client, monkeypatch):
+        monkeypatch.setattr(cfg, "preview_retention", lambda: {"enabled": True, "delete": []})
+        monkeypatch.setattr(cfg, "apply_retention", lambda: ["20250101000000"])
+
+        assert auth_client.get("/backup/retention").get_json()["enabled"] is True
+        job = finished_job(auth_client.post("/backup/retention"))
+
+        assert job["status"] == "succeeded"
+        assert job["message"] == "Pruned 1 backup(s): 20250101000000"
+
+    def test_backup_catalog_returns_json_page(self, app, auth_client, monkeypatch):
+        monkeypatch.setattr(cfg, "list_backups", lambda **kwargs: {"backups": [], "total": 0, **kwargs})
+
+        resp = auth_client.get("/backup/catalog?per_page=5")
+
+        assert resp.status_code == 200
+        assert resp.get_json()["success"] is True
+        assert resp.get_json()["per_page"] == 5
+
+    def test_backup_catalog_rejects_unknown_sort_key(self, app, auth_client, monkeypatch, tmp_path):
+        monkeypatch.setattr(catalog, "BACKUP_DIR", str(tmp_path / "dumps"))
+
+        resp = auth_client.get("/backup/catalog?sort=name")
+
+        assert resp.status_code == 400
 
     def test_backup_post_creates_backup_success(app, auth_client, monkeypatch):
         called = {}
 
-        def fake_create():
+        def fake_create(protect=()):
             called["ok"] = True
 
         monkeypatch.setattr(cfg, "create_backup", fake_create)
 
         resp = auth_client.post("/backup")
 
-        assert resp.status_code == 200
         assert resp.get_json()["success"] is True
+        job = finished_job(resp)
+        assert job["status"] == "succeeded"
+        assert job["message"] == "Backup created successfully"
         assert called.get("ok") is True
 
-    def test_backup_post_restore_from_uploaded_file_success(self, app, auth_client, monkeypatch, tmp_path):
+    def test_backup_post_restore_from_uploaded_file_success(
+        self, app, auth_client, monkeypatch, upload_path, backup_archive_bytes
+    ):
         called = {"down": False, "up": False, "created": False, "restored": False}
 
         def fake_down():
@@ -110,34 +184,41 @@ class TestBackup:
         def fake_up():
             called["up"] = True
 
-        def fake_create():
+        def fake_create(protect=()):
             called["created"] = True
 
         def fake_restore_uploaded():
             called["restored"] = True
 
-        # Use a temporary project directory so /tmp path is safe in tests
-        monkeypatch.setattr(cfg, "PROJECT_DIR", str(tmp_path))
         monkeypatch.setattr(cfg, "down_containers", fake_down)
         monkeypatch.setattr(cfg, "up_containers", fake_up)
         monkeypatch.setattr(cfg, "create_backup", fake_create)
         monkeypatch.setattr(cfg, "restore_backup_from_uploaded_file", fake_restore_uploaded)
 
         data = {
-            "backup_file": (io.BytesIO(b"dummy-backup-data"), "backup.zip"),
+            "backup_file": (io.BytesIO(backup_archive_bytes), "backup.zip"),
         }
 
         resp = auth_client.post("/backup", data=data, content_type="multipart/form-data")
 
-        assert resp.status_code == 200
-        body = resp.get_json()
-        assert body["success"] is True
+        assert resp.get_json()["success"] is True
+        job = finished_job(resp)
+        assert job["status"] == "succeeded"
+        assert [s["name"] for s in job["steps"]] == [
+            "Preflight checks",
+            "Stopping containers",
+            "Creating safety backup",
+            "Restoring backup",
+            "Starting containers",
+        ]
         assert called["down"] is True
         assert called["up"] is True
         assert called["created"] is True
         assert called["restored"] is True
 
-    def test_backup_post_restore_from_uploaded_file_failure(self, app, auth_client, monkeypatch, tmp_path):
+    def test_backup_post_restore_from_uploaded_file_failure(
+        self, app, auth_client, monkeypatch, upload_path, backup_archive_bytes
+    ):
         called = {"down": False, "up": False, "created": False, "restored": False}
 
         def fake_down():
@@ -146,34 +227,89 @@ class TestBackup:
         def fake_up():
             called["up"] = True
 
-        def fake_create():
+        def fake_create(protect=()):
             called["created"] = True
 
         def fake_restore_uploaded():
             called["restored"] = True
             raise RuntimeError("restore failed")
 
-        monkeypatch.setattr(cfg, "PROJECT_DIR", str(tmp_path))
         monkeypatch.setattr(cfg, "down_containers", fake_down)
         monkeypatch.setattr(cfg, "up_containers", fake_up)
         monkeypatch.setattr(cfg, "create_backup", fake_create)
         monkeypatch.setattr(cfg, "restore_backup_from_uploaded_file", fake_restore_uploaded)
 
         data = {
-            "backup_file": (io.BytesIO(b"dummy-backup-data"), "backup.zip"),
+            "backup_file": (io.BytesIO(backup_archive_bytes), "backup.zip"),
         }
 
         resp = auth_client.post("/backup", data=data, content_type="multipart/form-data")
 
-        assert resp.status_code == 500
-        body = resp.get_json()
-        assert body["success"] is False
-        assert "restore failed" in body["message"]
+        job = finished_job(resp)
+        assert job["status"] == "failed"
+        assert "restore failed" in job["message"]
+        assert job["steps"][-2] == {**job["steps"][-2], "name": "Restoring backup", "status": "failed"}
+        assert job["steps"][-1]["name"] == "Restarting containers"
         assert called["down"] is True
         assert called["up"] is True
         assert called["created"] is True
         assert called["restored"] is True
 
+    def test_backup_post_rejects_invalid_archive_before_stopping_containers(
+        self, app, auth_client, monkeypatch, upload_path
+    ):
+        called = {"down": False}
+
+        def fake_down():
+            called["down"] = True
+
+        monkeypatch.setattr(cfg, "down_containers", fake_down)
+
+        data = {
+            "backup_file": (io.BytesIO(b"dummy-backup-data"), "backup.zip"),
+        }
+
+        resp = auth_client.post("/backup", data=data, content_type="multipart/form-data")
+
+        assert resp.status_code == 400
+        assert "not a valid zip archive" in resp.get_json()["message"]
+        assert called["down"] is False
+        assert not upload_path.exists()
+
+    def test_backup_post_restores_completed_chunked_upload(
+        self, app, auth_client, monkeypatch, upload_path, backup_archive_bytes
+    ):
+        called = {"restored": False}
+
+        def fake_restore_uploaded():
+            called["restored"] = True
+
+        monkeypatch.setattr(cfg, "down_containers", lambda: None)
+        monkeypatch.setattr(cfg, "up_containers", lambda: None)
+        monkeypatch.setattr(cfg, "create_backup", lambda protect=(): None)
+        monkeypatch.setattr(cfg, "restore_backup_from_uploaded_file", fake_restore_uploaded)
+
+        total = len(backup_archive_bytes)
+        resp = auth_client.put(
+            "/backup/upload",
+            data=backup_archive_bytes,
+            headers={"Content-Range": f"bytes 0-{total - 1}/{total}"},
+            content_type="application/octet-stream",
+        )
+        assert resp.status_code == 200
+        assert resp.get_json()["complete"] is True
+
+        resp = auth_client.post("/backup", json={"uploaded": True})
+
+        assert finished_job(resp)["status"] == "succeeded"
+        assert called["restored"] is True
+
+    def test_backup_post_uploaded_without_completed_upload_is_rejected(self, app, auth_client, upload_path):
+        resp = auth_client.post("/backup", json={"uploaded": True})
+
+        assert resp.status_code == 400
+        assert resp.get_json()["success"] is False
+
     def test_backup_delete_requires_timestamp(app, auth_client, monkeypatch):
         resp = auth_client.delete("/backup", json={})
 
@@ -196,24 +332,308 @@ class TestBackup:
         assert called.get("ts") == "20250101000000"
 
 
+class TestDownloadBackup:
+    def test_streams_chunked_backup_as_zip(self, app, auth_client, monkeypatch, tmp_path):
+        backup_dir = tmp_path / "dumps" / "20250101000000"
+        backup_dir.mkdir(parents=True)
+        (backup_dir / "chunks.json").write_text("{}")
+        monkeypatch.setattr(backup, "BACKUP_DIR", str(tmp_path / "dumps"))
+        monkeypatch.setattr(cfg, "stream_backup_zip", lambda path: iter([b"PK", b"rest"]))
+
+        resp = auth_client.get("/backup/20250101000000/download")
+
+        assert resp.status_code == 200
+        assert resp.mimetype == "application/zip"
+        assert resp.get_data() == b"PKrest"
+
+    def test_missing_backup_is_404(self, app, auth_client, monkeypatch, tmp_path):
+        monkeypatch.setattr(backup, "BACKUP_DIR", str(tmp_path / "dumps"))
+
+        assert auth_client.get("/backup/20250101000000/download").status_code == 404
+
+
+class TestVerifyBackup:
+    def test_runs_verification_as_a_job(self, app, auth_client, monkeypatch):
+        entry = {"sha256": "abc", "verification": None}
+        monkeypatch.setattr(cfg, "get_backup_entry", lambda ts: entry)
+        monkeypatch.setattr(cfg, "verify_backup", lambda ts: {"ok": False, "members": [], "errors": ["corrupt"]})
+
+        job = finished_job(auth_client.post("/backup/20250101000000/verify"))
+
+        assert job["status"] == "failed"
+        assert "corrupt" in job["message"]
+        resp = auth_client.get("/backup/20250101000000/verify")
+        assert resp.get_json() == {"success": True, "sha256": "abc", "verification": None}
+
+    def test_unknown_backup_is_404(self, app, auth_client, monkeypatch):
+        monkeypatch.setattr(cfg, "get_backup_entry", lambda ts: None)
+
+        assert auth_client.post("/backup/20250101000000/verify").status_code == 404
+
+
+class TestRestoreBackup:
+    def test_safety_backup_protects_the_backup_being_restored(self, app, auth_client, monkeypatch):
+        called = {}
+        monkeypatch.setattr(cfg, "preflight_backup", lambda timestamp: None)
+        monkeypatch.setattr(cfg, "down_containers", lambda: None)
+        monkeypatch.setattr(cfg, "up_containers", lambda: None)
+        monkeypatch.setattr(cfg, "create_backup", lambda protect=(): called.update(protect=protect))
+        monkeypatch.setattr(cfg, "restore_backup", lambda timestamp: called.update(restored=timestamp))
+
+        job = finished_job(auth_client.post("/backup/20240101000000/restore"))
+
+        assert job["status"] == "succeeded"
+        assert called == {"protect": ("20240101000000",), "restored": "20240101000000"}
+
+    def test_failed_preflight_rejects_restore_before_stopping_containers(self, app, auth_client, monkeypatch):
+        called = {"down": False}
+        monkeypatch.setattr(cfg, "down_containers", lambda: called.update(down=True))
+
+        def fake_preflight(timestamp):
+            raise ValueError("Restore preflight failed: Version incompatible for backend")
+
+        monkeypatch.setattr(cfg, "preflight_backup", fake_preflight)
+
+        resp = auth_client.post("/backup/20250101000000/restore")
+
+        assert resp.status_code == 400
+        assert "Version incompatible" in resp.get_json()["message"]
+        assert called["down"] is False
+
+    def test_preflight_endpoint_reports_the_checks(self, app, auth_client, monkeypatch):
+        monkeypatch.setattr(cfg, "preflight_backup", lambda timestamp: {"format": "plain", "disks": []})
+
+        resp = auth_client.get("/backup/20250101000000/preflight")
+
+        assert resp.get_json() == {"success": True, "format": "plain", "disks": []}
+
+
+class TestJobs:
+    def test_job_status_and_events(self, app, auth_client, monkeypatch):
+        monkeypatch.setattr(cfg, "create_backup", lambda protect=(): None)
+        job = finished_job(auth_client.post("/backup"))
+
+        resp = auth_client.get(f"/jobs/{job['id']}")
+        assert resp.status_code == 200
+        assert resp.get_json()["job"]["status"] == "succeeded"
+
+        resp = auth_client.get(f"/jobs/{job['id']}/events")
+        assert resp.mimetype == "text/event-stream"
+        assert b'"status": "succeeded"' in resp.get_data()
+
+        assert job["id"] in [j["id"] for j in auth_client.get("/jobs").get_json()["jobs"]]
+
+    def test_unknown_job_is_404(self, app, auth_client):
+        assert auth_client.get("/jobs/missing").status_code == 404
+        assert auth_client.get("/jobs/missing/events").status_code == 404
+
+    def test_version_update_runs_as_job(self, app, auth_client, monkeypatch):
+        called = []
+        stages = [{"action": "recreate", "services": ["vue-portal"]}, {"action": "restart", "services": ["nginx"]}]
+
+        def fake_plan(old_env, new_env):
+            called.append("plan")
+            return stages
+
+        monkeypatch.setattr(cfg, "set_versions_in_env", lambda: called.append("set"))
+        monkeypatch.setattr(cfg, "plan_upgrade", fake_plan)
+        monkeypatch.setattr(cfg, "get_upgrade_images", lambda planned: ["finmars/finmars-vue-portal:1.25.0"])
+        monkeypatch.setattr(cfg, "pull_images", lambda images: called.append(images))
+        monkeypatch.setattr(cfg, "run_upgrade", lambda planned: called.append(planned))
+        monkeypatch.setattr(cfg, "down_containers", lambda: called.append("down"))
+
+        job = finished_job(auth_client.put("/versions"))
+
+        assert job["status"] == "succeeded"
+        assert called == ["set", "plan", ["finmars/finmars-vue-portal:1.25.0"], stages]
+        assert "nginx, vue-portal" in job["message"]
+
+    def test_failed_pull_restores_env_before_anything_is_restarted(self, app, auth_client, monkeypatch, tmp_path):
+        called = []
+
+        def fake_set_versions():
+            (tmp_path / ".env.bak").write_text((tmp_path / ".env").read_text())
+            (tmp_path / ".env").write_text("VUE_PORTAL_IMAGE_VERSION=1.25.0\n")
+
+        def fake_pull(images):
+            raise RuntimeError("Failed to pull images: manifest unknown")
+
+        monkeypatch.setattr(cfg, "set_versions_in_env", fake_set_versions)
+        monkeypatch.setattr(cfg, "plan_upgrade", lambda old_env, new_env: [{"action": "recreate", "services": ["x"]}])
+        monkeypatch.setattr(cfg, "get_upgrade_images", lambda planned: ["x:1"])
+        monkeypatch.setattr(cfg, "pull_images", fake_pull)
+        monkeypatch.setattr(cfg, "run_upgrade", lambda planned: called.append("run"))
+
+        job = finished_job(auth_client.put("/versions"))
+
+        assert job["status"] == "failed"
+        assert "manifest unknown" in job["message"]
+        assert called == []
+        assert "ADMIN_USERNAME=admin" in (tmp_path / ".env").read_text()
+
+
+class TestBackupUpload:
+    def test_upload_refused_while_restore_from_upload_is_pending(self, app, auth_client, upload_path, monkeypatch):
+        monkeypatch.setattr(cfg, "is_job_active", lambda kind: kind == "restore_upload")
+
+        resp = auth_client.put(
+            "/backup/upload", data=b"abc", headers={"Content-Range": "bytes 0-2/3"}, content_type="text/plain"
+        )
+
+        assert resp.status_code == 409
+
+    def test_upload_requires_content_range(self, app, auth_client, upload_path):
+        resp = auth_client.put("/backup/upload", data=b"abc", content_type="application/octet-stream")
+
+        assert resp.status_code == 400
+
+    def test_upload_in_chunks_and_resume(self, app, auth_client, upload_path, backup_archive_bytes):
+        total = len(backup_archive_bytes)
+        half = total // 2
+
+        resp = auth_client.put(
+            "/backup/upload",
+            data=backup_archive_bytes[:half],
+            headers={"Content-Range": f"bytes 0-{half - 1}/{total}", "X-Upload-Name": "dump.zip"},
+            content_type="application/octet-stream",
+        )
+        assert resp.status_code == 200
+        assert resp.get_json()["offset"] == half
+        assert resp.get_json()["complete"] is False
+
+        status = auth_client.get("/backup/upload").get_json()
+        assert status["offset"] == half
+        assert status["name"] == "dump.zip"
+
+        resp = auth_client.put(
+            "/backup/upload",
+            data=backup_archive_bytes[half:],
+            headers={"Content-Range": f"bytes {half}-{total - 1}/{total}"},
+            content_type="application/octet-stream",
+        )
+        body = resp.get_json()
+        assert resp.status_code == 200
+        assert body["complete"] is True
+        assert body["manifest"]["realm_code"] == "realm00000"
+        assert upload_path.read_bytes() == backup_archive_bytes
+
+    def test_upload_rejects_chunk_that_skips_ahead(self, app, auth_client, upload_path, backup_archive_bytes):
+        total = len(backup_archive_bytes)
+
+        resp = auth_client.put(
+            "/backup/upload",
+            data=backup_archive_bytes[10:20],
+            headers={"Content-Range": f"bytes 10-19/{total}"},
+            content_type="application/octet-stream",
+        )
+
+        assert resp.status_code == 409
+        assert resp.get_json()["offset"] == 0
+
+    def test_upload_delete_discards_partial_upload(self, app, auth_client, upload_path, backup_archive_bytes):
+        total = len(backup_archive_bytes)
+        auth_client.put(
+            "/backup/upload",
+            data=backup_archive_bytes[:10],
+            headers={"Content-Range": f"bytes 0-9/{total}"},
+            content_type="application/octet-stream",
+        )
+
+        resp = auth_client.delete("/backup/upload")
+
+        assert resp.status_code == 200
+        assert not upload_path.exists()
+
+
 class TestLogs:
-    def test_logs_page_renders_with_logs_text(self, app, auth_client, fake_get_logs):
-        resp = auth_client.get("/logs")
+    def test_logs_page_streams_instead_of_loading_history(self, app, auth_client, fake_get_logs):
+        resp = auth_client.get("/logs?service=core,workflow&since=1h")
 
         assert resp.status_code == 200
-        assert b"fake-logs-output" in resp.data
-        assert fake_get_logs.get("called") is True
+        assert b"/logs/stream" in resp.data
+        assert b'"service": ["core", "workflow"]' in resp.data
+        assert fake_get_logs.get("called") is False
+
+    def test_logs_stream_sends_each_line_as_an_event(self, app, auth_client, monkeypatch):
+        commands = []
+
+        def fake_stream(command):
+            commands.append(command)
+            yield {"service": "core", "time": None, "message": "started", "line": "core-1  | started"}
+            yield None
+
+        monkeypatch.setattr(cfg, "stream_logs", fake_stream)
+
+        resp = auth_client.get("/logs/stream?service=core&tail=50&follow=1")
+
+        assert resp.mimetype == "text/event-stream"
+        body = resp.get_data(as_text=True)
+        assert 'data: {"service": "core"' in body
+        assert ": keepalive" in body
+        assert body.endswith("event: end\ndata: {}\n\n")
+        assert commands[0][-4:] == ["--tail", "50", "--follow", "core"]
+
+    def test_logs_stream_is_served_from_the_collector_when_it_runs(self, app, auth_client, monkeypatch):
+        monkeypatch.setattr(cfg, "is_collector_running", lambda: True)
+        monkeypatch.setattr(cfg, "stream_logs", lambda command: pytest.fail("docker compose logs was run"))
+        calls = []
+
+        def fake_follow(services, tail, after, follow):
+            calls.append((services, tail, after, follow))
+            yield {"service": "core", "time": None, "message": "buffered", "line": "core-1  | buffered", "seq": 7}
+
+        monkeypatch.setattr(cfg, "follow_lines", fake_follow)
+
+        resp = auth_client.get("/logs/stream?service=core&tail=all&after=3")
+
+        assert '"seq": 7' in resp.get_data(as_text=True)
+        assert calls == [(["core"], None, 3, False)]
+
+    def test_logs_search_pages_through_the_store(self, app, auth_client, monkeypatch):
+        monkeypatch.setattr(cfg, "is_store_running", lambda: True)
+        searches = []
+
+        def fake_search(services, levels, since, until, text, before, limit):
+            searches.append((services, levels, since, text, before))
+            return {"lines": [{"id": 9, "line": "core-worker-1  | ERROR boom"}], "next_before": 9, "limit": limit}
+
+        monkeypatch.setattr(cfg, "search_logs", fake_search)
+
+        resp = auth_client.get("/logs/search?service=core-worker&level=error&since=1h&q=boom&before=20")
+        page = auth_client.get("/logs?q=boom&level=")
+
+        assert resp.get_json()["next_before"] == 9
+        assert searches[0] == (["core-worker"], ["ERROR"], "1h", "boom", 20)
+        assert b"ERROR boom" in page.data
+        assert b"before=9" in page.data
+
+    def test_logs_search_needs_the_store(self, app, auth_client):
+        assert auth_client.get("/logs/search?q=boom").status_code == 409
 
-    def test_logs_download_returns_text_file_with_logs(self, app, auth_client, fake_get_logs):
-        fake_get_logs["text"] = "downloadable-logs"
-        resp = auth_client.get("/logs/download")
+    def test_logs_stream_rejects_invalid_filters(self, app, auth_client):
+        resp = auth_client.get("/logs/stream?since=--rm")
+
+        assert resp.status_code == 400
+
+    def test_logs_download_streams_gzip_with_filters(self, app, auth_client, fake_get_logs):
+        fake_get_logs["text"] = "downloadable-logs\nsecond line"
+        resp = auth_client.get("/logs/download?service=core&since=2h")
 
         assert resp.status_code == 200
-        assert resp.mimetype == "text/plain"
-        assert b"downloadable-logs" in resp.data
+        assert resp.mimetype == "application/gzip"
+        assert resp.is_streamed
+        assert gzip.decompress(resp.get_data()) == b"downloadable-logs\nsecond line\n"
         content_disposition = resp.headers.get("Content-Disposition", "")
         assert "attachment" in content_disposition
-        assert "finmars-logs.txt" in content_disposition
+        assert ".txt.gz" in content_disposition
+        command = fake_get_logs["command"]
+        assert command[command.index("--tail") + 1] == "all"
+        assert command[command.index("--since") + 1] == "2h"
+        assert command[-1] == "core"
+
+    def test_logs_download_rejects_invalid_filters(self, app, auth_client, fake_get_logs):
+        assert auth_client.get("/logs/download?until=tomorrow").status_code == 400
+        assert fake_get_logs["called"] is False
 
 
 class TestKeycloakUsers:
@@ -271,3 +691,53 @@ class TestKeycloakUsers:
 
         assert resp.status_code == 200
         assert b"Username and password are required" in resp.data
+
+
+class TestServices:
+    def test_status_endpoint_serves_the_snapshot(self, app, auth_client, monkeypatch):
+        snapshot = {"updated_at": "2025-01-01T00:00:00+00:00", "services": {"db": {"state": "healthy"}}}
+        monkeypatch.setattr(cfg, "get_status_snapshot", lambda: snapshot)
+
+        assert auth_client.get("/services/status").get_json() == {"success": True, **snapshot}
+        assert auth_client.get("/services").status_code == 200
+
+
+class TestLogFiles:
+    def test_window_of_a_log_file(self, app, auth_client, tmp_path):
+        (tmp_path / "app.log").write_text("one\ntwo\nthree\n")
+
+        resp = auth_client.get("/logfiles/app?lines=2")
+
+        assert resp.get_json() == {
+            "success": True,
+            "name": "app",
+            "start": 4,
+            "end": 14,
+            "size": 14,
+            "reset": False,
+            "lines": ["two", "three"],
+        }
+        assert auth_client.get("/logfiles/app?since=8").get_json()["lines"] == ["three"]
+
+    def test_unknown_file_and_bad_offsets_are_rejected(self, app, auth_client, tmp_path):
+        (tmp_path / "app.log").write_text("one\n")
+
+        assert auth_client.get("/logfiles/secrets").status_code == 404
+        assert auth_client.get("/logfiles/app?before=100").status_code == 400
+
+
+class TestSetupState:
+    def test_long_poll_returns_the_changed_state(self, app, auth_client, monkeypatch):
+        calls = []
+
+        def wait_for_state_change(version, timeout):
+            calls.append((version, timeout))
+            return 4, {"generate_env": "done"}
+
+        monkeypatch.setattr(cfg, "wait_for_state_change", wait_for_state_change)
+
+        resp = auth_client.get("/setup/state?version=3")
+
+        assert resp.get_json() == {"success": True, "version": 4, "state": {"generate_env": "done"}}
+        assert auth_client.get("/setup/state").status_code == 200
+        assert calls == [(3, cfg.STATE_WAIT_TIMEOUT), (None, 0)]
@@ -0,0 +1,111 @@
+import json
+import os
+import zipfile
+
+import pytest
+
+from community_edition.services import catalog
+
+
+@pytest.fixture
+def backup_dir(tmp_path, monkeypatch):
+    path = tmp_path / "dumps"
+    path.mkdir()
+    monkeypatch.setattr(catalog, "BACKUP_DIR", str(path))
+    monkeypatch.setattr(catalog, "_catalog", {"path": None, "entries": {}})
+    return path
+
+
+def write_backup(backup_dir, folder, size=0, realm_code="realm00000"):
+    (backup_dir / folder).mkdir()
+    with zipfile.ZipFile(backup_dir / folder / "dump.zip", "w") as zf:
+        manifest = {"realm_code": realm_code, "space_code": "space00000", "versions": [{"app": "backend"}]}
+        zf.writestr("manifest.json", json.dumps(manifest))
+        zf.writestr("backend.sql", "x" * size)
+        zf.writestr("workflow.sql", "")
+
+
+class TestRefreshCatalog:
+    def test_indexes_manifest_metadata(self, backup_dir):
+        write_backup(backup_dir, "20250101000000")
+
+        entry = catalog.refresh_catalog()["20250101000000"]
+
+        assert entry["created"] == "2025-01-01 00:00:00"
+        assert entry["realm_code"] == "realm00000"
+        assert entry["versions"] == [{"app": "backend"}]
+        assert entry["format"] == "plain"
+        assert entry["error"] is None
+
+    def test_tolerates_non_timestamp_folders_and_broken_archives(self, backup_dir):
+        write_backup(backup_dir, "before-upgrade")
+        (backup_dir / "broken").mkdir()
+        (backup_dir / "broken" / "dump.zip").write_bytes(b"not a zip")
+        (backup_dir / "empty").mkdir()
+
+        entries = catalog.refresh_catalog()
+
+        assert entries["before-upgrade"]["error"] is None
+        assert "not a valid zip" in entries["broken"]["error"]
+        assert "empty" not in entries
+
+    def test_only_rereads_changed_folders(self, backup_dir, monkeypatch):
+        write_backup(backup_dir, "20250101000000")
+        catalog.refresh_catalog()
+        read = []
+        original = catalog._read_entry
+        monkeypatch.setattr(catalog, "_read_entry", lambda *args: read.append(args[0]) or original(*args))
+
+        write_backup(backup_dir, "20250102000000")
+        entries = catalog.refresh_catalog()
+
+        assert read == ["20250102000000"]
+        assert set(entries) == {"20250101000000", "20250102000000"}
+
+    def test_persists_between_processes_and_drops_deleted_backups(self, backup_dir, monkeypatch):
+        write_backup(backup_dir, "20250101000000")
+        write_backup(backup_dir, "20250102000000")
+        catalog.refresh_catalog()
+        monkeypatch.setattr(catalog, "_catalog", {"path": None, "entries": {}})
+        monkeypatch.setattr(catalog, "_read_entry", lambda *args: pytest.fail("catalog was not reused"))
+
+        (backup_dir / "20250101000000" / "dump.zip").unlink()
+        os.rmdir(backup_dir / "20250101000000")
+
+        assert set(catalog.refresh_catalog()) == {"20250102000000"}
+        saved = json.loads((backup_dir / catalog.CATALOG_NAME).read_text())
+        assert set(saved["entries"]) == {"20250102000000"}
+
+
+class TestRecordBackup:
+    def test_stores_checksum(self, backup_dir):
+        write_backup(backup_dir, "20250101000000")
+
+        entry = catalog.record_backup("20250101000000")
+
+        assert entry["sha256"] == catalog.file_sha256(str(backup_dir / "20250101000000" / "dump.zip"))
+        assert catalog.get_backup_entry("20250101000000")["sha256"] == entry["sha256"]
+
+
+class TestListBackups:
+    def test_paginates_newest_first(self, backup_dir):
+        for day in range(1, 6):
+            write_backup(backup_dir, f"202501{day:02d}000000")
+
+        page = catalog.list_backups(page=2, per_page=2)
+
+        assert [b["timestamp"] for b in page["backups"]] == ["20250103000000", "20250102000000"]
+        assert page["total"] == 5
+        assert page["pages"] == 3
+
+    def test_sorts_by_size(self, backup_dir):
+        write_backup(backup_dir, "20250101000000", size=5000)
+        write_backup(backup_dir, "20250102000000", size=10)
+
+        page = catalog.list_backups(sort="size", order="asc")
+
+        assert [b["timestamp"] for b in page["backups"]] == ["20250102000000", "20250101000000"]
+
+    def test_rejects_unknown_sort_key(self, backup_dir):
+        with pytest.raises(ValueError):
+            catalog.list_backups(sort="name")
@@ -0,0 +1,134 @@
+import os
+import shutil
+import zipfile
+
+import pytest
+
+from community_edition.services import catalog, chunkstore, dump
+
+
+def dump_lines(start, count):
+    return b"".join(b"INSERT INTO t VALUES (%d, 'row %d');\n" % (i, i) for i in range(start, start + count))
+
+
+@pytest.fixture
+def store(fake_popen, tmp_path, monkeypatch):
+    backup_dir = tmp_path / "dumps"
+    backup_dir.mkdir()
+    (tmp_path / ".env").write_text("DB_USER=finmars\nREALM_CODE=realm00000\nBASE_API_URL=space00000\n")
+    monkeypatch.chdir(tmp_path)
+    for module in (chunkstore, dump, catalog):
+        monkeypatch.setattr(module, "BACKUP_DIR", str(backup_dir))
+    monkeypatch.setattr(catalog, "_catalog", {"path": None, "entries": {}})
+    monkeypatch.setattr(chunkstore, "MIN_CHUNK_SIZE", 256)
+    monkeypatch.setattr(chunkstore, "MAX_CHUNK_SIZE", 4096)
+    monkeypatch.setattr(chunkstore, "BOUNDARY_MASK", 0xF)
+    monkeypatch.setattr(chunkstore, "start_database", lambda db_user: "db-container")
+    fake_popen.outputs = {
+        "backend_realm00000": dump_lines(0, 2000),
+        "workflow_realm00000": dump_lines(5000, 500),
+    }
+    return backup_dir
+
+
+def chunk(data):
+    writer = chunkstore.ChunkWriter(compression_level=1)
+    for i in range(0, len(data), 1000):
+        writer.write(data[i : i + 1000])
+    writer.close()
+    return writer
+
+
+class TestChunkWriter:
+    def test_chunks_reassemble_to_the_input(self, store):
+        data = dump_lines(0, 1000)
+
+        writer = chunk(data)
+
+        assert writer.size == len(data)
+        assert len(writer.chunks) > 1
+        assert b"".join(chunkstore.read_chunk(digest) for digest, _, _ in writer.chunks) == data
+
+    def test_boundaries_survive_an_insert(self, store):
+        data = dump_lines(0, 2000)
+
+        before = {c[0] for c in chunk(data).chunks}
+        after = {c[0] for c in chunk(b"-- inserted line\n" + data).chunks}
+
+        assert len(before & after) >= len(before) - 2
+
+    def test_boundaries_do_not_depend_on_write_sizes(self, store):
+        data = dump_lines(0, 1000)
+        writer = chunkstore.ChunkWriter(compression_level=1)
+        writer.write(data)
+        writer.close()
+
+        assert writer.chunks == chunk(data).chunks
+
+
+class TestCreateChunkedBackup:
+    def test_unchanged_data_is_stored_once(self, store, fake_popen):
+        first = chunkstore.create_chunked_backup()
+        chunk_files = sorted(p.name for p in (store / ".chunks").rglob("*") if p.is_file())
+        shutil.move(first, store / "first.json")  # a second backup in the same second
+        second = chunkstore.create_chunked_backup()
+
+        assert sorted(p.name for p in (store / ".chunks").rglob("*") if p.is_file()) == chunk_files
+        index = chunkstore.load_index(second)
+        logical, physical = chunkstore.get_index_sizes(index)
+        assert logical == sum(len(data) for data in fake_popen.outputs.values())
+        assert 0 < physical < logical
+
+    def test_validates_and_reads_back_members(self, store, fake_popen):
+        index_path = chunkstore.create_chunked_backup()
+
+        assert chunkstore.validate_backup(index_path)["realm_code"] == "realm00000"
+        with chunkstore.open_backup(index_path) as backup:
+            assert backup.namelist() == ["backend.sql", "workflow.sql"]
+            with backup.open("workflow.sql") as member:
+                assert member.read() == fake_popen.outputs["workflow_realm00000"]
+
+    def test_missing_chunk_fails_validation(self, store):
+        index_path = chunkstore.create_chunked_backup()
+        next(p for p in (store / ".chunks").rglob("*") if p.is_file()).unlink()
+
+        with pytest.raises(ValueError, match="missing: chunk"):
+            chunkstore.validate_backup(index_path)
+
+
+class TestStreamBackupZip:
+    def test_rebuilds_a_regular_backup_archive(self, store, fake_popen, tmp_path):
+        index_path = chunkstore.create_chunked_backup()
+
+        rebuilt = tmp_path / "rebuilt.zip"
+        rebuilt.write_bytes(b"".join(chunkstore.stream_backup_zip(index_path)))
+
+        manifest = dump.validate_backup_archive(str(rebuilt))
+        assert manifest["format"] == "plain"
+        with zipfile.ZipFile(rebuilt) as zf:
+            assert zf.read("backend.sql") == fake_popen.outputs["backend_realm00000"]
+
+
+class TestCollectGarbage:
+    def test_removes_only_unreferenced_chunks(self, store, fake_popen):
+        kept_dir = store / "kept"
+        shutil.move(os.path.dirname(chunkstore.create_chunked_backup()), kept_dir)
+        fake_popen.outputs = {"backend_realm00000": dump_lines(9000, 2000), "workflow_realm00000": b""}
+        shutil.rmtree(os.path.dirname(chunkstore.create_chunked_backup()))
+
+        assert chunkstore.collect_garbage() > 0
+        assert chunkstore.validate_backup(str(kept_dir / chunkstore.INDEX_NAME))
+        assert chunkstore.collect_garbage() == 0
+
+
+class TestCatalogSizes:
+    def test_reports_logical_and_physical_size(self, store, fake_popen):
+        index_path = chunkstore.create_chunked_backup()
+        timestamp = os.path.basename(os.path.dirname(index_path))
+
+        entry = catalog.refresh_catalog()[timestamp]
+
+        assert entry["store"] == "chunks"
+        assert entry["size"] == sum(len(data) for data in fake_popen.outputs.values())
+        assert 0 < entry["physical_size"] < entry["size"]
+        assert entry["error"] is None
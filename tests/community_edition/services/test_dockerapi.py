@@ -0,0 +1,231 @@
+import json
+import os
+import socketserver
+import struct
+import tempfile
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from community_edition.services import container, dockerapi, logs
+
+CONTAINERS = [
+    {
+        "Id": "core-id",
+        "Names": ["/finmars-core-1"],
+        "State": "running",
+        "Labels": {"com.docker.compose.service": "core", "com.docker.compose.container-number": "1"},
+    },
+    {
+        "Id": "db-id",
+        "Names": ["/finmars-db-1"],
+        "State": "running",
+        "Labels": {"com.docker.compose.service": "db", "com.docker.compose.container-number": "1"},
+    },
+]
+
+
+def frame(stream, data):
+    return struct.pack(">BxxxL", stream, len(data)) + data
+
+
+class FakeDocker(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body=None, close=False):
+        data = b"" if body is None else body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        if close:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        else:
+            self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self):  # noqa: PLR0911
+        url = urllib.parse.urlsplit(self.path)
+        path = url.path.removeprefix(f"/{dockerapi.API_VERSION}")
+        query = dict(urllib.parse.parse_qsl(url.query))
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        self.server.requests.append((self.command, path, query, body))
+
+        if path == "/containers/json":
+            labels = json.loads(query["filters"])["label"]
+            services = [label.split("=", 1)[1] for label in labels if label.startswith("com.docker.compose.service=")]
+            found = [c for c in CONTAINERS if not services or c["Labels"]["com.docker.compose.service"] in services]
+            return self._reply(200, found)
+        if path == "/containers/core-id/json":
+            return self._reply(200, {"Config": {"Tty": False}})
+        if path == "/containers/core-id/logs":
+            return self._reply(
+                200,
+                frame(1, b"2025-01-01T00:00:00.1Z hel")
+                + frame(1, b"lo\n2025-01-01T00:00:01.2Z second\n")
+                + frame(2, b"2025-01-01T00:00:02.3Z oops\n"),
+            )
+        if path == "/containers/db-id/exec":
+            return self._reply(201, {"Id": "exec-id"})
+        if path == "/exec/exec-id/start":
+            return self._reply(200, frame(1, b"accepting connections\n") + frame(2, b"warning\n"), close=True)
+        if path == "/exec/exec-id/json":
+            return self._reply(200, {"ExitCode": 3})
+        if path.split("/")[-1] in ("start", "stop", "restart"):
+            return self._reply(204)
+        if path == "/containers/core-id/stats":
+            return self._reply(200, {"memory_stats": {"usage": 1024}})
+        return self._reply(404, {"message": f"No such container: {path.split('/')[2]}"})
+
+    do_GET = _route
+    do_POST = _route
+
+
+@pytest.fixture
+def docker(monkeypatch):
+    socket_dir = tempfile.mkdtemp()
+    path = os.path.join(socket_dir, "docker.sock")
+    server = socketserver.ThreadingUnixStreamServer(path, FakeDocker)
+    server.daemon_threads = True
+    server.connections = 0
+    server.requests = []
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    monkeypatch.setenv("DOCKER_HOST", f"unix://{path}")
+    monkeypatch.setenv("COMPOSE_PROJECT_NAME", "finmars")
+    yield server
+    server.shutdown()
+    server.server_close()
+    os.unlink(path)
+    os.rmdir(socket_dir)
+
+
+class TestDockerClient:
+    def test_requests_share_one_connection(self, docker):
+        client = dockerapi.get_docker_client()
+
+        assert [c["Id"] for c in client.ps("db")] == ["db-id"]
+        assert len(client.ps()) == 2
+        client.restart("core-id")
+
+        assert docker.connections == 1
+        labels = json.loads(docker.requests[0][2]["filters"])["label"]
+        assert labels == [
+            "com.docker.compose.project=finmars",
+            "com.docker.compose.oneoff=False",
+            "com.docker.compose.service=db",
+        ]
+        assert docker.requests[-1][:3] == ("POST", "/containers/core-id/restart", {"t": "10"})
+
+    def test_error_carries_status_and_message(self, docker):
+        with pytest.raises(dockerapi.DockerAPIError, match="No such container: missing") as error:
+            dockerapi.get_docker_client().inspect("missing")
+
+        assert error.value.status == 404
+
+    def test_exec_returns_exit_code_and_output(self, docker):
+        exit_code, stdout, stderr = dockerapi.get_docker_client().exec("db-id", ["pg_isready"])
+
+        assert (exit_code, stdout, stderr) == (3, b"accepting connections\n", b"warning\n")
+        assert docker.requests[0][3]["Cmd"] == ["pg_isready"]
+
+    def test_stats_is_a_single_sample(self, docker):
+        assert dockerapi.get_docker_client().stats("core-id") == {"memory_stats": {"usage": 1024}}
+        assert docker.requests[-1][2] == {"stream": "0"}
+
+    def test_no_client_without_socket(self, monkeypatch, tmp_path):
+        monkeypatch.setenv("DOCKER_HOST", f"unix://{tmp_path}/missing.sock")
+
+        assert dockerapi.get_docker_client() is None
+
+
+class TestStreamContainerLogs:
+    def test_lines_are_split_and_parsed_like_compose_output(self, docker):
+        lines = list(logs.stream_container_logs(dockerapi.get_docker_client(), ["core"], tail=10, since="1h"))
+
+        assert [(entry["service"], entry["time"], entry["message"]) for entry in lines] == [
+            ("core", "2025-01-01T00:00:00.1Z", "hello"),
+            ("core", "2025-01-01T00:00:01.2Z", "second"),
+            ("core", "2025-01-01T00:00:02.3Z", "oops"),
+        ]
+        query = next(query for method, path, query, body in docker.requests if path.endswith("/logs"))
+        assert query["tail"] == "10"
+        assert query["timestamps"] == "1"
+        assert "since" in query
+
+    def test_follow_picks_up_containers_created_later(self):
+        class FollowedStream:
+            def __init__(self, data):
+                self.data = data
+                self.closed = threading.Event()
+
+            def __iter__(self):
+                yield dockerapi.STREAM_STDOUT, self.data
+                self.closed.wait()
+
+            def close(self):
+                self.closed.set()
+
+        class Client:
+            def __init__(self):
+                self.containers = [CONTAINERS[0]]
+                self.streams = {}
+
+            def ps(self, service=None, all=False):
+                return list(self.containers)
+
+            def logs(self, container, tail, since, until, follow):
+                self.streams[container] = FollowedStream(f"2025-01-01T00:00:00Z {container}\n".encode())
+                return self.streams[container]
+
+        client = Client()
+        lines = logs.stream_container_logs(client, follow=True, keepalive=1, rescan=0.05)
+
+        assert next(lines)["message"] == "core-id"
+        # Recreated by an upgrade: a container the follow didn't see at the start.
+        client.containers.append({**CONTAINERS[0], "Id": "core-id-2"})
+        assert next(entry for entry in lines if entry is not None)["message"] == "core-id-2"
+        lines.close()
+        assert all(stream.closed.is_set() for stream in client.streams.values())
+
+    def test_to_unix_time(self):
+        assert logs.to_unix_time("1h30m", now=10_000) == "4600.000000000"
+        assert logs.to_unix_time("1700000000") == "1700000000"
+        assert logs.to_unix_time("2025-01-01T00:00:00Z") == "1735689600.000000000"
+
+
+class TestContainersThroughAPI:
+    def test_down_then_up_restarts_the_same_containers(self, docker, monkeypatch, tmp_path):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(container, "_make", lambda target: pytest.fail(f"make {target} should not run"))
+
+        container.down_containers()
+        container.up_containers()
+
+        calls = [(method, path) for method, path, query, body in docker.requests if method == "POST"]
+        assert sorted(calls) == [
+            ("POST", "/containers/core-id/start"),
+            ("POST", "/containers/core-id/stop"),
+            ("POST", "/containers/db-id/start"),
+            ("POST", "/containers/db-id/stop"),
+        ]
+
+    def test_up_recreates_with_compose_when_env_changed(self, docker, monkeypatch, tmp_path):
+        monkeypatch.chdir(tmp_path)
+        made = []
+        monkeypatch.setattr(container, "_make", made.append)
+
+        container.down_containers()
+        (tmp_path / ".env").write_text("BACKEND_VERSION=2.0.0\n")
+        container.up_containers()
+
+        assert made == ["up"]
+        assert not [path for method, path, query, body in docker.requests if path.endswith("/start")]
@@ -0,0 +1,154 @@
+import hashlib
+import io
+import json
+import os
+import tarfile
+import threading
+import types
+import zipfile
+
+import pytest
+
+from community_edition.services import dump
+
+
+@pytest.fixture
+def fake_pg_dump(fake_popen, tmp_path, monkeypatch):
+    (tmp_path / ".env").write_text(
+        "DB_USER=finmars_dev\nREALM_CODE=realm00000\nBASE_API_URL=space00000\nCORE_IMAGE_VERSION=1.24.0\n"
+    )
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(dump, "BACKUP_DIR", str(tmp_path / "dumps"))
+    monkeypatch.setattr(dump, "start_database", lambda db_user: "db-container")
+
+    fake_popen.outputs = {
+        "backend_realm00000": b"CREATE TABLE backend();\n" * 1000,
+        "workflow_realm00000": b"CREATE TABLE workflow();\n" * 1000,
+    }
+    return fake_popen
+
+
+class TestCreateDumpArchive:
+    def test_writes_both_dumps_and_manifest_into_archive(self, fake_pg_dump, tmp_path):
+        path = dump.create_dump_archive()
+
+        with zipfile.ZipFile(path) as zf:
+            assert zf.read("backend.sql") == fake_pg_dump.outputs["backend_realm00000"]
+            assert zf.read("workflow.sql") == fake_pg_dump.outputs["workflow_realm00000"]
+            manifest = json.loads(zf.read("manifest.json"))
+
+        assert manifest["realm_code"] == "realm00000"
+        assert manifest["space_code"] == "space00000"
+        assert manifest["versions"] == [{"app": "backend", "version": "1.24.0"}]
+        assert sorted(fake_pg_dump.started) == ["backend_realm00000", "workflow_realm00000"]
+        backend = fake_pg_dump.outputs["backend_realm00000"]
+        assert manifest["members"]["backend.sql"] == {
+            "size": len(backend),
+            "sha256": hashlib.sha256(backend).hexdigest(),
+        }
+        # no spool files or partial archive left behind
+        assert [f.name for f in next((tmp_path / "dumps").iterdir()).iterdir()] == ["dump.zip"]
+
+    def test_runs_dumps_concurrently(self, fake_pg_dump, monkeypatch):
+        both_running = threading.Barrier(2, timeout=5)
+        original = dump.run_pg_dump
+
+        def run_pg_dump(container_id, db_user, database, sink):
+            both_running.wait()
+            original(container_id, db_user, database, sink)
+
+        monkeypatch.setattr(dump, "run_pg_dump", run_pg_dump)
+
+        path = dump.create_dump_archive()
+
+        assert path.endswith("dump.zip")
+
+    def test_failed_dump_removes_backup_directory(self, fake_pg_dump, tmp_path):
+        fake_pg_dump.returncode = 1
+
+        with pytest.raises(RuntimeError, match="connection refused"):
+            dump.create_dump_archive()
+
+        assert list((tmp_path / "dumps").iterdir()) == []
+
+    def test_failure_in_the_same_second_leaves_the_earlier_backup_alone(self, fake_pg_dump, tmp_path):
+        path = dump.create_dump_archive()
+        fake_pg_dump.returncode = 1
+
+        with pytest.raises(RuntimeError):
+            dump.create_dump_archive()
+
+        assert os.path.exists(path)
+        assert os.listdir(tmp_path / "dumps") == [os.path.basename(os.path.dirname(path))]
+
+
+class TestCreateDirectoryFormatArchive:
+    def test_stores_pg_dump_directory_members_and_records_format(self, fake_pg_dump, monkeypatch):
+        dumped = []
+
+        def fake_run(cmd, **kwargs):
+            if any("pg_dump" in arg for arg in cmd):
+                dumped.append((cmd[-3], cmd[-1]))
+            return types.SimpleNamespace(returncode=0, stdout="", stderr="")
+
+        def tar_of(files):
+            buffer = io.BytesIO()
+            with tarfile.open(fileobj=buffer, mode="w") as tar:
+                for name, data in files.items():
+                    info = tarfile.TarInfo(f"./{name}")
+                    info.size = len(data)
+                    tar.addfile(info, io.BytesIO(data))
+            return buffer.getvalue()
+
+        monkeypatch.setattr(dump.subprocess, "run", fake_run)
+        fake_pg_dump.outputs = {}
+        for name in dump.DUMP_DATABASES:
+            container_dir = f"/tmp/finmars-dump-20250101000000-{name}"
+            fake_pg_dump.outputs[container_dir] = tar_of({"toc.dat": f"toc-{name}".encode(), "3001.dat.gz": b"gz"})
+        monkeypatch.setattr(dump, "datetime", FixedDatetime)
+
+        path = dump.create_dump_archive(backup_format="directory", jobs=3)
+
+        with zipfile.ZipFile(path) as zf:
+            assert zf.read("backend/toc.dat") == b"toc-backend"
+            assert zf.read("workflow/3001.dat.gz") == b"gz"
+            assert zf.getinfo("backend/3001.dat.gz").compress_type == zipfile.ZIP_STORED
+            manifest = json.loads(zf.read("manifest.json"))
+
+        assert manifest["format"] == "directory"
+        assert sorted(d[0] for d in dumped) == ["backend_realm00000", "workflow_realm00000"]
+        assert {d[1] for d in dumped} == {"3"}
+        assert dump.validate_backup_archive(path)["format"] == "directory"
+
+
+class FixedDatetime(dump.datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2025, 1, 1, tzinfo=tz)
+
+
+class TestGetCompressionLevel:
+    def test_defaults_and_clamps(self):
+        assert dump.get_compression_level({}) == dump.DEFAULT_COMPRESSION_LEVEL
+        assert dump.get_compression_level({"BACKUP_COMPRESSION_LEVEL": "nope"}) == dump.DEFAULT_COMPRESSION_LEVEL
+        assert dump.get_compression_level({"BACKUP_COMPRESSION_LEVEL": "12"}) == 9
+        assert dump.get_compression_level({"BACKUP_COMPRESSION_LEVEL": "1"}) == 1
+
+
+class TestBackupFormat:
+    def test_manifest_without_format_is_plain(self):
+        assert dump.get_backup_format({}) == "plain"
+        assert dump.dump_members({}) == ["backend.sql", "workflow.sql"]
+
+    def test_directory_format_members(self):
+        assert dump.dump_members({"format": "directory"}) == ["backend/toc.dat", "workflow/toc.dat"]
+
+    def test_unknown_format_is_rejected(self):
+        with pytest.raises(ValueError):
+            dump.get_backup_format({"format": "tar"})
+
+    def test_parallel_jobs_default_to_core_count(self, monkeypatch):
+        monkeypatch.setattr(dump.os, "cpu_count", lambda: 8)
+
+        assert dump.get_parallel_jobs({}) == 8
+        assert dump.get_parallel_jobs({"BACKUP_JOBS": "2"}) == 2
@@ -1,4 +1,4 @@
-from community_edition.services.env import load_env
+from community_edition.services.env import get_config, load_env, parse_env
 
 
 class TestLoadEnv:
@@ -31,3 +31,50 @@ class TestLoadEnv:
             "KEY2": "value2",
             "KEY3": "value3",
         }
+
+
+class TestParseEnv:
+    def test_handles_export_quotes_comments_and_malformed_lines(self):
+        text = "\n".join(
+            [
+                "export KEY1=value1",
+                'KEY2="a \\"quoted\\" # value"  # comment',
+                "KEY3='single # quoted'",
+                "KEY4=pass #word",
+                "KEY5=pass#word",
+                "not a setting",
+                "=missing-key",
+                "KEY6=",
+            ]
+        )
+
+        assert parse_env(text) == {
+            "KEY1": "value1",
+            "KEY2": 'a "quoted" # value',
+            "KEY3": "single # quoted",
+            "KEY4": "pass #word",
+            "KEY5": "pass#word",
+            "KEY6": "",
+        }
+
+
+class TestGetConfig:
+    def test_is_parsed_once_until_the_file_changes(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        env_path = tmp_path / ".env"
+        env_path.write_text("DOMAIN_NAME=example.com\n")
+
+        first = get_config()
+        assert get_config() is first
+        assert first.get("DOMAIN_NAME") == "example.com"
+
+        env_path.write_text("DOMAIN_NAME=finmars.example.com\n")
+        assert get_config().get("DOMAIN_NAME") == "finmars.example.com"
+
+        replacement = tmp_path / ".env.new"
+        replacement.write_text("DOMAIN_NAME=example.org\n")
+        replacement.replace(env_path)
+        assert get_config().get("DOMAIN_NAME") == "example.org"
+
+        env_path.unlink()
+        assert get_config().values == {}
@@ -0,0 +1,80 @@
+import json
+import subprocess
+
+import pytest
+
+from community_edition.services import health
+
+
+def containers(**states):
+    return [
+        {"service": service, "name": f"finmars-{service}-1", "state": state, "status": ""}
+        for service, state in states.items()
+    ]
+
+
+@pytest.fixture(autouse=True)
+def snapshot(monkeypatch):
+    monkeypatch.setattr(health, "_snapshot", {"updated_at": None, "polled_at": None, "services": {}, "error": None})
+    monkeypatch.setattr(health.time, "sleep", lambda seconds: None)
+
+
+class TestStatusSnapshot:
+    def test_compose_ps_output_is_summarized_per_service(self, monkeypatch):
+        entries = [
+            {"Service": "core", "Name": "finmars-core-1", "State": "running", "Health": "healthy", "Status": "Up"},
+            {"Service": "core", "Name": "finmars-core-2", "State": "running", "Health": "starting", "Status": "Up"},
+            {"Service": "core-migration", "Name": "m", "State": "exited", "ExitCode": 0, "Status": "Exited (0)"},
+            {"Service": "redis", "Name": "finmars-redis-1", "State": "running", "Health": "", "Status": "Up"},
+        ]
+        output = "\n".join(json.dumps(entry) for entry in entries)
+        monkeypatch.setattr(
+            health.subprocess,
+            "run",
+            lambda cmd, **kwargs: subprocess.CompletedProcess(cmd, 0, stdout=output, stderr=""),
+        )
+
+        snapshot = health.get_status_snapshot()
+
+        assert {name: service["state"] for name, service in snapshot["services"].items()} == {
+            "core": "starting",
+            "core-migration": "completed",
+            "redis": "running",
+        }
+        assert snapshot["error"] is None
+        assert snapshot["polling"] is False
+
+    def test_failed_poll_keeps_the_last_services(self, monkeypatch):
+        monkeypatch.setattr(health, "list_containers", lambda: containers(db="healthy"))
+        health.refresh_status()
+        monkeypatch.setattr(health, "list_containers", lambda: (_ for _ in ()).throw(RuntimeError("no docker")))
+
+        snapshot = health.refresh_status()
+
+        assert snapshot["services"]["db"]["state"] == "healthy"
+        assert snapshot["error"] == "no docker"
+
+
+class TestWaitUntilHealthy:
+    def test_waits_with_backoff_until_ready(self, monkeypatch):
+        polls = [containers(core="starting", nginx="running"), containers(core="starting"), containers(core="healthy")]
+        monkeypatch.setattr(health, "list_containers", lambda: polls.pop(0))
+        delays = []
+        monkeypatch.setattr(health.time, "sleep", delays.append)
+
+        health.wait_until_healthy(["core"])
+
+        assert polls == []
+        assert delays == [health.WAIT_INITIAL_DELAY, health.WAIT_INITIAL_DELAY * 2]
+
+    def test_fails_as_soon_as_a_service_is_unhealthy(self, monkeypatch):
+        monkeypatch.setattr(health, "list_containers", lambda: containers(core="unhealthy", nginx="running"))
+
+        with pytest.raises(RuntimeError, match="core: unhealthy"):
+            health.wait_until_healthy(["core", "nginx"])
+
+    def test_times_out_naming_the_services_still_waited_for(self, monkeypatch):
+        monkeypatch.setattr(health, "list_containers", lambda: containers(core="starting", nginx="running"))
+
+        with pytest.raises(RuntimeError, match="core: starting, portal: missing"):
+            health.wait_until_healthy(["core", "nginx", "portal"], timeout=0)
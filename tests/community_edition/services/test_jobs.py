@@ -0,0 +1,105 @@
+import logging
+import threading
+
+from community_edition.services import jobs
+
+
+def conflict_key(request):
+    """A conflict key of its own per test, so a stuck job in one test cannot block another."""
+    return f"test-{request.node.name}"
+
+
+class TestSubmitJob:
+    def test_runs_in_background_and_records_steps(self, request):
+        def work():
+            jobs.step("First")
+            jobs.log("hello\nworld")
+            jobs.step("Second")
+            return "all done"
+
+        job = jobs.submit_job("test", "Test job", work, conflict_key=conflict_key(request))
+        finished = jobs.wait_for_job(job["id"], timeout=5)
+
+        assert finished["status"] == "succeeded"
+        assert finished["message"] == "all done"
+        assert [(s["name"], s["status"]) for s in finished["steps"]] == [("First", "done"), ("Second", "done")]
+        assert finished["output"] == ["hello", "world"]
+
+    def test_failure_is_reported_on_the_job(self, request):
+        def work():
+            jobs.step("Breaking")
+            raise RuntimeError("boom")
+
+        job = jobs.submit_job("test", "Failing job", work, conflict_key=conflict_key(request))
+        finished = jobs.wait_for_job(job["id"], timeout=5)
+
+        assert finished["status"] == "failed"
+        assert finished["message"] == "boom"
+        assert finished["steps"][0]["status"] == "failed"
+
+    def test_conflicting_jobs_are_queued_in_order(self, request):
+        key = conflict_key(request)
+        release = threading.Event()
+        order = []
+
+        first = jobs.submit_job("test", "First", lambda: release.wait(5) and order.append("first"), conflict_key=key)
+        second = jobs.submit_job("test", "Second", lambda: order.append("second"), conflict_key=key)
+
+        queued = jobs.get_job(second["id"])
+        assert queued["status"] == "queued"
+        assert queued["queue_position"] == 1
+        assert jobs.is_job_active("test") is True
+
+        release.set()
+        assert jobs.wait_for_job(second["id"], timeout=5)["status"] == "succeeded"
+        assert jobs.get_job(first["id"])["status"] == "succeeded"
+        assert order == ["first", "second"]
+
+    def test_captures_service_log_records(self, request):
+        service_logger = logging.getLogger("community_edition.services.example")
+
+        def work():
+            service_logger.warning("dumping databases")
+
+        job = jobs.submit_job("test", "Logging job", work, conflict_key=conflict_key(request))
+
+        assert jobs.wait_for_job(job["id"], timeout=5)["output"] == ["dumping databases"]
+
+
+class TestGetJob:
+    def test_returns_only_output_since_offset(self, request):
+        job = jobs.submit_job(
+            "test", "Output job", lambda: [jobs.log(str(i)) for i in range(5)], conflict_key=conflict_key(request)
+        )
+        jobs.wait_for_job(job["id"], timeout=5)
+
+        snapshot = jobs.get_job(job["id"], since=3)
+
+        assert snapshot["output"] == ["3", "4"]
+        assert snapshot["output_start"] == 3
+        assert snapshot["output_end"] == 5
+
+    def test_unknown_job(self):
+        assert jobs.get_job("missing") is None
+
+
+class TestFollowJob:
+    def test_yields_changes_until_finished(self, request):
+        release = threading.Event()
+
+        def work():
+            jobs.log("one")
+            release.wait(5)
+            jobs.log("two")
+
+        job = jobs.submit_job("test", "Followed job", work, conflict_key=conflict_key(request))
+        output = []
+        for snapshot in jobs.follow_job(job["id"], keepalive=0.05):
+            if snapshot is None:
+                release.set()
+                continue
+            output += snapshot["output"]
+            last = snapshot
+
+        assert last["status"] == "succeeded"
+        assert output == ["one", "two"]
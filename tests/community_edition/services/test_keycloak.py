@@ -1,5 +1,9 @@
 import json
+import socket
+import threading
 import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
 
 import pytest
 
@@ -110,3 +114,137 @@ class TestListKeycloakUsers:
             keycloak.list_keycloak_users()
 
         assert "Failed to list Keycloak users via CLI." in str(exc.value)
+
+
+class FakeKeycloak(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self):
+        return self.headers.get("Authorization", "").removeprefix("Bearer ") in self.server.tokens
+
+    def _issue_token(self):
+        self.server.issued += 1
+        token = f"token-{self.server.issued}"
+        self.server.tokens.add(token)
+        self._send(
+            200,
+            {
+                "access_token": token,
+                "expires_in": self.server.expires_in,
+                "refresh_token": f"refresh-{self.server.issued}",
+                "refresh_expires_in": 1800,
+            },
+        )
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path == "/realms/master/protocol/openid-connect/token":
+            form = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+            self.server.grants.append(form["grant_type"])
+            if form["grant_type"] == "password" and (form["username"], form["password"]) != ("admin", "secret"):
+                self._send(401, {"error": "invalid_grant"})
+                return
+            self._issue_token()
+        elif self.path == "/admin/realms/finmars/users":
+            if not self._authorized():
+                self._send(401)
+                return
+            user = json.loads(body)
+            if any(existing["username"] == user["username"] for existing in self.server.users):
+                self._send(409, {"errorMessage": "User exists with same username"})
+                return
+            self.server.users.append({"username": user["username"], "enabled": user["enabled"]})
+            self._send(201)
+        else:
+            self._send(404)
+
+    def do_GET(self):
+        if self.path != "/admin/realms/finmars/users":
+            self._send(404)
+        elif not self._authorized():
+            self._send(401)
+        else:
+            self._send(200, self.server.users)
+
+
+@pytest.fixture
+def keycloak_server(tmp_path, monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeKeycloak)
+    server.tokens, server.grants, server.users = set(), [], [{"username": "admin", "enabled": True}]
+    server.issued, server.expires_in = 0, 300
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".env").write_text(
+        f"KEYCLOAK_ADMIN_URL=http://127.0.0.1:{server.server_port}\n"
+        "KEYCLOAK_REALM=finmars\nADMIN_USERNAME=admin\nADMIN_PASSWORD=secret\n"
+    )
+    monkeypatch.setattr(keycloak, "_clients", {})
+    monkeypatch.setattr(keycloak, "_unavailable", {})
+    monkeypatch.setattr(keycloak.subprocess, "run", lambda *a, **k: pytest.fail("the CLI should not be used"))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestKeycloakAdminAPI:
+    def test_users_are_listed_and_created_with_one_token(self, keycloak_server):
+        output = keycloak.add_keycloak_user(" alice ", "pw")
+
+        assert output == "User alice has been created in realm finmars."
+        assert [user["username"] for user in keycloak.list_keycloak_users()] == ["admin", "alice"]
+        assert keycloak_server.grants == ["password"]
+
+    def test_expiring_token_is_renewed_with_the_refresh_token(self, keycloak_server):
+        keycloak_server.expires_in = 10
+
+        keycloak.list_keycloak_users()
+        keycloak.list_keycloak_users()
+
+        assert keycloak_server.grants == ["password", "refresh_token"]
+
+    def test_rejected_token_is_renewed_and_the_request_retried(self, keycloak_server):
+        keycloak.list_keycloak_users()
+        keycloak_server.tokens.clear()
+
+        assert len(keycloak.list_keycloak_users()) == 1
+        assert keycloak_server.issued == 2
+
+    def test_existing_user_is_reported(self, keycloak_server):
+        with pytest.raises(keycloak.KeycloakError, match="'admin' already exists in realm 'finmars'"):
+            keycloak.add_keycloak_user("admin", "pw")
+
+    def test_wrong_admin_password_is_reported(self, keycloak_server, tmp_path):
+        env = (tmp_path / ".env").read_text().replace("ADMIN_PASSWORD=secret", "ADMIN_PASSWORD=wrong")
+        (tmp_path / ".env").write_text(env)
+
+        with pytest.raises(keycloak.KeycloakError, match="Failed to log in to Keycloak: 401"):
+            keycloak.list_keycloak_users()
+
+    def test_unreachable_keycloak_falls_back_to_the_cli(self, keycloak_server, tmp_path, monkeypatch):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        (tmp_path / ".env").write_text(
+            f"KEYCLOAK_ADMIN_URL=http://127.0.0.1:{port}\nADMIN_USERNAME=admin\nADMIN_PASSWORD=secret\n"
+        )
+        runs = []
+
+        def fake_run(cmd, **kwargs):
+            runs.append(cmd)
+            return types.SimpleNamespace(returncode=0, stdout="[]", stderr="")
+
+        monkeypatch.setattr(keycloak.subprocess, "run", fake_run)
+
+        assert keycloak.list_keycloak_users() == []
+        assert keycloak.list_keycloak_users() == []
+        assert runs == [keycloak.LIST_KEYCLOAK_USERS_CMD, keycloak.LIST_KEYCLOAK_USERS_CMD]
+        assert list(keycloak._unavailable) == [f"http://127.0.0.1:{port}"]
@@ -0,0 +1,96 @@
+import threading
+
+import pytest
+
+from community_edition.services import logbuffer
+from community_edition.services.logs import parse_log_line
+
+
+@pytest.fixture(autouse=True)
+def buffers(monkeypatch):
+    monkeypatch.setattr(logbuffer, "_buffers", {})
+    monkeypatch.setattr(logbuffer, "_dropped", {})
+    monkeypatch.setattr(logbuffer, "_last_seen", {})
+    monkeypatch.setattr(logbuffer, "_state", {**logbuffer._state, "capacity": 3, "seq": 0})
+
+
+def add(container, time, message):
+    logbuffer.add_line(parse_log_line(f"{container}  | {time} {message}"))
+
+
+class TestAddLine:
+    def test_ring_buffer_counts_dropped_lines(self):
+        for i in range(5):
+            add("core-1", f"2025-01-01T00:00:0{i}Z", f"line {i}")
+        add("workflow-1", "2025-01-01T00:00:00Z", "other")
+
+        status = logbuffer.get_collector_status()
+
+        assert [e["message"] for e in logbuffer.get_buffered_lines(["core"])] == ["line 2", "line 3", "line 4"]
+        assert status["services"] == {"core": {"lines": 3, "dropped": 2}, "workflow": {"lines": 1, "dropped": 0}}
+        assert status["dropped"] == 2
+
+    def test_skips_lines_repeated_after_a_reconnect(self):
+        add("core-1", "2025-01-01T00:00:01.5Z", "a")
+        add("core-1", "2025-01-01T00:00:01.5Z", "b")
+        # a reconnect with --since replays the whole second
+        add("core-1", "2025-01-01T00:00:01.25Z", "older")
+        add("core-1", "2025-01-01T00:00:01.5Z", "a")
+        add("core-1", "2025-01-01T00:00:01.5Z", "c")
+
+        assert [e["message"] for e in logbuffer.get_buffered_lines()] == ["a", "b", "c"]
+
+    def test_keeps_older_lines_of_another_container(self):
+        add("core-1", "2025-01-01T00:00:02Z", "late")
+        add("core-2", "2025-01-01T00:00:01Z", "early")
+
+        assert len(logbuffer.get_buffered_lines(["core"])) == 2
+
+
+class TestFollowLines:
+    def test_tail_is_per_service_and_merged_in_arrival_order(self):
+        add("core-1", "2025-01-01T00:00:01Z", "c1")
+        add("workflow-1", "2025-01-01T00:00:01Z", "w1")
+        add("core-1", "2025-01-01T00:00:02Z", "c2")
+
+        lines = list(logbuffer.follow_lines(tail=1, follow=False))
+
+        assert [e["message"] for e in lines] == ["w1", "c2"]
+
+    def test_follows_new_lines_and_resumes_after_a_sequence_number(self):
+        add("core-1", "2025-01-01T00:00:01Z", "first")
+        stream = logbuffer.follow_lines(keepalive=5)
+        assert next(stream)["message"] == "first"
+
+        threading.Timer(0.05, add, ("core-1", "2025-01-01T00:00:02Z", "second")).start()
+        second = next(stream)
+        stream.close()
+
+        assert second["message"] == "second"
+        resumed = list(logbuffer.follow_lines(after=second["seq"] - 1, follow=False))
+        assert [e["message"] for e in resumed] == ["second"]
+
+    def test_yields_keepalives_when_idle(self):
+        stream = logbuffer.follow_lines(keepalive=0.01)
+
+        assert next(stream) is None
+
+
+class TestGetBufferLines:
+    def test_defaults_and_disabling(self):
+        assert logbuffer.get_buffer_lines({}) == logbuffer.DEFAULT_BUFFER_LINES
+        assert logbuffer.get_buffer_lines({"LOG_BUFFER_LINES": "0"}) == 0
+        assert logbuffer.get_buffer_lines({"LOG_BUFFER_LINES": "many"}) == logbuffer.DEFAULT_BUFFER_LINES
+
+
+class TestStartLogCollector:
+    @pytest.mark.parametrize("lines,store_started", [("5000", True), ("0", False)])
+    def test_starts_the_log_store_only_with_a_feed(self, monkeypatch, lines, store_started):
+        started = []
+        monkeypatch.setattr(logbuffer, "load_env", lambda: {"LOG_BUFFER_LINES": lines})
+        monkeypatch.setattr(logbuffer, "start_log_store", lambda: started.append(True))
+        monkeypatch.setattr(logbuffer, "_collect", lambda: None)
+
+        logbuffer.start_log_collector()
+
+        assert bool(started) is store_started
@@ -0,0 +1,78 @@
+import pytest
+
+from community_edition.services import logfiles
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_text("".join(f"line {i}\n" for i in range(10)))
+    return path
+
+
+class TestReadTail:
+    def test_last_lines_and_paging_back(self, log_file):
+        last = logfiles.read_tail(str(log_file), lines=3)
+
+        assert last["lines"] == ["line 7", "line 8", "line 9"]
+        assert last["end"] == last["size"] == log_file.stat().st_size
+
+        before = logfiles.read_tail(str(log_file), lines=5, before=last["start"])
+        assert before["lines"] == ["line 2", "line 3", "line 4", "line 5", "line 6"]
+        assert before["end"] == last["start"]
+
+        first = logfiles.read_tail(str(log_file), lines=5, before=before["start"])
+        assert first["lines"] == ["line 0", "line 1"]
+        assert first["start"] == 0
+
+    def test_line_being_written_is_left_out(self, log_file):
+        with open(log_file, "a") as f:
+            f.write("partial")
+
+        window = logfiles.read_tail(str(log_file), lines=1)
+
+        assert window["lines"] == ["line 9"]
+        assert window["end"] == window["size"] - len("partial")
+
+    def test_window_is_capped_in_bytes(self, log_file, monkeypatch):
+        monkeypatch.setattr(logfiles, "MAX_WINDOW_BYTES", 21)
+
+        assert logfiles.read_tail(str(log_file), lines=100)["lines"] == ["line 7", "line 8", "line 9"]
+        monkeypatch.setattr(logfiles, "MAX_WINDOW_BYTES", 20)
+        assert logfiles.read_tail(str(log_file), lines=100)["lines"] == ["line 8", "line 9"]
+        monkeypatch.setattr(logfiles, "MAX_WINDOW_BYTES", 3)
+        assert logfiles.read_tail(str(log_file), lines=100)["lines"] == [" 9"]
+
+    def test_missing_or_empty_file_is_an_empty_window(self, tmp_path):
+        (tmp_path / "empty.log").write_text("")
+
+        assert logfiles.read_tail(str(tmp_path / "missing.log"))["lines"] == []
+        assert logfiles.read_tail(str(tmp_path / "empty.log"))["lines"] == []
+
+    def test_invalid_window_is_rejected(self, log_file):
+        with pytest.raises(ValueError, match="lines"):
+            logfiles.read_tail(str(log_file), lines=0)
+        with pytest.raises(ValueError, match="before"):
+            logfiles.read_tail(str(log_file), before=10_000)
+
+
+class TestReadSince:
+    def test_polls_for_appended_lines(self, log_file):
+        end = logfiles.read_tail(str(log_file))["end"]
+        with open(log_file, "a") as f:
+            f.write("line 10\nline 1")
+
+        window = logfiles.read_since(str(log_file), end)
+
+        assert window["lines"] == ["line 10"]
+        assert window["reset"] is False
+        assert logfiles.read_since(str(log_file), window["end"])["lines"] == []
+
+    def test_truncated_file_starts_over(self, log_file):
+        end = log_file.stat().st_size
+        log_file.write_text("fresh\n")
+
+        window = logfiles.read_since(str(log_file), end)
+
+        assert window["reset"] is True
+        assert window["lines"] == ["fresh"]
@@ -0,0 +1,115 @@
+import gzip
+import subprocess
+import sys
+
+import pytest
+
+from community_edition.services import logs
+
+
+class TestBuildLogsCommand:
+    def test_adds_filters_and_services(self):
+        command = logs.build_logs_command(
+            ["core", "workflow"], tail="all", since="1h30m", until="2025-01-01T00:00:00Z"
+        )
+
+        assert command == [
+            *logs.DEFAULT_LOGS_COMMAND,
+            "--no-color",
+            "--timestamps",
+            "--tail",
+            "all",
+            "--since",
+            "1h30m",
+            "--until",
+            "2025-01-01T00:00:00Z",
+            "core",
+            "workflow",
+        ]
+
+    @pytest.mark.parametrize(
+        "kwargs",
+        [
+            {"tail": "lots"},
+            {"tail": logs.MAX_TAIL + 1},
+            {"since": "--follow"},
+            {"until": "yesterday"},
+            {"services": ["-f"]},
+        ],
+    )
+    def test_rejects_invalid_filters(self, kwargs):
+        with pytest.raises(ValueError):
+            logs.build_logs_command(**kwargs)
+
+
+class TestParseLogLine:
+    def test_splits_service_time_and_message(self):
+        entry = logs.parse_log_line("core-worker-1  | 2025-01-01T10:00:00.123456789Z Task done | ok")
+
+        assert entry["service"] == "core-worker"
+        assert entry["time"] == "2025-01-01T10:00:00.123456789Z"
+        assert entry["message"] == "Task done | ok"
+
+    def test_keeps_unprefixed_lines(self):
+        assert logs.parse_log_line("no such service: web")["service"] is None
+
+
+class TestStreamLogs:
+    @pytest.fixture
+    def fake_compose(self, monkeypatch):
+        """Runs a Python one-liner in place of docker compose, through a real pipe."""
+        real_popen = subprocess.Popen
+
+        def run(script):
+            monkeypatch.setattr(
+                logs.subprocess,
+                "Popen",
+                lambda command, **kwargs: real_popen([sys.executable, "-c", script], **kwargs),
+            )
+
+        return run
+
+    def test_yields_lines_as_they_arrive(self, fake_compose):
+        fake_compose(
+            "import sys, time\n"
+            "sys.stdout.write('core-1  | first\\nweb-1  | sec'); sys.stdout.flush(); time.sleep(0.2)\n"
+            "sys.stdout.write('ond\\nweb-1  | unterminated')"
+        )
+
+        entries = [entry for entry in logs.stream_logs(["logs"], keepalive=0.05) if entry is not None]
+
+        assert [(entry["service"], entry["message"]) for entry in entries] == [
+            ("core", "first"),
+            ("web", "second"),
+            ("web", "unterminated"),
+        ]
+
+    def test_sends_keepalives_and_stops_the_process_when_closed(self, fake_compose, monkeypatch):
+        fake_compose("import time; time.sleep(30)")
+        started = []
+        popen = logs.subprocess.Popen
+        monkeypatch.setattr(logs.subprocess, "Popen", lambda *a, **k: started.append(popen(*a, **k)) or started[-1])
+
+        stream = logs.stream_logs(["logs"], keepalive=0.05)
+        assert next(stream) is None
+        stream.close()
+
+        assert started[0].returncode is not None
+
+    def test_splits_overlong_lines(self, fake_compose, monkeypatch):
+        monkeypatch.setattr(logs, "MAX_LINE_BYTES", 10)
+        fake_compose("print('x' * 25)")
+
+        entries = [entry for entry in logs.stream_logs(["logs"]) if entry is not None]
+
+        assert [len(entry["line"]) for entry in entries] == [10, 10, 5]
+
+
+class TestGzipStream:
+    def test_compresses_incrementally(self):
+        chunks = [b"core-1  | line %d\n" % i for i in range(20000)]
+
+        blocks = list(logs.gzip_stream(iter(chunks)))
+
+        assert len(blocks) > 1
+        assert gzip.decompress(b"".join(blocks)) == b"".join(chunks)
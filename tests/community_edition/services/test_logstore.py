@@ -0,0 +1,143 @@
+import queue
+from datetime import UTC, datetime
+
+import pytest
+
+from community_edition.services import logstore
+from community_edition.services.logs import parse_log_line
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(logstore, "LOG_DB_PATH", str(tmp_path / "logs.sqlite3"))
+    connection = logstore.connect()
+    yield connection
+    connection.close()
+
+
+def line(container, time, message):
+    return parse_log_line(f"{container}  | {time} {message}")
+
+
+def messages(result):
+    return [row["message"] for row in result["lines"]]
+
+
+class TestSearchLogs:
+    @pytest.fixture
+    def lines(self, store):
+        logstore.insert_lines(
+            store,
+            [
+                line("core-1", "2025-01-01T10:00:00Z", "INFO Starting server"),
+                line("core-worker-1", "2025-01-01T10:05:00.5Z", "ERROR Task import_prices failed"),
+                line("core-worker-1", "2025-01-01T10:05:01Z", 'Traceback: KeyError "price"'),
+                line("workflow-worker-1", "2025-01-01T11:00:00Z", "[WARN] Task retried"),
+                line("core-1", "2025-01-01T12:00:00Z", "INFO Request handled"),
+            ],
+        )
+        return store
+
+    def test_filters_by_service_level_and_time(self, lines):
+        assert messages(logstore.search_logs(services=["core-worker"], connection=lines)) == [
+            'Traceback: KeyError "price"',
+            "ERROR Task import_prices failed",
+        ]
+        assert messages(logstore.search_logs(levels=["WARNING"], connection=lines)) == ["[WARN] Task retried"]
+        assert messages(
+            logstore.search_logs(since="2025-01-01T10:05:00", until="2025-01-01T11:00:00Z", connection=lines)
+        ) == ["[WARN] Task retried", 'Traceback: KeyError "price"', "ERROR Task import_prices failed"]
+
+    def test_full_text_search_takes_the_text_literally(self, lines):
+        assert messages(logstore.search_logs(text="task FAILED", connection=lines)) == [
+            "ERROR Task import_prices failed"
+        ]
+        assert messages(logstore.search_logs(text='"price" OR', connection=lines)) == []
+        assert messages(logstore.search_logs(text='KeyError "price"', connection=lines)) == [
+            'Traceback: KeyError "price"'
+        ]
+
+    def test_pages_are_keyed_on_the_line_id(self, lines):
+        first = logstore.search_logs(limit=2, connection=lines)
+        second = logstore.search_logs(limit=2, before=first["next_before"], connection=lines)
+        last = logstore.search_logs(limit=2, before=second["next_before"], connection=lines)
+
+        assert messages(first) + messages(second) + messages(last) == [
+            "INFO Request handled",
+            "[WARN] Task retried",
+            'Traceback: KeyError "price"',
+            "ERROR Task import_prices failed",
+            "INFO Starting server",
+        ]
+        assert last["next_before"] is None
+
+    def test_filtered_pages_use_an_index(self, lines):
+        plan = " ".join(
+            row[-1]
+            for row in lines.execute(
+                "EXPLAIN QUERY PLAN SELECT id FROM lines WHERE level IN (?) AND id < ? ORDER BY id DESC LIMIT 10",
+                ("ERROR", 100),
+            )
+        )
+
+        assert "USING INDEX lines_level" in plan or "USING COVERING INDEX lines_level" in plan
+
+    def test_rejects_unknown_levels_and_times(self, lines):
+        with pytest.raises(ValueError):
+            logstore.search_logs(levels=["LOUD"], connection=lines)
+        with pytest.raises(ValueError):
+            logstore.search_logs(since="yesterday", connection=lines)
+
+
+class TestPrune:
+    def test_deletes_by_age_and_line_count(self, store, monkeypatch):
+        monkeypatch.setattr(logstore, "PRUNE_BATCH_LINES", 2)
+        logstore.insert_lines(
+            store, [line("core-1", f"2025-01-0{day}T00:00:00Z", f"day {day}") for day in range(1, 8)]
+        )
+
+        deleted = logstore.prune(store, retention_days=5, max_lines=3, now=datetime(2025, 1, 7, tzinfo=UTC))
+
+        assert deleted == 4
+        assert messages(logstore.search_logs(connection=store)) == ["day 7", "day 6", "day 5"]
+        assert messages(logstore.search_logs(text="day", connection=store)) == ["day 7", "day 6", "day 5"]
+
+
+class TestParsing:
+    def test_detect_level(self):
+        assert logstore.detect_level("2025-01-01 ERROR something broke") == "ERROR"
+        assert logstore.detect_level("[FATAL] out of memory") == "CRITICAL"
+        assert logstore.detect_level("information only") is None
+
+    def test_parse_time(self):
+        now = datetime(2025, 1, 1, 12, 0, tzinfo=UTC)
+
+        assert logstore.parse_time("2h", now=now) == "2025-01-01T10:00:00.000000000"
+        assert logstore.parse_time("2025-01-01T13:00:00+01:00") == "2025-01-01T12:00:00.000000000"
+
+
+class TestEnqueueLine:
+    def test_counts_lines_dropped_when_the_writer_falls_behind(self, monkeypatch):
+        monkeypatch.setattr(logstore, "_queue", queue.Queue(maxsize=1))
+        monkeypatch.setattr(logstore, "_state", {**logstore._state, "running": True, "dropped": 0})
+
+        logstore.enqueue_line(line("core-1", "2025-01-01T00:00:00Z", "kept"))
+        logstore.enqueue_line(line("core-1", "2025-01-01T00:00:00Z", "dropped"))
+
+        assert logstore.get_store_status()["dropped"] == 1
+
+
+class TestStartLogStore:
+    def test_stops_when_the_database_cannot_be_opened(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(logstore, "LOG_DB_PATH", str(tmp_path / "missing" / "logs.sqlite3"))
+        monkeypatch.setattr(logstore, "load_env", lambda: {})
+        monkeypatch.setattr(logstore, "_queue", queue.Queue())
+        monkeypatch.setattr(logstore, "_state", {**logstore._state, "running": False, "last_error": None})
+
+        logstore.start_log_store().join(timeout=5)
+
+        status = logstore.get_store_status()
+        assert status["running"] is False
+        assert "unable to open database" in status["last_error"]
+        logstore.enqueue_line(line("core-1", "2025-01-01T00:00:00Z", "ignored"))
+        assert status["queued"] == logstore.get_store_status()["queued"] == 0
@@ -0,0 +1,257 @@
+import io
+import json
+import tarfile
+import types
+import zipfile
+
+import pytest
+
+from community_edition.services import restore
+
+
+@pytest.fixture
+def current_versions(monkeypatch):
+    versions = {"backend": "1.24.0-stable", "workflow": "1.24.0-stable"}
+    monkeypatch.setattr(
+        restore,
+        "get_current_versions",
+        lambda: {
+            f"{app}_VERSION": {"app_name": app, "current_version": version, "env_var": f"{app}_VERSION"}
+            for app, version in versions.items()
+        },
+    )
+    return versions
+
+
+def write_directory_archive(path, manifest_overrides=None):
+    manifest = {
+        "space_code": "space00000",
+        "realm_code": "realm00000",
+        "versions": [{"app": "backend", "version": "1.23.0-stable"}],
+        "format": "directory",
+        **(manifest_overrides or {}),
+    }
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("manifest.json", json.dumps(manifest))
+        for name in ("backend", "workflow"):
+            zf.writestr(f"{name}/toc.dat", f"toc-{name}")
+            zf.writestr(f"{name}/3001.dat.gz", b"data")
+    return str(path)
+
+
+class TestParseVersion:
+    def test_ignores_channel_suffix(self):
+        assert restore.parse_version("1.24.0-stable") == (1, 24, 0)
+
+    def test_orders_numerically(self):
+        assert restore.parse_version("1.10.0") > restore.parse_version("1.9.5")
+
+
+class TestCheckVersionCompatibility:
+    def test_accepts_older_or_equal_backup(self, current_versions):
+        restore.check_version_compatibility(
+            {"versions": [{"app": "backend", "version": "1.23.9"}, {"app": "workflow", "version": "1.24.0-stable"}]}
+        )
+
+    def test_rejects_newer_backup(self, current_versions):
+        with pytest.raises(ValueError, match="Version incompatible for backend"):
+            restore.check_version_compatibility({"versions": [{"app": "backend", "version": "1.25.0"}]})
+
+    def test_skips_unknown_apps(self, current_versions):
+        restore.check_version_compatibility({"versions": [{"app": "unknown", "version": "9.0.0"}]})
+
+
+class TestRestoreArchive:
+    @pytest.fixture
+    def docker(self, tmp_path, monkeypatch, current_versions):
+        (tmp_path / ".env").write_text(
+            "DB_USER=finmars\nREALM_CODE=realm00000\nBASE_API_URL=space00000\nBACKUP_JOBS=4\n"
+        )
+        monkeypatch.chdir(tmp_path)
+
+        calls = {"exec": [], "copied": {}, "migrated": False, "restarted": False}
+
+        def fake_run(cmd, **kwargs):
+            calls["exec"].append(cmd)
+            return types.SimpleNamespace(returncode=0, stdout="", stderr="")
+
+        class FakePopen:
+            def __init__(self, cmd, stdin, stderr):
+                self.container_dir = cmd[-1]
+                self.stdin = io.BytesIO()
+                self.stdin.close = lambda: None
+
+            def wait(self):
+                self.stdin.seek(0)
+                with tarfile.open(fileobj=self.stdin, mode="r|") as tar:
+                    calls["copied"][self.container_dir] = {m.name: tar.extractfile(m).read() for m in tar}
+                return 0
+
+        monkeypatch.setattr(restore, "start_database", lambda db_user: "db-container")
+        monkeypatch.setattr(restore.subprocess, "run", fake_run)
+        monkeypatch.setattr(restore.subprocess, "Popen", FakePopen)
+        monkeypatch.setattr(restore, "run_migrations", lambda: calls.update(migrated=True))
+        monkeypatch.setattr(restore, "restart_application_services", lambda: calls.update(restarted=True))
+        return calls
+
+    def test_streams_members_into_container_and_runs_parallel_pg_restore(self, docker, tmp_path):
+        path = write_directory_archive(tmp_path / "dump.zip")
+
+        restore.restore_archive(path)
+
+        assert docker["copied"]["/tmp/finmars-restore-backend"] == {"toc.dat": b"toc-backend", "3001.dat.gz": b"data"}
+        pg_restores = [cmd for cmd in docker["exec"] if "pg_restore" in cmd]
+        assert len(pg_restores) == 2
+        assert all(cmd[cmd.index("-j") + 1] == "4" for cmd in pg_restores)
+        assert docker["migrated"] is True
+        assert docker["restarted"] is True
+
+    def test_rejects_newer_backup_before_touching_database(self, docker, tmp_path):
+        path = write_directory_archive(
+            tmp_path / "dump.zip", {"versions": [{"app": "backend", "version": "2.0.0-stable"}]}
+        )
+
+        with pytest.raises(ValueError, match="Version incompatible"):
+            restore.restore_archive(path)
+
+        assert docker["exec"] == []
+
+    def test_rejects_directory_format_with_different_realm_code(self, docker, tmp_path):
+        path = write_directory_archive(tmp_path / "dump.zip", {"realm_code": "realm12345"})
+
+        with pytest.raises(ValueError, match="same realm/space codes"):
+            restore.restore_archive(path)
+
+        assert docker["exec"] == []
+
+    def test_streams_plain_dump_through_rewriter_into_psql(self, docker, tmp_path, monkeypatch):
+        imported = {}
+
+        class FakePsql:
+            def __init__(self, cmd, stdin, stdout, stderr):
+                self.database = cmd[cmd.index("-d") + 1]
+                self.stdin = io.BytesIO()
+                self.stdin.close = lambda: None
+
+            def wait(self):
+                imported[self.database] = self.stdin.getvalue()
+                return 0
+
+        monkeypatch.setattr(restore.subprocess, "Popen", FakePsql)
+        path = tmp_path / "dump.zip"
+        with zipfile.ZipFile(path, "w") as zf:
+            zf.writestr(
+                "manifest.json",
+                json.dumps({"space_code": "space11111", "realm_code": "realm00000", "versions": []}),
+            )
+            zf.writestr("backend.sql", "CREATE SCHEMA space11111;\nINSERT INTO t VALUES ('xspace11111');\n")
+            zf.writestr("workflow.sql", "SELECT 1;\n")
+
+        restore.restore_archive(str(path))
+
+        assert imported["backend_realm00000"] == (
+            b"CREATE SCHEMA space00000;\nINSERT INTO t VALUES ('xspace11111');\n"
+        )
+        assert imported["workflow_realm00000"] == b"SELECT 1;\n"
+        assert not (tmp_path / "tmp").exists()
+
+
+class TestPreflightRestore:
+    @pytest.fixture
+    def installation(self, tmp_path, monkeypatch, current_versions):
+        (tmp_path / ".env").write_text("REALM_CODE=realm00000\nBASE_API_URL=space00000\n")
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(restore, "DOCKER_DATA_DIR", str(tmp_path / "docker"))
+        monkeypatch.setattr(restore, "PROJECT_DIR", str(tmp_path))
+        monkeypatch.setattr(restore, "BACKUP_DIR", str(tmp_path / "dumps"))
+        free = {"bytes": 10**12}
+        monkeypatch.setattr(
+            restore.shutil, "disk_usage", lambda path: types.SimpleNamespace(total=0, used=0, free=free["bytes"])
+        )
+        return free
+
+    def test_reports_what_would_be_restored(self, installation, tmp_path):
+        path = write_directory_archive(tmp_path / "dump.zip")
+
+        result = restore.preflight_restore(path)
+
+        assert result["format"] == "directory"
+        assert result["replacements"] == {}
+        # 31 bytes of dumps, plus the larger database's (workflow, 16 bytes) copy in the container.
+        assert result["disks"] == [
+            {
+                "path": str(tmp_path),
+                "required": 47,
+                "purposes": ["restored databases", "dump copied into the database container"],
+                "free": 10**12,
+            }
+        ]
+
+    def test_lists_every_problem(self, installation, tmp_path):
+        installation["bytes"] = 10
+        path = write_directory_archive(
+            tmp_path / "dump.zip",
+            {"realm_code": "realm12345", "versions": [{"app": "backend", "version": "2.0.0-stable"}]},
+        )
+
+        with pytest.raises(ValueError) as excinfo:
+            restore.preflight_restore(path)
+
+        message = str(excinfo.value)
+        assert "Version incompatible" in message
+        assert "same realm/space codes" in message
+        assert "Not enough free disk space" in message
+
+    def test_reads_only_the_central_directory_and_manifest(self, installation, tmp_path, monkeypatch):
+        path = write_directory_archive(tmp_path / "dump.zip")
+        opened = []
+        original_open = zipfile.ZipFile.open
+        monkeypatch.setattr(
+            zipfile.ZipFile,
+            "open",
+            lambda self, name, *args, **kwargs: opened.append(name) or original_open(self, name, *args, **kwargs),
+        )
+
+        restore.preflight_restore(path)
+
+        assert opened == ["manifest.json"]
+
+
+class TestRewriteCodes:
+    REPLACEMENTS = {"space11111": "space00000", "realm11111": "realm00000"}
+    SOURCE = (
+        b"SET search_path = space11111, pg_catalog;\n"
+        b"COPY space11111.users (user_code) FROM stdin;\n"
+        b"realm11111.space11111\tspace111112\txspace11111\t/realm11111/space11111/a\n"
+        b"space11111"
+    )
+    EXPECTED = (
+        b"SET search_path = space00000, pg_catalog;\n"
+        b"COPY space00000.users (user_code) FROM stdin;\n"
+        b"realm00000.space00000\tspace111112\txspace11111\t/realm00000/space00000/a\n"
+        b"space00000"
+    )
+
+    def test_rewrites_only_standalone_codes(self):
+        assert b"".join(restore.rewrite_codes([self.SOURCE], self.REPLACEMENTS)) == self.EXPECTED
+
+    @pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 10, 11, 64])
+    def test_result_does_not_depend_on_chunk_boundaries(self, chunk_size):
+        chunks = [self.SOURCE[i : i + chunk_size] for i in range(0, len(self.SOURCE), chunk_size)]
+
+        assert b"".join(restore.rewrite_codes(chunks, self.REPLACEMENTS)) == self.EXPECTED
+
+    def test_passes_stream_through_without_replacements(self):
+        chunks = [b"space11111", b"\n"]
+
+        assert list(restore.rewrite_codes(chunks, {})) == chunks
+
+    def test_get_code_replacements_only_for_differing_codes(self):
+        manifest = {"space_code": "space11111", "realm_code": "realm00000"}
+        env = {"BASE_API_URL": "space00000", "REALM_CODE": "realm00000"}
+
+        assert restore.get_code_replacements(manifest, env) == {"space11111": "space00000"}
+
+    def test_get_code_replacements_rejects_non_alphanumeric_codes(self):
+        with pytest.raises(ValueError):
+            restore.get_code_replacements({"space_code": "space.*"}, {"BASE_API_URL": "space00000"})
@@ -0,0 +1,191 @@
+import json
+import os
+
+import pytest
+
+from community_edition.services import catalog, chunkstore, retention
+
+GB = 1024**3
+
+
+def backup(created, size=GB, chunks=None):
+    return {
+        "timestamp": created.replace("-", "").replace(" ", "").replace(":", ""),
+        "created": created,
+        "physical_size": sum(chunks.values()) if chunks else size,
+        "chunks": chunks,
+    }
+
+
+def policy(**overrides):
+    return {key: None for key in retention.RETENTION_SETTINGS} | overrides
+
+
+def deleted(plan):
+    return [entry["timestamp"] for entry in plan["delete"]]
+
+
+class TestParseSize:
+    @pytest.mark.parametrize(
+        "value,expected", [("1048576", 1048576), ("500M", 500 * 1024**2), ("20G", 20 * GB), ("1.5GiB", int(1.5 * GB))]
+    )
+    def test_units(self, value, expected):
+        assert retention.parse_size(value) == expected
+
+    def test_rejects_garbage(self):
+        with pytest.raises(ValueError):
+            retention.parse_size("lots")
+
+
+class TestGetRetentionPolicy:
+    def test_reads_env(self):
+        env = {"BACKUP_KEEP_DAILY": "7", "BACKUP_MAX_DISK_USAGE": "10G", "BACKUP_KEEP_LAST": ""}
+
+        assert retention.get_retention_policy(env) == policy(keep_daily=7, max_usage=10 * GB)
+
+    def test_rejects_non_numeric_counts(self):
+        with pytest.raises(ValueError, match="BACKUP_KEEP_WEEKLY"):
+            retention.get_retention_policy({"BACKUP_KEEP_WEEKLY": "a few"})
+
+
+class TestPlanRetention:
+    def test_disabled_policy_keeps_everything(self):
+        backups = [backup("2025-01-01 00:00:00"), backup("2025-01-02 00:00:00")]
+
+        assert deleted(retention.plan_retention(backups, policy())) == []
+
+    def test_grandfather_father_son(self):
+        backups = [
+            backup("2024-11-15 00:00:00"),
+            backup("2024-12-20 00:00:00"),
+            backup("2024-12-30 00:00:00"),
+            backup("2025-01-06 01:00:00"),  # Monday
+            backup("2025-01-07 01:00:00"),
+            backup("2025-01-08 01:00:00"),
+            backup("2025-01-08 13:00:00"),
+        ]
+
+        plan = retention.plan_retention(backups, policy(keep_daily=2, keep_weekly=2, keep_monthly=2))
+
+        # daily: 01-08 13:00 and 01-07; weekly: week 2 (01-08 13:00) and week 1 (12-30);
+        # monthly: January (01-08 13:00) and December (12-30).
+        assert deleted(plan) == ["20241115000000", "20241220000000", "20250106010000", "20250108010000"]
+        assert all(entry["reason"] == "not retained by the keep rules" for entry in plan["delete"])
+
+    def test_disk_budget_prunes_oldest_and_reserves_room_for_next_backup(self):
+        backups = [backup(f"2025-01-0{day} 00:00:00") for day in range(1, 6)]
+
+        plan = retention.plan_retention(backups, policy(max_usage=4 * GB), reserve=GB)
+
+        assert deleted(plan) == ["20250101000000", "20250102000000"]
+        assert plan["used_after"] == 3 * GB
+        assert plan["delete"][0]["reason"] == "over the disk budget"
+
+    def test_free_space_rule(self):
+        backups = [backup(f"2025-01-0{day} 00:00:00") for day in range(1, 4)]
+
+        plan = retention.plan_retention(backups, policy(min_free=2 * GB), reserve=GB, free_space=GB)
+
+        assert deleted(plan) == ["20250101000000", "20250102000000"]
+
+    def test_never_prunes_the_newest_backup(self):
+        backups = [backup("2025-01-01 00:00:00", size=10 * GB)]
+
+        plan = retention.plan_retention(backups, policy(keep_last=0, max_usage=GB))
+
+        assert deleted(plan) == []
+
+    def test_never_prunes_a_protected_backup(self):
+        backups = [backup("2024-01-01 00:00:00"), backup("2024-02-01 00:00:00")]
+
+        plan = retention.plan_retention(backups, policy(keep_last=1, max_usage=GB), protect={"20240101000000"})
+
+        assert deleted(plan) == []
+
+    def test_shared_chunks_count_once_and_free_only_when_unreferenced(self):
+        backups = [
+            backup("2025-01-01 00:00:00", chunks={"a": GB, "b": GB}),
+            backup("2025-01-02 00:00:00", chunks={"a": GB, "c": GB}),
+            backup("2025-01-03 00:00:00", chunks={"a": GB, "d": GB}),
+        ]
+
+        plan = retention.plan_retention(backups, policy(max_usage=3 * GB))
+
+        assert plan["used"] == 4 * GB
+        assert deleted(plan) == ["20250101000000"]
+        assert plan["used_after"] == 3 * GB
+
+
+class TestEstimateNextBackupSize:
+    def test_archive_takes_its_physical_size(self):
+        backups = [backup("2025-01-01 00:00:00", size=3 * GB), backup("2025-01-02 00:00:00", size=2 * GB)]
+
+        assert retention.estimate_next_backup_size(backups) == 2 * GB
+
+    def test_chunk_store_grows_by_the_new_chunks_of_the_latest_backup(self):
+        backups = [
+            backup("2025-01-01 00:00:00", chunks={"a": GB, "b": GB}),
+            backup("2025-01-02 00:00:00", chunks={"a": GB, "b": GB, "c": 100}),
+        ]
+
+        assert retention.estimate_next_backup_size(backups) == 100
+
+
+class TestApplyRetention:
+    def test_first_backup_without_a_dumps_directory(self, tmp_path, monkeypatch):
+        for module in (catalog, chunkstore, retention):
+            monkeypatch.setattr(module, "BACKUP_DIR", str(tmp_path / "dumps"))
+        monkeypatch.setattr(catalog, "_catalog", {"path": None, "entries": {}})
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / ".env").write_text("BACKUP_KEEP_DAILY=7\nBACKUP_MIN_FREE_SPACE=1G\n")
+
+        assert retention.apply_retention(for_new_backup=True) == []
+
+    @pytest.fixture
+    def backup_dir(self, tmp_path, monkeypatch):
+        path = tmp_path / "dumps"
+        for day in range(1, 4):
+            folder = path / f"2025010{day}000000"
+            folder.mkdir(parents=True)
+            (folder / "dump.zip").write_bytes(b"x" * 1000)
+        for module in (catalog, chunkstore, retention):
+            monkeypatch.setattr(module, "BACKUP_DIR", str(path))
+        monkeypatch.setattr(catalog, "_catalog", {"path": None, "entries": {}})
+        monkeypatch.chdir(tmp_path)
+        return path
+
+    def test_prunes_before_a_new_backup(self, backup_dir):
+        (backup_dir.parent / ".env").write_text("BACKUP_MAX_DISK_USAGE=3000\n")
+
+        assert retention.preview_retention(for_new_backup=True)["reserve"] == 1000
+        assert retention.apply_retention(for_new_backup=True) == ["20250101000000"]
+        assert sorted(os.listdir(backup_dir)) == [".catalog.json", "20250102000000", "20250103000000"]
+
+    def test_refuses_a_backup_the_budget_cannot_fit(self, backup_dir):
+        (backup_dir.parent / ".env").write_text("BACKUP_MAX_DISK_USAGE=1500\n")
+
+        with pytest.raises(RuntimeError, match="disk budget"):
+            retention.apply_retention(for_new_backup=True)
+
+    def test_keeps_the_backup_being_restored(self, backup_dir):
+        (backup_dir.parent / ".env").write_text("BACKUP_KEEP_LAST=1\n")
+
+        assert retention.apply_retention(for_new_backup=True, protect=["20250101000000"]) == ["20250102000000"]
+        assert (backup_dir / "20250101000000" / "dump.zip").exists()
+
+    def test_measures_chunk_store_backups_by_their_distinct_chunks(self, backup_dir):
+        for day, digests in ((4, ["a", "b"]), (5, ["a", "c"])):
+            folder = backup_dir / f"2025010{day}000000"
+            folder.mkdir()
+            members = [{"name": "dump.sql", "size": 2000, "chunks": [[digest, 1000, 1000] for digest in digests]}]
+            (folder / chunkstore.INDEX_NAME).write_text(
+                json.dumps({"version": chunkstore.INDEX_VERSION, "members": members})
+            )
+        (backup_dir.parent / ".env").write_text("BACKUP_MAX_DISK_USAGE=4000\n")
+
+        plan = retention.preview_retention(for_new_backup=True)
+
+        # Three 1000 byte archives plus chunks a, b and c; the next backup adds one new chunk.
+        assert plan["used"] == 6000
+        assert plan["reserve"] == 1000
+        assert deleted(plan) == ["20250101000000", "20250102000000", "20250103000000"]
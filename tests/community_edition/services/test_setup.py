@@ -0,0 +1,230 @@
+import json
+import threading
+from collections import deque
+from pathlib import Path
+
+import pytest
+
+from community_edition.services import setup
+
+
+@pytest.fixture
+def state_file(tmp_path, monkeypatch):
+    """Run in a temporary directory with autostart and the step commands patched out."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(setup, "disable_autostart", lambda: None)
+    monkeypatch.setattr(setup, "_events", deque(maxlen=setup.SETUP_EVENTS))
+
+    def write(**state):
+        (tmp_path / setup.STATE_FILE).write_text(json.dumps(state))
+
+    return write
+
+
+def saved_state():
+    with open(setup.STATE_FILE) as f:
+        return json.load(f)
+
+
+def initial_state(**overrides):
+    return {step: "pending" for step, _, _ in setup.get_setup_steps()} | {"generate_env": "done"} | overrides
+
+
+class TestGetReadySteps:
+    def test_requested_step_unblocks_independent_steps(self):
+        state = initial_state(init_cert="requested")
+
+        assert setup.get_ready_steps(state) == ["init_cert", "update_versions"]
+
+    def test_stack_steps_never_overlap(self):
+        state = initial_state(init_cert="in_progress", update_versions="done")
+
+        assert setup.get_ready_steps(state, ["init_cert"]) == ["pull_images"]
+
+    def test_generate_env_is_only_run_when_requested(self):
+        state = {step: "pending" for step, _, _ in setup.get_setup_steps()}
+
+        assert setup.get_ready_steps(state) == []
+
+
+class TestRunSetup:
+    def test_runs_every_step_after_its_dependencies(self, state_file, monkeypatch):
+        state_file(**initial_state(init_cert="requested"))
+        finished = ["generate_env"]
+        lock = threading.Lock()
+
+        def run_step(step, cmd, title):
+            for dependency in setup.get_step_dependencies()[step]:
+                assert dependency in finished
+            with lock:
+                finished.append(step)
+            return True
+
+        monkeypatch.setattr(setup, "run_step", run_step)
+
+        state = setup.run_setup()
+
+        timings = state.pop(setup.TIMINGS_KEY)
+        assert set(state.values()) == {"done"}
+        assert saved_state() == {**state, setup.TIMINGS_KEY: timings}
+        assert finished[-1] == "docker_up"
+        assert set(timings) == set(state) - {"generate_env"}
+        assert all(timing["duration"] is not None for timing in timings.values())
+
+    def test_independent_steps_run_concurrently(self, state_file, monkeypatch):
+        state_file(**initial_state(init_cert="requested"))
+        barrier = threading.Barrier(2, timeout=5)
+
+        def run_step(step, cmd, title):
+            if title in ("Request Certificates", "Updating Versions"):
+                barrier.wait()
+            return True
+
+        monkeypatch.setattr(setup, "run_step", run_step)
+
+        assert setup.run_setup()["docker_up"] == "done"
+
+    def test_failed_step_is_recorded_and_the_rest_still_run(self, state_file, monkeypatch):
+        state_file(**initial_state(init_cert="requested", restore_backup="skip"))
+        monkeypatch.setattr(setup, "run_step", lambda step, cmd, title: title != "Pulling Images")
+
+        state = setup.run_setup()
+
+        assert state["pull_images"] == "failed"
+        assert state["restore_backup"] == "skip"
+        assert state["docker_up"] == "done"
+
+    def test_step_that_raises_is_recorded_as_failed(self, state_file, monkeypatch):
+        state_file(**initial_state(init_cert="requested", restore_backup="skip"))
+
+        def run_step(step, cmd, title):
+            if title == "Pulling Images":
+                raise OSError("No space left on device")
+            return True
+
+        monkeypatch.setattr(setup, "run_step", run_step)
+
+        state = setup.run_setup()
+
+        assert state["pull_images"] == "failed"
+        assert state[setup.TIMINGS_KEY]["pull_images"]["duration"] is not None
+        assert state["docker_up"] == "done"
+
+    def test_output_that_is_not_utf8_is_replaced(self, state_file, monkeypatch):
+        monkeypatch.setattr(
+            setup, "get_setup_steps", lambda: [("generate_env", ["printf", "caf\\351\\n"], "Initial Settings")]
+        )
+        state_file(generate_env="requested")
+
+        assert setup.run_setup()["generate_env"] == "done"
+        with open(setup.LOG_FILE) as f:
+            assert f.read().endswith("generate_env | caf\ufffd\n")
+
+    def test_interrupted_step_is_run_again(self, state_file, monkeypatch):
+        state_file(
+            **initial_state(
+                init_cert="done",
+                init_keycloak="in_progress",
+                update_versions="done",
+                pull_images="done",
+                restore_backup="skip",
+            )
+        )
+        ran = []
+        monkeypatch.setattr(setup, "run_step", lambda step, cmd, title: ran.append(title) or True)
+
+        state = setup.run_setup()
+
+        assert ran == ["Initializing Single-Sign-On", "Starting Services"]
+        assert state["init_keycloak"] == "done"
+
+    def test_step_output_is_streamed_to_the_log_and_followers(self, state_file, monkeypatch):
+        monkeypatch.setattr(
+            setup,
+            "get_setup_steps",
+            lambda: [("generate_env", ["sh", "-c", "echo hello; echo oops >&2; exit 3"], "Initial Settings")],
+        )
+        state_file(generate_env="requested")
+        events = setup.follow_setup(after=setup._channel["seq"], keepalive=0.1)
+
+        state = setup.run_setup()
+
+        assert state["generate_env"] == "failed"
+        with open(setup.LOG_FILE) as f:
+            assert f.read() == "\n\n### Initial Settings\ngenerate_env | hello\ngenerate_env | oops\n"
+        published = []
+        for event in events:
+            if event is None:
+                break
+            published.append(event)
+        assert [event["line"] for event in published if event["type"] == "output"] == ["hello", "oops"]
+        assert [event["state"]["generate_env"] for event in published if event["type"] == "state"][-2:] == [
+            "in_progress",
+            "failed",
+        ]
+
+
+class TestFollowSetup:
+    def test_new_follower_gets_the_state_then_the_kept_output(self, state_file):
+        state_file(generate_env="done", init_cert="in_progress")
+        setup.publish({"type": "output", "step": "init_cert", "line": "requesting"})
+
+        events = setup.follow_setup(keepalive=0.1)
+
+        assert next(events)["state"] == {"generate_env": "done", "init_cert": "in_progress"}
+        assert next(events)["line"] == "requesting"
+
+
+class TestStateStore:
+    def test_concurrent_changes_are_not_lost(self, state_file):
+        state_file(count=0)
+
+        def increment():
+            for _ in range(20):
+                with setup.locked_state() as state:
+                    state["count"] += 1
+
+        threads = [threading.Thread(target=increment) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert saved_state() == {"count": 80}
+        assert [path.name for path in Path().iterdir() if path.suffix == ".tmp"] == []
+
+    def test_state_is_parsed_again_only_when_the_file_changes(self, state_file, monkeypatch):
+        state_file(generate_env="done")
+        setup.load_state()
+        loads = []
+        monkeypatch.setattr(setup.json, "load", lambda f: loads.append(f) or json.loads(f.read()))
+
+        setup.load_state()
+        assert loads == []
+
+        state_file(generate_env="done", init_cert="requested")
+        assert setup.load_state()["init_cert"] == "requested"
+        assert len(loads) == 1
+
+    def test_partly_written_state_keeps_the_cached_one(self, state_file):
+        state_file(generate_env="done")
+        setup.load_state()
+
+        Path(setup.STATE_FILE).write_text('{"generate_env": "do')
+        assert setup.load_state() == {"generate_env": "done"}
+
+        state_file(generate_env="failed")
+        assert setup.load_state() == {"generate_env": "failed"}
+
+    def test_wait_for_state_change(self, state_file, monkeypatch):
+        monkeypatch.setattr(setup, "STATE_POLL_INTERVAL", 0.05)
+        state_file(generate_env="done", init_cert="pending")
+        version, state = setup.wait_for_state_change(None, timeout=0)
+
+        assert setup.wait_for_state_change(version, timeout=0.1) == (version, state)
+
+        threading.Timer(0.1, lambda: state_file(generate_env="done", init_cert="requested")).start()
+        new_version, new_state = setup.wait_for_state_change(version, timeout=5)
+
+        assert new_version != version
+        assert new_state["init_cert"] == "requested"
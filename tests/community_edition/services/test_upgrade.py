@@ -0,0 +1,126 @@
+from community_edition.services import upgrade
+from community_edition.services.jobs import submit_job, wait_for_job
+
+SERVICES = {
+    "nginx": {"image": "nginx", "depends_on": {"core": {}, "vue-portal": {}, "keycloak": {}}},
+    "keycloak": {"image": "keycloak", "depends_on": {"db_keycloak": {"condition": "service_healthy"}}},
+    "db": {"image": "postgres"},
+    "db_keycloak": {"image": "postgres"},
+    "core": {
+        "image": "finmars/finmars-core:${CORE_IMAGE_VERSION}",
+        "depends_on": {
+            "core-migration": {"condition": "service_completed_successfully"},
+            "db": {"condition": "service_healthy"},
+        },
+    },
+    "core-worker": {"image": "finmars/finmars-core:${CORE_IMAGE_VERSION}", "depends_on": {"db": {}}},
+    "core-migration": {"image": "finmars/finmars-core:${CORE_IMAGE_VERSION}", "depends_on": ["db"]},
+    "vue-portal": {"image": "finmars/finmars-vue-portal:${VUE_PORTAL_IMAGE_VERSION}"},
+}
+OLD_ENV = {"CORE_IMAGE_VERSION": "1.24.0", "VUE_PORTAL_IMAGE_VERSION": "1.24.0", "DB_USER": "postgres"}
+
+
+class TestPlanUpgrade:
+    def test_portal_only_upgrade_leaves_the_rest_running(self):
+        new_env = {**OLD_ENV, "VUE_PORTAL_IMAGE_VERSION": "1.25.0"}
+
+        assert upgrade.plan_upgrade(OLD_ENV, new_env, SERVICES) == [
+            {"action": "recreate", "services": ["vue-portal"]},
+            {"action": "restart", "services": ["nginx"]},
+        ]
+
+    def test_backend_upgrade_migrates_before_recreating_in_dependency_order(self):
+        new_env = {**OLD_ENV, "CORE_IMAGE_VERSION": "1.25.0"}
+
+        assert upgrade.plan_upgrade(OLD_ENV, new_env, SERVICES) == [
+            {"action": "migrate", "services": ["core-migration"]},
+            {"action": "recreate", "services": ["core-worker"]},
+            {"action": "recreate", "services": ["core"]},
+            {"action": "restart", "services": ["nginx"]},
+        ]
+
+    def test_nothing_to_do_without_version_changes(self):
+        assert upgrade.plan_upgrade(OLD_ENV, {**OLD_ENV, "DB_USER": "other"}, SERVICES) == []
+
+
+class TestRunUpgrade:
+    def test_runs_stages_and_waits_for_health(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(upgrade, "_compose", lambda args, action: calls.append(args) or "")
+        monkeypatch.setattr(upgrade, "restart_services", lambda names: calls.append(["restart", *names]))
+        monkeypatch.setattr(upgrade, "wait_until_healthy", lambda names: calls.append(["wait", *names]))
+
+        upgrade.run_upgrade(
+            [
+                {"action": "migrate", "services": ["core-migration"]},
+                {"action": "recreate", "services": ["core"]},
+                {"action": "restart", "services": ["nginx"]},
+            ]
+        )
+
+        assert calls == [
+            ["run", "--rm", "--no-deps", "core-migration"],
+            ["up", "-d", "--no-deps", "core"],
+            ["wait", "core"],
+            ["restart", "nginx"],
+            ["wait", "nginx"],
+        ]
+
+
+class FakeClient:
+    def __init__(self, present=(), broken=()):
+        self.present, self.broken = present, broken
+
+    def image_exists(self, image):
+        return image in self.present
+
+    def pull(self, image):
+        if image in self.broken:
+            raise RuntimeError("manifest unknown")
+        yield {"status": "Pulling from finmars/finmars-core", "id": "1.25.0"}
+        yield {"status": "Downloading", "id": "a", "progressDetail": {"current": 10, "total": 100}}
+        yield {"status": "Downloading", "id": "b", "progressDetail": {"current": 5, "total": 50}}
+        yield {"status": "Pull complete", "id": "a"}
+        yield {"status": "Pull complete", "id": "b"}
+
+
+def run_in_job(func):
+    job = submit_job("test", "Test", func, conflict_key=None)
+    return wait_for_job(job["id"], timeout=10)
+
+
+class TestPullImages:
+    def test_reports_bytes_per_image(self, monkeypatch):
+        monkeypatch.setattr(upgrade, "get_docker_client", lambda: FakeClient(present=["nginx:1"]))
+
+        job = run_in_job(lambda: upgrade.pull_images(["finmars/finmars-core:1.25.0", "nginx:1"]))
+
+        assert job["status"] == "succeeded"
+        assert job["progress"]["images"] == {
+            "finmars/finmars-core:1.25.0": {"status": "done", "current": 150, "total": 150, "error": None},
+            "nginx:1": {"status": "present", "current": 0, "total": 0, "error": None},
+        }
+
+    def test_any_failed_pull_fails_the_stage(self, monkeypatch):
+        monkeypatch.setattr(upgrade, "get_docker_client", lambda: FakeClient(broken=["bad:1"]))
+
+        job = run_in_job(lambda: upgrade.pull_images(["good:1", "bad:1"]))
+
+        assert job["status"] == "failed"
+        assert "bad:1: manifest unknown" in job["message"]
+        assert job["progress"]["images"]["bad:1"]["status"] == "failed"
+        assert job["progress"]["images"]["good:1"]["status"] == "done"
+
+    def test_images_of_migrated_and_recreated_services(self):
+        stages = [
+            {"action": "migrate", "services": ["core-migration"]},
+            {"action": "recreate", "services": ["core"]},
+            {"action": "restart", "services": ["nginx"]},
+        ]
+        services = {
+            "core-migration": {"image": "finmars/finmars-core:1.25.0"},
+            "core": {"image": "finmars/finmars-core:1.25.0"},
+            "nginx": {"image": "nginx"},
+        }
+
+        assert upgrade.get_upgrade_images(stages, services) == ["finmars/finmars-core:1.25.0"]
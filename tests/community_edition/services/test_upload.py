@@ -0,0 +1,92 @@
+import hashlib
+import io
+import zipfile
+
+import pytest
+
+from community_edition.services import upload
+
+
+class TestValidateBackupArchive:
+    def test_returns_manifest_for_valid_archive(self, tmp_path, backup_archive_bytes):
+        path = tmp_path / "backup.zip"
+        path.write_bytes(backup_archive_bytes)
+
+        manifest = upload.validate_backup_archive(str(path))
+
+        assert manifest["space_code"] == "space00000"
+
+    def test_rejects_truncated_archive(self, tmp_path, backup_archive_bytes):
+        path = tmp_path / "backup.zip"
+        path.write_bytes(backup_archive_bytes[:-30])
+
+        with pytest.raises(ValueError, match="not a valid zip archive"):
+            upload.validate_backup_archive(str(path))
+
+    def test_rejects_archive_without_manifest(self, tmp_path):
+        path = tmp_path / "backup.zip"
+        with zipfile.ZipFile(path, "w") as zf:
+            zf.writestr("backend.sql", "")
+
+        with pytest.raises(ValueError, match="manifest.json"):
+            upload.validate_backup_archive(str(path))
+
+
+class TestWriteUploadChunk:
+    def test_hashes_incrementally_across_chunks(self, upload_path, backup_archive_bytes):
+        total = len(backup_archive_bytes)
+        split = 7
+
+        upload.write_upload_chunk(io.BytesIO(backup_archive_bytes[:split]), 0, split, total)
+        status = upload.write_upload_chunk(io.BytesIO(backup_archive_bytes[split:]), split, total, total)
+
+        assert status["complete"] is True
+        assert status["sha256"] == hashlib.sha256(backup_archive_bytes).hexdigest()
+
+    def test_rebuilds_hash_from_disk_after_restart(self, upload_path, backup_archive_bytes):
+        total = len(backup_archive_bytes)
+        upload.write_upload_chunk(io.BytesIO(backup_archive_bytes[:5]), 0, 5, total)
+        upload._hash_state.update({"path": None, "offset": 0, "hasher": None})
+
+        status = upload.write_upload_chunk(io.BytesIO(backup_archive_bytes[5:]), 5, total, total)
+
+        assert status["sha256"] == hashlib.sha256(backup_archive_bytes).hexdigest()
+
+    def test_checksum_mismatch_discards_upload(self, upload_path, backup_archive_bytes):
+        total = len(backup_archive_bytes)
+
+        with pytest.raises(ValueError, match="Checksum mismatch"):
+            upload.write_upload_chunk(io.BytesIO(backup_archive_bytes), 0, total, total, expected_sha256="0" * 64)
+
+        assert not upload_path.exists()
+
+    def test_short_read_keeps_partial_data_for_resume(self, upload_path, backup_archive_bytes):
+        total = len(backup_archive_bytes)
+
+        status = upload.write_upload_chunk(io.BytesIO(backup_archive_bytes[:3]), 0, 10, total)
+
+        assert status["offset"] == 3
+        assert status["complete"] is False
+
+    def test_rejects_offset_mismatch(self, upload_path, backup_archive_bytes):
+        total = len(backup_archive_bytes)
+        upload.write_upload_chunk(io.BytesIO(backup_archive_bytes[:5]), 0, 5, total)
+
+        with pytest.raises(ValueError, match="offset mismatch"):
+            upload.write_upload_chunk(io.BytesIO(backup_archive_bytes[8:]), 8, total, total)
+
+
+class TestGetCompletedUpload:
+    def test_raises_when_upload_incomplete(self, upload_path, backup_archive_bytes):
+        total = len(backup_archive_bytes)
+        upload.write_upload_chunk(io.BytesIO(backup_archive_bytes[:5]), 0, 5, total)
+
+        with pytest.raises(ValueError):
+            upload.get_completed_upload()
+
+    def test_save_uploaded_file_then_completed(self, upload_path, backup_archive_bytes):
+        upload.save_uploaded_file(io.BytesIO(backup_archive_bytes))
+
+        manifest = upload.get_completed_upload()
+
+        assert manifest["realm_code"] == "realm00000"
@@ -0,0 +1,139 @@
+import os
+import shutil
+import struct
+import zipfile
+
+import pytest
+
+from community_edition.services import catalog, chunkstore, dump, verify
+
+
+@pytest.fixture
+def backups(fake_popen, tmp_path, monkeypatch):
+    backup_dir = tmp_path / "dumps"
+    backup_dir.mkdir()
+    (tmp_path / ".env").write_text("DB_USER=finmars\nREALM_CODE=realm00000\nBASE_API_URL=space00000\n")
+    monkeypatch.chdir(tmp_path)
+    for module in (chunkstore, dump, catalog):
+        monkeypatch.setattr(module, "BACKUP_DIR", str(backup_dir))
+    monkeypatch.setattr(catalog, "_catalog", {"path": None, "entries": {}})
+    monkeypatch.setattr(chunkstore, "start_database", lambda db_user: "db-container")
+    monkeypatch.setattr(dump, "start_database", lambda db_user: "db-container")
+    fake_popen.outputs = {
+        "backend_realm00000": b"INSERT INTO backend VALUES (1);\n" * 5000,
+        "workflow_realm00000": b"INSERT INTO workflow VALUES (1);\n" * 500,
+    }
+    return backup_dir
+
+
+def rewrite_member(path, name, data):
+    with zipfile.ZipFile(path) as zf:
+        members = {info.filename: zf.read(info) for info in zf.infolist()}
+    members[name] = data
+    with zipfile.ZipFile(path, "w") as zf:
+        for member, content in members.items():
+            zf.writestr(member, content)
+
+
+class TestVerifyBackupFile:
+    def test_intact_archive_passes(self, backups):
+        path = dump.create_dump_archive()
+
+        result = verify.verify_backup_file(path, expected_sha256=catalog.file_sha256(path))
+
+        assert result["ok"], result["errors"]
+        assert {member["name"]: member["status"] for member in result["members"]} == {
+            "backend.sql": "ok",
+            "workflow.sql": "ok",
+        }
+
+    def test_changed_member_is_a_mismatch(self, backups):
+        path = dump.create_dump_archive()
+        rewrite_member(path, "backend.sql", b"DROP TABLE backend;\n")
+
+        result = verify.verify_backup_file(path)
+
+        assert not result["ok"]
+        assert result["errors"] == ["backend.sql: mismatch (size or SHA-256 differs from the manifest)"]
+
+    def test_truncated_archive_fails(self, backups):
+        path = dump.create_dump_archive()
+        expected = catalog.file_sha256(path)
+        with open(path, "r+b") as f:
+            f.truncate(os.path.getsize(path) // 2)
+
+        result = verify.verify_backup_file(path, expected_sha256=expected)
+
+        assert not result["ok"]
+        assert result["errors"]
+
+    def test_flipped_byte_is_caught_by_the_crc(self, backups):
+        path = dump.create_dump_archive()
+        with zipfile.ZipFile(path) as zf:
+            info = zf.getinfo("backend.sql")
+        with open(path, "r+b") as f:
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack("<HH", f.read(4))
+            f.seek(name_length + extra_length + 100, os.SEEK_CUR)
+            byte = f.read(1)
+            f.seek(-1, os.SEEK_CUR)
+            f.write(bytes([byte[0] ^ 0xFF]))
+
+        result = verify.verify_backup_file(path)
+
+        assert not result["ok"]
+        assert result["errors"][0].startswith("backend.sql: corrupt")
+
+    def test_chunked_backup_members_are_checked(self, backups):
+        index_path = chunkstore.create_chunked_backup()
+
+        result = verify.verify_backup_file(index_path)
+
+        assert result["ok"], result["errors"]
+        assert [member["status"] for member in result["members"]] == ["ok", "ok"]
+
+
+class TestVerifyBackup:
+    def test_records_the_result_in_the_catalog(self, backups):
+        folder = os.path.basename(os.path.dirname(dump.create_dump_archive()))
+
+        result = verify.verify_backup(folder)
+
+        entry = catalog.get_backup_entry(folder)
+        assert result["ok"]
+        assert entry["verification"] == {"ok": True, "verified_at": result["verified_at"], "errors": []}
+        assert entry["sha256"] == result["sha256"]
+
+    def test_unknown_backup_is_rejected(self, backups):
+        with pytest.raises(ValueError, match="Backup not found"):
+            verify.verify_backup("20000101000000")
+
+
+class TestVerifyAllBackups:
+    def test_skips_backups_deleted_during_the_sweep(self, backups, monkeypatch):
+        folder = os.path.dirname(dump.create_dump_archive())
+        for timestamp in ("20000101000000", "20000102000000"):
+            shutil.copytree(folder, backups / timestamp)
+        for order, timestamp in enumerate(["20000101000000", "20000102000000", os.path.basename(folder)]):
+            catalog.refresh_catalog()
+            catalog.update_backup_entry(timestamp, verification={"verified_at": str(order)})
+        read = verify.verify_backup_file
+
+        def prune_while_reading(path, expected_sha256=None):
+            if "20000101000000" in path:
+                # Pruned while being read, and the next one before the sweep gets to it.
+                shutil.rmtree(backups / "20000101000000")
+                shutil.rmtree(backups / "20000102000000")
+            return read(path, expected_sha256)
+
+        monkeypatch.setattr(verify, "verify_backup_file", prune_while_reading)
+
+        assert verify.verify_all_backups() == "1 backup(s) verified, 2 deleted meanwhile"
+
+
+class TestGetVerifyInterval:
+    def test_disabled_unless_positive(self):
+        assert verify.get_verify_interval({}) is None
+        assert verify.get_verify_interval({"BACKUP_VERIFY_INTERVAL_HOURS": "0"}) is None
+        assert verify.get_verify_interval({"BACKUP_VERIFY_INTERVAL_HOURS": "soon"}) is None
+        assert verify.get_verify_interval({"BACKUP_VERIFY_INTERVAL_HOURS": "24"}) == 24
@@ -0,0 +1,99 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from community_edition.services import versions
+
+ETAG = '"v1"'
+
+
+class FakeLicenseAPI(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        if self.server.fail:
+            self.send_response(503)
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps({"results": [{"app": "backend", "version": "1.25.0"}, {"app": "portal"}]}).encode()
+        self.send_response(200)
+        self.send_header("ETag", ETAG)
+        self.send_header("Last-Modified", "Wed, 01 Jan 2025 00:00:00 GMT")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def license_api(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeLicenseAPI)
+    server.requests = []
+    server.fail = False
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    monkeypatch.setattr(versions, "API_URL", f"http://127.0.0.1:{server.server_port}/latest")
+    monkeypatch.setattr(
+        versions,
+        "_cache",
+        {
+            "versions": {},
+            "etag": None,
+            "last_modified": None,
+            "fetched_at": None,
+            "attempted_at": None,
+            "error": None,
+            "refresh": None,
+            "max_age": 3600,
+        },
+    )
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def wait_for_refresh():
+    thread = versions._cache["refresh"]
+    if thread is not None:
+        thread.join()
+
+
+class TestLatestVersions:
+    def test_revalidates_with_the_etag(self, license_api):
+        versions.refresh_latest_versions()
+        versions.refresh_latest_versions()
+
+        assert versions.get_latest_versions() == {"backend": "1.25.0"}
+        assert "If-None-Match" not in license_api.requests[0]
+        assert license_api.requests[1]["If-None-Match"] == ETAG
+        assert license_api.requests[1]["If-Modified-Since"] == "Wed, 01 Jan 2025 00:00:00 GMT"
+        assert versions.get_latest_versions_status()["age"] == 0
+
+    def test_serves_the_cached_versions_and_refreshes_them_in_the_background(self, license_api):
+        assert versions.get_latest_versions() == {}
+        wait_for_refresh()
+        assert versions.get_latest_versions() == {"backend": "1.25.0"}
+
+        versions._cache["fetched_at"] -= 7200
+        license_api.fail = True
+        assert versions.get_latest_versions() == {"backend": "1.25.0"}
+        wait_for_refresh()
+
+        status = versions.get_latest_versions_status()
+        assert status["stale"] is True
+        assert status["age"] >= 7200
+        assert "503" in status["error"]
+        assert versions.get_latest_versions() == {"backend": "1.25.0"}
+        assert len(license_api.requests) == 2
+
+    def test_check_interval_from_env(self):
+        assert versions.get_check_interval({}) == 3600
+        assert versions.get_check_interval({"VERSION_CHECK_INTERVAL_MINUTES": "5"}) == 300
+        with pytest.raises(ValueError):
+            versions.get_check_interval({"VERSION_CHECK_INTERVAL_MINUTES": "0"})
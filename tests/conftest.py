@@ -1,7 +1,19 @@
+import io
+import json
+import types
+import zipfile
+
 import pytest
 
 from community_edition.app import create_app
 from community_edition.routers import configurate as cfg
+from community_edition.services import dump, upload
+
+
+@pytest.fixture(autouse=True)
+def no_docker_socket(tmp_path, monkeypatch):
+    """Keep the services on their docker CLI paths, which the tests patch, even where a daemon runs."""
+    monkeypatch.setenv("DOCKER_HOST", f"unix://{tmp_path}/no-docker.sock")
 
 
 @pytest.fixture
@@ -52,15 +64,75 @@ def auth_client(client):
 @pytest.fixture
 def fake_get_logs(monkeypatch):
     """
-    Fixture that patches configurate.get_docker_compose_logs and
-    returns a mutable state dict so tests can control the returned
-    log text and check whether it was called.
+    Fixture that patches configurate.stream_logs (the `docker compose logs`
+    process) and returns a mutable state dict so tests can control the
+    returned log text and check whether and how it was run.
     """
-    state = {"text": "fake-logs-output", "called": False}
+    state = {"text": "fake-logs-output", "called": False, "command": None}
 
-    def _fake_get_logs():
-        state["called"] = True
-        return state["text"]
+    def _fake_stream_logs(command):
+        state.update(called=True, command=command)
+        for line in state["text"].splitlines():
+            yield {"service": None, "time": None, "message": line, "line": line}
 
-    monkeypatch.setattr(cfg, "get_docker_compose_logs", _fake_get_logs)
+    monkeypatch.setattr(cfg, "stream_logs", _fake_stream_logs)
     return state
+
+
+@pytest.fixture
+def fake_popen(monkeypatch):
+    """
+    Patch the dump engine's `docker exec ... pg_dump` processes with a stand-in
+    that emits a canned dump per database. Returns this test's own state:
+    `outputs` (dump bytes by database name, or by container dir for -Fd dumps),
+    `returncode` (non-zero fails the dump) and `started` (the databases dumped).
+    """
+    state = types.SimpleNamespace(outputs={}, returncode=0, started=[])
+
+    class FakePopen:
+        def __init__(self, cmd, stdout, stderr):
+            self.database = cmd[cmd.index("-d") + 1] if "-d" in cmd else cmd[cmd.index("-C") + 1]
+            state.started.append(self.database)
+            self.stdout = io.BytesIO(state.outputs[self.database])
+            self.stderr = stderr
+            if state.returncode:
+                stderr.write(b"connection refused")
+
+        def wait(self):
+            return state.returncode
+
+    monkeypatch.setattr(dump.subprocess, "Popen", FakePopen)
+    return state
+
+
+@pytest.fixture
+def backup_archive_bytes():
+    """
+    Bytes of a minimal, structurally valid backup archive
+    (manifest.json plus the two SQL dumps).
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(
+            "manifest.json",
+            json.dumps(
+                {
+                    "name": "Community edition",
+                    "space_code": "space00000",
+                    "realm_code": "realm00000",
+                    "versions": [{"app": "backend", "version": "1.0.0"}],
+                    "date": "2025-01-01",
+                }
+            ),
+        )
+        zf.writestr("backend.sql", "-- backend dump\n")
+        zf.writestr("workflow.sql", "-- workflow dump\n")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def upload_path(tmp_path, monkeypatch):
+    """Redirect the backup upload target (tmp/backup.zip) into the test's temp dir."""
+    path = tmp_path / "tmp" / "backup.zip"
+    monkeypatch.setattr(upload, "UPLOAD_PATH", str(path))
+    return path